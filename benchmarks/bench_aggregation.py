@@ -0,0 +1,86 @@
+# Standard library imports.
+from time import perf_counter
+import argparse
+# Related third party imports.
+import numpy as np
+import pandas as pd
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.aggregation import CumulativeCoverage
+from src.coverage import (GROUP_NAMES, NS_PER_DAY, coverage_table,
+                          coverage_tables, daily_coverage)
+
+
+def rolling_coverage(daily, days: int) -> pd.DataFrame:
+    # Trailing windows summed by pandas, one station at a time.
+    columns = dict()
+    for row, station in enumerate(daily.stations):
+        series = pd.Series(daily.sums[row], index=daily.days)
+        measured = series.rolling(days, min_periods=1).sum()
+        percentage = (100 * measured / (days * NS_PER_DAY)).map(
+            lambda value: round(value, 1)
+        )
+        started = daily.has_data[row].cumsum() > 0
+        columns[station] = percentage.clip(upper=100).where(started)
+    return pd.DataFrame(columns).transpose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmark binning several groups in one pass and '
+                    'trailing windows from running totals.'
+    )
+    parser.add_argument('--stations', type=int, default=300)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    data = synthetic.raw_data(n_stations=args.stations, years=args.years)
+    stations = sorted(data['station'].unique())
+    start = pd.Timestamp(data['start'].min(), unit='s').normalize()
+    end = pd.Timestamp(data['start'].max(), unit='s').normalize()
+    daily = daily_coverage(data, stations, start, end)
+    groups = list(GROUP_NAMES)
+    print(f'{len(stations)} stations, {len(daily.days)} days, '
+          f'groups {" ".join(groups)}')
+
+    tic = perf_counter()
+    separate = {group: coverage_table(daily, group) for group in groups}
+    separate_time = perf_counter() - tic
+    tic = perf_counter()
+    one_pass = coverage_tables(daily, groups)
+    one_pass_time = perf_counter() - tic
+    print(f'\tseparate passes: {separate_time:.3f} s')
+    print(f'\tone pass:        {one_pass_time:.3f} s')
+    for group in groups:
+        pd.testing.assert_frame_equal(separate[group].percentages,
+                                      one_pass[group].percentages)
+        pd.testing.assert_series_equal(separate[group].totals,
+                                       one_pass[group].totals)
+
+    tic = perf_counter()
+    expected = rolling_coverage(daily, args.days)
+    rolling_time = perf_counter() - tic
+    tic = perf_counter()
+    cumulative = CumulativeCoverage.from_daily(daily)
+    cumsum_time = perf_counter() - tic
+    tic = perf_counter()
+    trailing = cumulative.trailing(args.days, start, end)
+    trailing_time = perf_counter() - tic
+    tic = perf_counter()
+    for day in daily.days:
+        cumulative.window(day - pd.Timedelta(days=args.days - 1), day)
+    window_time = (perf_counter() - tic) / len(daily.days)
+    print(f'\t{args.days} day trailing windows of every day:')
+    print(f'\t\tpandas rolling:  {rolling_time:.3f} s')
+    print(f'\t\trunning totals:  {cumsum_time:.3f} s once, '
+          f'{trailing_time:.3f} s all windows, '
+          f'{window_time * 1000:.3f} ms a single window')
+    np.testing.assert_array_equal(trailing.percentages.to_numpy(),
+                                  expected.to_numpy())
+    print('\tresults are identical')
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Standard library imports.
+from contextlib import redirect_stdout
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import argparse
+import io
+import os
+# Related third party imports.
+import numpy as np
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.cache import write_cache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Compare latencies of the html page and the coverage '
+                    'api of the web application.'
+    )
+    parser.add_argument('--stations', type=int, default=100)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=5)
+    args = parser.parse_args()
+
+    data = synthetic.raw_data(n_stations=args.stations, years=args.years)
+    print(f'{len(data)} data objects, {args.stations} stations')
+    cwd = os.getcwd()
+    with TemporaryDirectory() as tmp_dir:
+        write_cache(data, Path(tmp_dir, 'atmosphere_cache'))
+        Path(tmp_dir, 'output').mkdir()
+        # The application resolves its caches relative to the working
+        # directory and loads them on import.
+        os.chdir(tmp_dir)
+        try:
+            from src.app import app
+            client = app.test_client()
+            # A different two year window per request, so neither path
+            # is served from a cache.
+            ends = [f'{2016 + i % (args.years - 2)}-12-31'
+                    for i in range(args.requests)]
+            timings = {'html': [], 'json': [], 'csv': [], 'arrow': [],
+                       '304': []}
+            for end in ends:
+                start = f'{int(end[:4]) - 1}-01-01'
+                form = dict(domain='atmosphere', start=start, end=end,
+                            group='monthly', main_title_period=end[:4],
+                            side_title_period=end[:4])
+                # Silence the progress messages of the rendered heatmap.
+                with redirect_stdout(io.StringIO()):
+                    timings['html'].append(timed(
+                        lambda: client.post('/', data=form)
+                    ))
+                query = f'/api/coverage?domain=atmosphere&start={start}' \
+                        f'&end={end}&group=M'
+                for fmt in ('json', 'csv', 'arrow'):
+                    timings[fmt].append(timed(
+                        lambda: client.get(f'{query}&format={fmt}')
+                    ))
+                etag = client.get(query).headers['ETag']
+                timings['304'].append(timed(
+                    lambda: client.get(query,
+                                       headers={'If-None-Match': etag}),
+                    status=304
+                ))
+        finally:
+            os.chdir(cwd)
+    for name, values in timings.items():
+        print(f'\t{name:6s} median {np.median(values) * 1000:8.1f} ms, '
+              f'max {np.max(values) * 1000:8.1f} ms')
+    return
+
+
+def timed(send, status: int = 200) -> float:
+    tic = perf_counter()
+    response = send()
+    elapsed = perf_counter() - tic
+    assert response.status_code == status, response.status_code
+    return elapsed
+
+
+if __name__ == '__main__':
+    main()
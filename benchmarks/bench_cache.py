@@ -0,0 +1,53 @@
+# Standard library imports.
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import argparse
+# Related third party imports.
+import pandas as pd
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.cache import (columnar_path, export_csv, read_cache,
+                       read_csv_cache, write_cache)
+
+
+def best_of(function, repeat: int) -> float:
+    timings = list()
+    for _ in range(repeat):
+        tic = perf_counter()
+        function()
+        timings.append(perf_counter() - tic)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Compare load times of the csv and columnar caches.'
+    )
+    parser.add_argument('--stations', type=int, default=500)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = synthetic.raw_data(n_stations=args.stations, years=args.years)
+    print(f'{len(data)} data objects, {args.stations} stations')
+    with TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir, 'cache')
+        export_csv(data, cache_path)
+        write_cache(data, cache_path)
+        csv_size = cache_path.stat().st_size / 2 ** 20
+        columnar_size = columnar_path(cache_path).stat().st_size / 2 ** 20
+        csv_time = best_of(lambda: read_csv_cache(cache_path), args.repeat)
+        columnar_time = best_of(lambda: read_cache(cache_path), args.repeat)
+        pd.testing.assert_frame_equal(read_cache(cache_path),
+                                      read_csv_cache(cache_path),
+                                      check_categorical=False)
+    print(f'\tcsv:      {csv_time * 1000:8.1f} ms {csv_size:6.1f} MiB')
+    print(f'\tcolumnar: {columnar_time * 1000:8.1f} ms '
+          f'{columnar_size:6.1f} MiB')
+    print(f'\tspeedup:  {csv_time / columnar_time:.1f}x')
+    return
+
+
+if __name__ == '__main__':
+    main()
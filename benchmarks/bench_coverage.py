@@ -0,0 +1,87 @@
+# Standard library imports.
+from time import perf_counter
+import argparse
+# Related third party imports.
+import numpy as np
+import pandas as pd
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.cache import expand_raw_data, time_start
+from src.coverage import compute_coverage
+from src.heatmap import Heatmap
+
+
+def legacy_coverage(data: pd.DataFrame, stations: list[str],
+                    start: str, end: str, group: str) -> pd.DataFrame:
+    # The per station query/resample/apply pipeline that
+    # `src.coverage` replaces, on raw data indexed by `timeStart`.
+    binned_data = pd.DataFrame()
+    totals = dict()
+    for station in stations:
+        series = data.query('station == "' + station + '"')['period']
+        series = series.rename(station)
+        series = series[(series.index >= start) & (series.index <= end)]
+        station_info = {'percentage': 0.0}
+        if series.empty:
+            series = pd.Series(
+                float('NaN'),
+                index=pd.date_range(start=start, end=end, freq='D',
+                                    tz='UTC'),
+                name=station
+            )
+            binned = series.resample(group).apply(
+                Heatmap.percentage_calculator,
+                station_info=station_info, station=station
+            )
+            totals[station] = float('NaN')
+        else:
+            binned = series.resample('D').sum().resample(group).apply(
+                Heatmap.percentage_calculator,
+                station_info=station_info, station=station
+            )
+            totals[station] = \
+                round(station_info['percentage'] / len(binned), 1)
+        binned_data = pd.concat([binned_data, binned], axis=1, sort=True)
+    return binned_data.transpose(), pd.Series(totals)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmark the coverage engine against the legacy '
+                    'per station pipeline.'
+    )
+    parser.add_argument('--stations', type=int, default=500)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--group', default='M')
+    args = parser.parse_args()
+
+    data = synthetic.raw_data(n_stations=args.stations, years=args.years)
+    stations = sorted(data['station'].unique())
+    start = time_start(data).min().strftime('%d/%m/%Y')
+    end = time_start(data).max().strftime('%d/%m/%Y')
+    print(f'{len(data)} data objects, {len(stations)} stations, '
+          f'{start} - {end}, group {args.group}')
+
+    tic = perf_counter()
+    coverage = compute_coverage(data, stations, start, end, args.group)
+    vectorized = perf_counter() - tic
+    print(f'\tvectorized: {vectorized:.3f} s')
+
+    tic = perf_counter()
+    percentages, totals = legacy_coverage(expand_raw_data(data), stations,
+                                          start, end, args.group)
+    legacy = perf_counter() - tic
+    print(f'\tlegacy:     {legacy:.3f} s')
+    print(f'\tspeedup:    {legacy / vectorized:.1f}x')
+
+    np.testing.assert_array_equal(coverage.percentages.to_numpy(),
+                                  percentages.to_numpy(dtype=float))
+    assert coverage.percentages.columns.equals(percentages.columns)
+    np.testing.assert_array_equal(coverage.totals.to_numpy(),
+                                  totals.to_numpy(dtype=float))
+    print('\tresults are identical')
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Standard library imports.
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import argparse
+import logging
+# Related third party imports.
+import pandas as pd
+# Local application/library specific imports.
+from benchmarks import synthetic
+from benchmarks.mock_sparql import MockSparqlServer, sparql_rows
+from src.cache import format_raw_data, merge_raw_data, refresh_cache
+from src.constants import cpmeta
+from src.sparql import SparqlClient, build_query
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Compare one combined query with the parallel '
+                    'windowed fetch against a mock SPARQL endpoint.'
+    )
+    parser.add_argument('--stations', type=int, default=100)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='Seconds spent on every request.')
+    parser.add_argument('--row-latency', type=float, default=5e-5,
+                        help='Seconds spent per returned row.')
+    parser.add_argument('--failures', type=int, default=2,
+                        help='Number of requests failing with 503.')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log the latency of every window.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else
+                        logging.WARNING, format='\t%(message)s')
+
+    obj_specs = [cpmeta.GATOS, cpmeta.PICARRO]
+    data = synthetic.raw_data(n_stations=args.stations, years=args.years)
+    rows = sparql_rows(data, obj_specs)
+    print(f'{len(rows)} data objects, {args.stations} stations')
+    with MockSparqlServer(rows, latency=args.latency,
+                          row_latency=args.row_latency) as server:
+        client = SparqlClient(endpoint=server.url)
+        tic = perf_counter()
+        combined = merge_raw_data(format_raw_data(
+            client(build_query(obj_specs))
+        ))
+        serial_time = perf_counter() - tic
+
+    with MockSparqlServer(rows, latency=args.latency,
+                          row_latency=args.row_latency,
+                          failures=args.failures) as server, \
+            TemporaryDirectory() as tmp_dir:
+        client = SparqlClient(endpoint=server.url, backoff=0.1,
+                              pool_size=args.workers)
+        tic = perf_counter()
+        windowed, _ = refresh_cache(Path(tmp_dir, 'cache'), obj_specs,
+                                    run_query=client, workers=args.workers)
+        parallel_time = perf_counter() - tic
+        requests = server.requests
+    pd.testing.assert_frame_equal(windowed, combined)
+    print(f'\tcombined query: {serial_time:6.2f} s '
+          f'{len(rows) / serial_time:8.0f} rows/s')
+    print(f'\tparallel fetch: {parallel_time:6.2f} s '
+          f'{len(rows) / parallel_time:8.0f} rows/s, {requests} requests '
+          f'({args.failures} failed and retried)')
+    return
+
+
+if __name__ == '__main__':
+    main()
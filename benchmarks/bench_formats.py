@@ -0,0 +1,116 @@
+# Standard library imports.
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import argparse
+# Related third party imports.
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.cache import write_cache
+from src.heatmap import Heatmap
+from src.plotting import encode, plot_figures
+from src.settings import IMAGE_FORMATS, YamlSettings
+
+
+def legacy_figure(heatmap: Heatmap) -> Figure:
+    # The figure `src.plotting` replaces: the matrix is drawn twice by
+    # seaborn, with cell borders, to get a second axis of percentages.
+    import seaborn
+    fig = Figure(figsize=(16, 10))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax = seaborn.heatmap(heatmap.parsed_data, ax=ax, center=95, vmin=0,
+                         vmax=100, cbar=False, linewidths=.07,
+                         yticklabels=heatmap.stations, xticklabels=1)
+    ax.set_ylabel(ylabel='Stations',
+                  fontdict={'fontsize': 18, 'fontweight': 'bold'})
+    ax.set_yticklabels(ax.get_yticklabels(), fontdict={'fontsize': 10})
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=80,
+                       fontdict={'fontsize': 14})
+    ax2 = seaborn.heatmap(heatmap.parsed_data, ax=ax.twinx(), center=95,
+                          vmin=0, vmax=100, cbar_kws={'pad': 0.12},
+                          cmap='coolwarm_r', linewidths=.07,
+                          yticklabels=heatmap.percentages['percentages'],
+                          xticklabels=1)
+    ax2.set_yticklabels(ax2.get_yticklabels(), fontdict={'fontsize': 10})
+    ax2.set_ylabel(ylabel='Total Percentages',
+                   fontdict={'fontsize': 18, 'fontweight': 'bold'})
+    ax2.set_title(**heatmap.get_title_args())
+    fig.tight_layout()
+    return fig
+
+
+def legacy_png(fig: Figure) -> bytes:
+    # The web application encoded the figure with a tight bounding box.
+    img = BytesIO()
+    fig.savefig(img, format='png', bbox_inches='tight')
+    return img.getvalue()
+
+
+def best_of(function, repeat: int) -> tuple[float, object]:
+    timings, result = list(), None
+    for _ in range(repeat):
+        tic = perf_counter()
+        result = function()
+        timings.append(perf_counter() - tic)
+    return min(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Time rendering and encoding heatmaps of many stations '
+                    'in every image format.'
+    )
+    parser.add_argument('--stations', type=int, nargs='+',
+                        default=[100, 300, 1000])
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--group', default='W')
+    parser.add_argument('--dpi', type=int, nargs='+', default=[100, 200])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-legacy', action='store_true',
+                        help='Skip the seaborn figure of previous versions.')
+    args = parser.parse_args()
+
+    for n_stations in args.stations:
+        with TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir, 'cache')
+            write_cache(synthetic.raw_data(n_stations=n_stations,
+                                           years=args.years,
+                                           start='2020-01-01'), cache_path)
+            settings = YamlSettings(
+                cache_path=cache_path, domain='atc', start='2020-01-01',
+                end=f'{2020 + args.years - 1}-12-31', group=args.group,
+                output_dir=tmp_dir
+            )
+            heatmap = Heatmap(settings=settings)
+            # Aggregate beforehand, only drawing and encoding are timed.
+            bins = heatmap.parsed_data.shape[1]
+            print(f'{n_stations} stations x {bins} bins')
+            seconds, fig = best_of(lambda: plot_figures(heatmap),
+                                   args.repeat)
+            print(f'\t{"figure":18s} {seconds * 1000:8.1f} ms')
+            for image_format in IMAGE_FORMATS:
+                for dpi in args.dpi:
+                    seconds, image = best_of(
+                        lambda: encode(fig, image_format, dpi), args.repeat
+                    )
+                    print(f'\t{image_format:5s} {dpi:4d} dpi     '
+                          f'{seconds * 1000:8.1f} ms '
+                          f'{len(image) / 1024:8.1f} KiB')
+            if not args.no_legacy:
+                seconds, fig = best_of(lambda: legacy_figure(heatmap),
+                                       args.repeat)
+                print(f'\t{"legacy figure":18s} {seconds * 1000:8.1f} ms')
+                seconds, image = best_of(lambda: legacy_png(fig),
+                                         args.repeat)
+                print(f'\t{"legacy png 100 dpi":18s} '
+                      f'{seconds * 1000:8.1f} ms '
+                      f'{len(image) / 1024:8.1f} KiB')
+    return
+
+
+if __name__ == '__main__':
+    main()
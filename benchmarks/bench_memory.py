@@ -0,0 +1,76 @@
+# Standard library imports.
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import argparse
+# Related third party imports.
+import pandas as pd
+import pyarrow.feather as feather
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.cache import (columnar_path, expand_raw_data, read_cache,
+                       write_cache)
+
+
+# Synthetic stand-ins for the domains whose cache is missing. Ecosystem
+# stations mostly submit daily files starting at midnight.
+DOMAINS = {
+    'atmosphere': dict(n_stations=150, years=10, outages=3, overlap=0.05),
+    'ecosystem': dict(n_stations=100, years=10, outages=3, midnight=0.9),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Report the memory of the raw data of both domains in '
+                    'the legacy, timestamped and compact layouts.'
+    )
+    parser.add_argument('--cache-dir', type=Path, default=Path('.'),
+                        help='Directory of `<domain>_cache.feather` '
+                             'files, synthetic data is used for missing '
+                             'ones.')
+    args = parser.parse_args()
+
+    for domain, params in DOMAINS.items():
+        cache_path = args.cache_dir / f'{domain}_cache'
+        if columnar_path(cache_path).exists():
+            raw_data, source = read_cache(cache_path), str(cache_path)
+        else:
+            raw_data, source = synthetic.raw_data(**params), 'synthetic'
+        print(f'{domain} ({source}): {len(raw_data)} data objects, '
+              f'{raw_data["station"].nunique()} stations')
+        layouts = layout_sizes(raw_data)
+        compact = layouts['compact'][0]
+        for name, (in_memory, on_disk) in layouts.items():
+            print(f'\t{name:12s} {in_memory / 2 ** 20:7.1f} MiB in memory '
+                  f'({in_memory / len(raw_data):4.1f} B per object, '
+                  f'{in_memory / compact:3.1f}x), '
+                  f'{on_disk / 2 ** 20:7.1f} MiB on disk')
+    return
+
+
+def layout_sizes(raw_data: pd.DataFrame) -> dict[str, tuple[int, int]]:
+    """Return the bytes in memory and on disk of each layout."""
+    timestamped = expand_raw_data(raw_data)
+    # Before the columnar cache the frame also held a copy of the start
+    # times and the stations as python strings.
+    legacy = timestamped.assign(start=timestamped.index,
+                                station=timestamped['station'].astype(str))
+    sizes = dict()
+    with TemporaryDirectory() as tmp_dir:
+        for name, frame in (('legacy', legacy),
+                            ('timestamped', timestamped),
+                            ('compact', raw_data)):
+            path = Path(tmp_dir, name)
+            if name == 'compact':
+                write_cache(frame, path)
+                path = columnar_path(path)
+            else:
+                feather.write_feather(frame.reset_index(), path,
+                                      compression='uncompressed')
+            sizes[name] = (int(frame.memory_usage(deep=True).sum()),
+                           path.stat().st_size)
+    return sizes
+
+
+if __name__ == '__main__':
+    main()
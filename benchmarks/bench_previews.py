@@ -0,0 +1,116 @@
+# Standard library imports.
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import argparse
+import os
+import subprocess
+import sys
+# Local application/library specific imports.
+from benchmarks import synthetic
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# Each pipeline runs in its own interpreter, so its peak memory is
+# its own.
+LEGACY = '''
+import sys
+import matplotlib
+matplotlib.use('agg')
+import matplotlib.colors
+import matplotlib.pyplot as plt
+import geopandas as gpd
+import xarray
+
+
+def plot_var(emis, var, vmin=1, vmax=10000, city='Zürich'):
+    # The plot of `src/previews/cityEmissionsNetcdf.py` before
+    # `src.previews.netcdf`, without the basemap tiles.
+    xarr = emis[var]
+    df = xarr.to_dataframe().reset_index()
+    gdf = gpd.GeoDataFrame(df[var],
+                           geometry=gpd.points_from_xy(df.lon, df.lat),
+                           crs='EPSG:4326')
+    fig, ax = plt.subplots(1, figsize=(9, 9))
+    ax.axis('off')
+    ax = gdf.to_crs('EPSG:3857').plot(
+        ax=ax, column=var, markersize=10,
+        norm=matplotlib.colors.LogNorm(vmin, vmax), edgecolor='0.2',
+        linewidth=0, alpha=0.7
+    )
+    sm = plt.cm.ScalarMappable(norm=matplotlib.colors.LogNorm(vmin, vmax),
+                               cmap='viridis')
+    sm._A = []
+    cbaxes = fig.add_axes([1.0, 0.45, 0.02, 0.4])
+    fig.colorbar(sm, cax=cbaxes,
+                 label=emis[var].comment + '\\n' + emis[var].units)
+    ax.set_title('ICOS Cities\\n' + city + ': ' + emis[var].long_name)
+    fig.savefig(var + '.png', dpi=150, bbox_inches='tight')
+    plt.close(fig)
+
+
+emis = xarray.open_dataset(sys.argv[1])
+for var in emis.data_vars:
+    plot_var(emis, var)
+'''
+CURRENT = '''
+import sys
+from src.previews.netcdf import NetcdfPreview
+NetcdfPreview(sys.argv[1]).save_all(
+    workers=int(sys.argv[2]) if len(sys.argv) > 2 else None
+)
+'''
+# Printed last by both pipelines, in KiB. Workers are children.
+PEAK_MEMORY = '''
+import resource
+print(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+          resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+'''
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Time the NetCDF previews of synthetic city emission '
+                    'grids against the script of previous versions.'
+    )
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 300, 1000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 6])
+    parser.add_argument('--no-legacy', action='store_true',
+                        help='Skip the geopandas script, slow for large '
+                             'grids.')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'emissions.nc')
+            dataset = synthetic.emissions(size=size)
+            dataset.to_netcdf(path)
+            print(f'{size} x {size} cells, {len(dataset.data_vars)} '
+                  f'variables, {path.stat().st_size / 2 ** 20:.1f} MiB')
+            runs = [(f'previews {workers} workers', CURRENT, [str(workers)])
+                    for workers in args.workers]
+            if not args.no_legacy:
+                runs.append(('legacy script', LEGACY, []))
+            for name, code, extra_args in runs:
+                out_dir = Path(tmp_dir, name.replace(' ', '_'))
+                out_dir.mkdir()
+                seconds, peak = run(code, [str(path), *extra_args], out_dir)
+                print(f'\t{name:20s} {seconds:6.2f} s '
+                      f'{peak / 2 ** 20:8.1f} MiB peak')
+    return
+
+
+def run(code: str, args: list[str], cwd: Path) -> tuple[float, int]:
+    """Return the wall time and the peak memory of the largest process."""
+    tic = perf_counter()
+    stdout = subprocess.run(
+        [sys.executable, '-c', code + PEAK_MEMORY, *args], cwd=cwd,
+        check=True, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONPATH=str(ROOT), MPLBACKEND='agg')
+    ).stdout
+    return perf_counter() - tic, int(stdout.split()[-1]) * 1024
+
+
+if __name__ == '__main__':
+    main()
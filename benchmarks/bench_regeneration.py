@@ -0,0 +1,121 @@
+# Standard library imports.
+from contextlib import redirect_stdout
+from dataclasses import replace
+from pathlib import Path
+from time import perf_counter
+import argparse
+import io
+import tempfile
+# Related third party imports.
+import pandas as pd
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.batch import run_batch
+from src.cache import write_cache
+from src.heatmap import gimme_heatmaps
+from src.profiling import collect
+from src.settings import YamlSettings
+
+
+# Stages doing the work an unchanged rerun has to skip.
+WORK_STAGES = ('binning', 'trailing_windows', 'rendering', 'image_encode',
+               'image_write', 'csv_write')
+
+
+def run(generate) -> tuple[float, dict, object]:
+    # Silence the progress messages, return the time, the stages and
+    # the summary of a run.
+    with redirect_stdout(io.StringIO()), collect() as timings:
+        tic = perf_counter()
+        summary = generate()
+        seconds = perf_counter() - tic
+    return seconds, timings.totals(), summary
+
+
+def check(name: str, generate, skipped: set[str] | None = None,
+          stations: tuple[str, ...] = ()) -> None:
+    """Run `generate` and check which outputs it skipped.
+
+    All outputs are expected to be skipped unless `skipped` lists
+    them. Regenerated outputs are expected to list `stations`.
+    """
+    seconds, stages, summary = run(generate)
+    expected = set(summary.changes) if skipped is None else skipped
+    actual = {out for out, change in summary.changes.items()
+              if change.skipped}
+    assert actual == expected, (name, actual, expected)
+    for out, change in summary.changes.items():
+        if not change.skipped and stations:
+            assert change.stations == stations, (out, change)
+    work = [stage for stage in WORK_STAGES if stage in stages]
+    if skipped is None:
+        assert not work, (name, work)
+    print(f'\t{name:<34} {seconds:6.2f} s, '
+          f'{len(actual)} of {len(summary.changes)} skipped, '
+          f'work: {", ".join(work) or "none"}')
+    return
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Check that unchanged outputs are not regenerated.'
+    )
+    parser.add_argument('--stations', type=int, default=100)
+    parser.add_argument('--years', type=int, default=3)
+    args = parser.parse_args()
+
+    data = synthetic.raw_data(n_stations=args.stations, years=args.years)
+    first = pd.Timestamp(data['start'].min(), unit='s').year + 1
+    last = pd.Timestamp(data['start'].max(), unit='s').year
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        cache_path = tmp_dir / 'atmosphere_cache'
+        write_cache(data, cache_path)
+        base = YamlSettings(cache_path=cache_path, domain='atc',
+                            start=f'{first}-01-01', end=f'{last}-12-31',
+                            file_name_period='all',
+                            output_dir=str(tmp_dir))
+        reports = [replace(base, group=group, start=f'{year}-01-01',
+                           end=f'{year}-12-31', file_name_period=str(year))
+                   for year in range(first, last + 1) for group in 'MW']
+        print(f'{args.stations} stations, {first} - {last}')
+
+        def single() -> object:
+            return gimme_heatmaps(base, groups=['M', 'W', 'Q'],
+                                  trailing=[30])
+
+        def batch() -> object:
+            return run_batch(reports, workers=1)
+
+        seconds, _, _ = run(single)
+        print(f'\t{"first run":<34} {seconds:6.2f} s')
+        check('unchanged rerun', single)
+        seconds, _, _ = run(batch)
+        print(f'\t{"first batch":<34} {seconds:6.2f} s')
+        check('unchanged batch rerun', batch)
+
+        # A refresh without new data objects rewrites the cache.
+        write_cache(data, cache_path)
+        check('rerun after an empty refresh', single)
+
+        # A new data object of one station in the last year.
+        station = data['station'].iloc[0]
+        added = data.iloc[:1].copy()
+        added['start'] = pd.Timestamp(f'{last}-06-01 12:00',
+                                      tz='UTC').value // 10 ** 9
+        write_cache(pd.concat([data, added], ignore_index=True), cache_path)
+        check('rerun after one new object', single, skipped=set(),
+              stations=(station,))
+        check('batch rerun after one new object', batch,
+              skipped={f'heatmap_atc_{group}_{year}.png'
+                       for year in range(first, last) for group in 'mw'},
+              stations=(station,))
+        check('rerun with --force', lambda: run_batch(reports, workers=1,
+                                                      force=True),
+              skipped=set())
+    print('\tunchanged reruns did no work')
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Standard library imports.
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import argparse
+import contextlib
+import gc
+import io
+import sys
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.cache import write_cache
+from src.dataset import memory_usage
+from src.heatmap import Heatmap
+from src.settings import YamlSettings
+
+
+def render(settings: YamlSettings) -> bytes:
+    return Heatmap(settings=settings).image()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Render heatmaps concurrently and repeatedly to check '
+                    'for interference between threads and memory growth.'
+    )
+    parser.add_argument('--stations', type=int, default=20)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--renders', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    # Silence the progress messages of `save_to_files`. Redirecting
+    # stdout is global, so it is done once for all threads.
+    report = sys.stdout
+    with TemporaryDirectory() as tmp_dir, \
+            contextlib.redirect_stdout(io.StringIO()):
+        cache_path = Path(tmp_dir, 'cache')
+        data = synthetic.raw_data(n_stations=args.stations,
+                                  years=args.years, start='2020-01-01')
+        write_cache(data, cache_path)
+        base = YamlSettings(cache_path=cache_path, domain='atc',
+                            start='01/01/2020', end='31/12/2021',
+                            output_dir=tmp_dir)
+        variants = [
+            replace(base, group=group, start=start,
+                    title_period=f'{group} {start}',
+                    file_name_period=f'{i}')
+            for i, (group, start) in enumerate([('M', '01/01/2020'),
+                                                ('W', '01/01/2020'),
+                                                ('M', '01/01/2021'),
+                                                ('W', '01/07/2021')])
+        ]
+
+        # Concurrent renders must match the serially rendered images.
+        expected = [render(settings) for settings in variants]
+        jobs = variants * args.threads
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            rendered = list(pool.map(render, jobs))
+        mismatches = sum(image != expected[i % len(variants)]
+                         for i, image in enumerate(rendered))
+        print(f'{len(jobs)} renders on {args.threads} threads, '
+              f'{mismatches} differ from the serial renders', file=report)
+
+        tic = perf_counter()
+        for i in range(1, args.renders + 1):
+            render(variants[i % len(variants)])
+            if i % 100 == 0:
+                gc.collect()
+                usage = memory_usage()
+                rss = usage.get('VmRSS', usage.get('maxrss'))
+                print(f'\t{i:5d} renders {perf_counter() - tic:7.1f} s '
+                      f'RSS {rss / 1024:7.1f} MiB', file=report)
+    return
+
+
+if __name__ == '__main__':
+    main()
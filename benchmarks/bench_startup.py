@@ -0,0 +1,158 @@
+# Standard library imports.
+from collections import defaultdict
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+from urllib.error import URLError
+from urllib.request import urlopen
+import argparse
+import os
+import socket
+import subprocess
+import sys
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# Arguments of the interpreter for every timed command. The runner
+# exits after parsing `--help`, so only its imports are timed. The web
+# application is imported by every gunicorn worker without
+# `preload_app`, and by the master process only with it.
+COMMANDS = {
+    'runner': ['runner.py', '--help'],
+    'app import': ['-c', 'import src.app'],
+}
+# Longest wait for gunicorn to answer its first request.
+BOOT_TIMEOUT = 60
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Time the cold start of the runner and of the web '
+                    'application, optionally against another commit.'
+    )
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Runs per measurement, the median is kept.')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Number of gunicorn workers booted.')
+    parser.add_argument('--baseline', metavar='GIT_REF',
+                        help='Commit to compare with, e.g. HEAD~1.')
+    parser.add_argument('--top', type=int, default=8,
+                        help='Number of slowest imported packages listed.')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp_dir:
+        results = {'current': measure(ROOT, Path(tmp_dir), args)}
+        if args.baseline:
+            worktree = Path(tmp_dir, 'baseline')
+            subprocess.run(['git', 'worktree', 'add', '--detach', '--quiet',
+                            str(worktree), args.baseline],
+                           cwd=ROOT, check=True)
+            try:
+                results['baseline'] = measure(worktree, Path(tmp_dir), args)
+            finally:
+                subprocess.run(['git', 'worktree', 'remove', '--force',
+                                str(worktree)], cwd=ROOT, check=True)
+
+    for name, seconds in results['current'].items():
+        line = f'\t{name:24s} {seconds * 1000:8.1f} ms'
+        if 'baseline' in results:
+            old = results['baseline'][name]
+            line += f' (baseline {old * 1000:8.1f} ms, ' \
+                    f'{seconds / old - 1:+6.1%})'
+        print(line)
+    return
+
+
+def measure(root: Path, tmp_dir: Path, args) -> dict[str, float]:
+    print(f'{root} ({git_commit(root) or "unknown commit"}):')
+    # No raw data caches in the working directory, so only importing
+    # and booting are timed.
+    work_dir = tmp_dir / 'work'
+    work_dir.mkdir(exist_ok=True)
+    env = dict(os.environ, PYTHONPATH=str(root))
+    results = dict()
+    for name, command in COMMANDS.items():
+        command = [sys.executable, *command]
+        if command[1].endswith('.py'):
+            command[1] = str(root / command[1])
+        # A first run compiles the bytecode, it is not timed.
+        run(command, work_dir, env)
+        results[name] = median(run(command, work_dir, env)
+                               for _ in range(args.repeat))
+        print(f'\t{name}, slowest imports (cumulative self time):')
+        for package, seconds in slowest_imports(command, work_dir, env,
+                                                args.top):
+            print(f'\t\t{package:20s} {seconds * 1000:7.1f} ms')
+    gunicorn_boot(root, work_dir, env, args.workers)
+    results[f'gunicorn {args.workers} workers'] = median(
+        gunicorn_boot(root, work_dir, env, args.workers)
+        for _ in range(args.repeat)
+    )
+    return results
+
+
+def run(command: list[str], cwd: Path, env: dict) -> float:
+    tic = perf_counter()
+    subprocess.run(command, cwd=cwd, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return perf_counter() - tic
+
+
+def slowest_imports(command: list[str], cwd: Path, env: dict,
+                    top: int) -> list[tuple[str, float]]:
+    """Return the import time per top level package of a command."""
+    stderr = subprocess.run(
+        [command[0], '-X', 'importtime', *command[1:]], cwd=cwd, env=env,
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        text=True
+    ).stderr
+    packages = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        packages[module.strip().split('.')[0]] += int(self_us) / 1e6
+    return sorted(packages.items(), key=lambda item: -item[1])[:top]
+
+
+def gunicorn_boot(root: Path, cwd: Path, env: dict, workers: int) -> float:
+    """Time gunicorn from its start until a worker answers a request."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    tic = perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c',
+         str(root / 'gunicorn.conf.py'), '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), 'src.app:app'],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if perf_counter() - tic > BOOT_TIMEOUT or \
+                    server.poll() is not None:
+                raise RuntimeError('Gunicorn did not boot.')
+            try:
+                with urlopen(f'http://127.0.0.1:{port}/metrics', timeout=1):
+                    return perf_counter() - tic
+            except (URLError, ConnectionError):
+                sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit(root: Path) -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True, cwd=root
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# Standard library imports.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import sleep
+import json
+import re
+# Related third party imports.
+import numpy as np
+import pandas as pd
+# Local application/library specific imports.
+from src.cache import time_end, time_start
+
+
+COLUMNS = ['spec', 'submTime', 'timeStart', 'timeEnd', 'fileName']
+# Optional columns of `rows`: an earlier version of the data object of
+# the row, see `src.sparql.PREVIOUS_VERSIONS`.
+PREVIOUS_COLUMNS = ['prevTimeStart', 'prevTimeEnd', 'prevFileName']
+
+
+def sparql_rows(raw_data: pd.DataFrame, obj_specs: list[str],
+                seed: int = 0) -> pd.DataFrame:
+    """Turn a synthetic raw data frame into raw data query results.
+
+    Every data object is assigned one of `obj_specs` at random and is
+    submitted a day after it ends.
+    """
+    rng = np.random.default_rng(seed)
+    started, ended = time_start(raw_data), time_end(raw_data)
+    return pd.DataFrame({
+        'spec': np.array([spec.strip('<>') for spec in obj_specs])[
+            rng.integers(0, len(obj_specs), len(raw_data))
+        ],
+        'submTime': (ended + pd.Timedelta(days=1)).strftime(
+            '%Y-%m-%dT%H:%M:%S.%fZ'
+        ),
+        'timeStart': started.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'timeEnd': ended.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'fileName': [f'{station}_L0_{i}.dat' for i, station
+                     in enumerate(raw_data['station'].astype(str))],
+    })
+
+
+class MockSparqlServer:
+    """Local stand-in for the ICOS SPARQL endpoint.
+
+    Answers the raw data query (see `src.sparql.build_query`) from
+    `rows`, honouring the object specification, submission time and
+    start time filters as well as LIMIT and OFFSET. Data objects with
+    earlier versions have a row per version, with `PREVIOUS_COLUMNS`.
+    Only incremental queries select them. `latency` seconds
+    plus `row_latency` per returned row are spent on every request and
+    the first `failures` requests are answered with 503.
+
+    Usage:
+        with MockSparqlServer(rows) as server:
+            SparqlClient(endpoint=server.url)(query)
+    """
+
+    def __init__(self, rows: pd.DataFrame, latency: float = 0.0,
+                 row_latency: float = 0.0, failures: int = 0) -> None:
+        self.rows = rows.assign(
+            submitted=pd.to_datetime(rows['submTime'], format='ISO8601'),
+            started=pd.to_datetime(rows['timeStart'], format='ISO8601'),
+        ).sort_values(['submitted', 'fileName'], ascending=[False, True])
+        self.latency = latency
+        self.row_latency = row_latency
+        self.failures = failures
+        self.requests = 0
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                           self._handler())
+        self._thread = Thread(target=self._server.serve_forever,
+                              daemon=True)
+        return
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/sparql'
+
+    def __enter__(self) -> 'MockSparqlServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        return
+
+    def answer(self, query: str) -> pd.DataFrame:
+        rows = self.rows
+        specs = re.search(r'VALUES \?spec \{(.*?)\}', query).group(1)
+        rows = rows[rows['spec'].isin(re.findall(r'<(.*?)>', specs))]
+        columns = COLUMNS
+        if 'isNextVersionOf+' in query:
+            columns = columns + [column for column in PREVIOUS_COLUMNS
+                                 if column in rows.columns]
+        else:
+            rows = rows.drop_duplicates('fileName')
+        submitted = re.search(r'\?submTime > "(.*?)"', query)
+        if submitted:
+            rows = rows[rows['submitted'] > pd.Timestamp(submitted[1])]
+        started = re.search(r'\?timeStart >= "(.*?)"', query)
+        if started:
+            rows = rows[rows['started'] >= pd.Timestamp(started[1])]
+        started = re.search(r'\?timeStart < "(.*?)"', query)
+        if started:
+            rows = rows[rows['started'] < pd.Timestamp(started[1])]
+        page = re.search(r'limit (\d+) offset (\d+)', query)
+        if page:
+            limit, offset = int(page[1]), int(page[2])
+            rows = rows.iloc[offset:offset + limit]
+        return rows[columns]
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                length = int(self.headers['Content-Length'])
+                query = self.rfile.read(length).decode('utf-8')
+                with server._lock:
+                    server.requests += 1
+                    failing = server.requests <= server.failures
+                if failing:
+                    self.send_error(503)
+                    return
+                rows = server.answer(query)
+                sleep(server.latency + server.row_latency * len(rows))
+                body = json.dumps({
+                    'head': {'vars': list(rows.columns)},
+                    'results': {'bindings': [
+                        {key: {'type': 'literal', 'value': value}
+                         for key, value in zip(rows.columns, row)
+                         if pd.notna(value)}
+                        for row in rows.itertuples(index=False)
+                    ]}
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'application/sparql-results+json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            def log_message(self, *args) -> None:
+                return
+
+        return Handler
@@ -0,0 +1,216 @@
+# Standard library imports.
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.cache import export_csv, read_cache, read_csv_cache, write_cache
+from src.cube import cube_path, load_cube
+from src.heatmap import Heatmap
+from src.profiling import collect
+from src.settings import YamlSettings
+
+
+HISTORY = Path(__file__).with_name('history.json')
+# Differences below this many seconds are noise, whatever the ratio.
+NOISE_FLOOR = 0.005
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Time the heatmap pipeline on synthetic raw data, '
+                    'record the results and flag regressions.'
+    )
+    parser.add_argument('--stations', type=int, default=300)
+    parser.add_argument('--years', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per measurement, the fastest is kept.')
+    parser.add_argument('--history', type=Path, default=HISTORY,
+                        help='Json file the results are appended to.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slowdown flagged as a regression.')
+    parser.add_argument('--no-record', action='store_true',
+                        help='Compare with the history without adding '
+                             'the results to it.')
+    args = parser.parse_args()
+
+    params = {'stations': args.stations, 'years': args.years}
+    data = synthetic.raw_data(n_stations=args.stations, years=args.years,
+                              start='2016-01-01', outages=3, overlap=0.05,
+                              midnight=0.3)
+    print(f'{len(data)} data objects, {args.stations} stations, '
+          f'{args.years} years')
+    # Silence the progress messages of the pipeline.
+    report = sys.stdout
+    with TemporaryDirectory() as tmp_dir, \
+            contextlib.redirect_stdout(io.StringIO()):
+        results = run_suite(data, Path(tmp_dir), args.years, args.repeat)
+
+    history = read_history(args.history)
+    previous = next((entry for entry in reversed(history)
+                     if entry['params'] == params), None)
+    regressions = compare(results, previous, args.threshold, report)
+    if not args.no_record:
+        history.append({
+            'timestamp': datetime.now(timezone.utc).isoformat(
+                timespec='seconds'
+            ),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'params': params,
+            'results': results,
+        })
+        args.history.write_text(json.dumps(history, indent=2) + '\n')
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond '
+              f'{args.threshold:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+    return
+
+
+def run_suite(data, tmp_dir: Path, years: int,
+              repeat: int) -> dict[str, float]:
+    results = dict()
+    cache_path = tmp_dir / 'atmosphere_cache'
+    write_cache(data, cache_path)
+    export_csv(data, tmp_dir / 'cache.csv')
+    results['cache.read_feather'] = best_of(
+        lambda: read_cache(cache_path), repeat
+    )
+    results['cache.read_csv'] = best_of(
+        lambda: read_csv_cache(tmp_dir / 'cache.csv'), repeat
+    )
+    raw_data = read_cache(cache_path)
+
+    def build_cube() -> None:
+        cube_path(cache_path).unlink(missing_ok=True)
+        load_cube(cache_path, raw_data)
+    results['cube.build'] = best_of(build_cube, repeat)
+
+    base = YamlSettings(cache_path=cache_path, domain='atc',
+                        start='2017-01-01', end=f'{2016 + years - 1}-12-31',
+                        output_dir=str(tmp_dir))
+    for group in ('M', 'W'):
+        # Midnight windows are binned from the cube, other windows from
+        # the raw data.
+        for path, start in (('cube', base.start),
+                            ('raw', f'{base.start} 12:00')):
+            settings = replace(base, group=group, start=start)
+            stages = best_stages(
+                lambda: Heatmap(settings=settings).save_to_files(), repeat
+            )
+            for name, seconds in stages.items():
+                results[f'heatmap.{group}.{path}.{name}'] = seconds
+
+    # The web application loads `<domain>_cache` from the working
+    # directory on import.
+    cwd = os.getcwd()
+    (tmp_dir / 'output').mkdir()
+    os.chdir(tmp_dir)
+    try:
+        import src.app as web
+        from src.result_cache import ResultCache
+        client = web.app.test_client()
+        form = dict(domain='atmosphere', start=base.start, end=base.end,
+                    group='monthly', main_title_period='x',
+                    side_title_period='x')
+
+        def request(method, url: str, status: int = 200, **kwargs):
+            response = client.open(url, method=method, **kwargs)
+            assert response.status_code == status, response.status_code
+            return response
+
+        def html() -> None:
+            # A fresh result cache, so the heatmap is rendered.
+            web.result_cache = ResultCache()
+            request('POST', '/', data=form)
+        results['flask.html'] = best_of(html, repeat)
+        query = f'/api/coverage?domain=atmosphere&start={base.start}' \
+                f'&end={base.end}&group=W'
+        results['flask.api_json'] = best_of(
+            lambda: request('GET', query), repeat
+        )
+        etag = request('GET', query).headers['ETag']
+        results['flask.api_304'] = best_of(
+            lambda: request('GET', query, status=304,
+                            headers={'If-None-Match': etag}),
+            repeat
+        )
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def best_of(function, repeat: int) -> float:
+    timings = list()
+    for _ in range(repeat):
+        tic = perf_counter()
+        function()
+        timings.append(perf_counter() - tic)
+    return min(timings)
+
+
+def best_stages(function, repeat: int) -> dict[str, float]:
+    """Run `function` and keep the fastest time of each of its stages."""
+    best = dict()
+    for _ in range(repeat):
+        tic = perf_counter()
+        with collect() as timings:
+            function()
+        totals = {'total': perf_counter() - tic, **timings.totals()}
+        for name, seconds in totals.items():
+            best[name] = min(seconds, best.get(name, seconds))
+    return best
+
+
+def read_history(path: Path) -> list[dict]:
+    if not path.exists():
+        return list()
+    return json.loads(path.read_text())
+
+
+def compare(results: dict[str, float], previous: dict | None,
+            threshold: float, report) -> list[str]:
+    """Print the results next to the previous ones, return regressions."""
+    regressions = list()
+    if previous is None:
+        print('No previous results with the same parameters.', file=report)
+    else:
+        print(f'Compared to {previous["timestamp"]} '
+              f'({previous.get("commit") or "unknown commit"}):',
+              file=report)
+    for name, seconds in results.items():
+        line = f'\t{name:40s} {seconds * 1000:9.1f} ms'
+        old = previous['results'].get(name) if previous else None
+        if old:
+            change = seconds / old - 1
+            line += f' {change:+7.1%}'
+            if change > threshold and seconds - old > NOISE_FLOOR:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line, file=report)
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Standard library imports.
+import string
+# Related third party imports.
+import numpy as np
+import pandas as pd
+# Local application/library specific imports.
+from src.cache import compact_raw_data
+
+
+def station_names(n_stations: int) -> list[str]:
+    letters = string.ascii_uppercase
+    return [
+        letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26]
+        for i in range(n_stations)
+    ]
+
+
+def raw_data(n_stations: int = 500, years: int = 10,
+             start: str = '2015-01-01', seed: int = 0, outages: int = 0,
+             overlap: float = 0.0, midnight: float = 0.0) -> pd.DataFrame:
+    """Generate raw data in the compact layout of the cache.
+
+    Every station submits roughly one data object per day with an
+    irregular duration. Stations join and leave at random dates and
+    have gaps of missing days. Optionally:
+    - `outages`: Up to this many outages of one to eight weeks per
+      station.
+    - `overlap`: Fraction of the stations running a second instrument
+      over part of their span, so their days add up to more than 100 %
+      like station 'LMP' in 10/21.
+    - `midnight`: Fraction of the data objects starting exactly at
+      midnight, like daily files.
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start=start, periods=365 * years, freq='D',
+                         tz='UTC')
+    frames = list()
+    for station in station_names(n_stations):
+        first, last = np.sort(rng.integers(0, len(days), size=2))
+        station_days = days[first:last + 1]
+        station_days = station_days[rng.random(len(station_days)) > 0.1]
+        for _ in range(rng.integers(0, outages + 1) if outages else 0):
+            if not len(station_days):
+                break
+            outage_start = station_days[0] + pd.Timedelta(
+                days=int(rng.integers(0, max(last - first, 1)))
+            )
+            outage_end = outage_start + pd.Timedelta(
+                weeks=int(rng.integers(1, 9))
+            )
+            station_days = station_days[(station_days < outage_start) |
+                                        (station_days >= outage_end)]
+        instruments = [station_days]
+        if overlap and len(station_days) and rng.random() < overlap:
+            # The second instrument runs for a random part of the span.
+            a, b = np.sort(rng.integers(0, len(station_days), size=2))
+            instruments.append(station_days[a:b + 1])
+        for instrument_days in instruments:
+            frames.append(_objects(rng, instrument_days, station, midnight))
+    data = pd.concat(frames, ignore_index=True).sort_values('timeStart')
+    return compact_raw_data(data['timeStart'], data['timeEnd'],
+                            data['station'])
+
+
+def _objects(rng: np.random.Generator, station_days: pd.DatetimeIndex,
+             station: str, midnight: float) -> pd.DataFrame:
+    offsets = rng.integers(0, 3600, len(station_days))
+    if midnight:
+        offsets[rng.random(len(station_days)) < midnight] = 0
+    offsets = pd.to_timedelta(offsets, unit='s')
+    durations = pd.to_timedelta(
+        rng.choice([86400, 86400, 86400, 43200, 1800, 90000],
+                   size=len(station_days)) -
+        rng.integers(0, 600, len(station_days)),
+        unit='s'
+    )
+    time_start = station_days + offsets
+    return pd.DataFrame({'timeStart': time_start,
+                         'timeEnd': time_start + durations,
+                         'station': station})
+
+
+def emissions(size: int = 100, seed: int = 0,
+              variables: tuple[str, ...] = ('CO2', 'CH4', 'N2O', 'NOx',
+                                            'PM10ex', 'PM25ex')):
+    """Generate a city emission inventory like those of ICOS Cities.
+
+    A `size` x `size` grid of about 100 m cells around Zürich, with
+    log-normal emissions per cell peaking in the city centre.
+    """
+    import xarray
+    rng = np.random.default_rng(seed)
+    lat = 47.37 + (np.arange(size) - size / 2) * 0.0009
+    lon = 8.54 + (np.arange(size) - size / 2) * 0.0013
+    distance = np.hypot(*np.meshgrid(np.linspace(-1, 1, size),
+                                     np.linspace(-1, 1, size)))
+    data_vars = dict()
+    for i, gas in enumerate(variables):
+        values = 10.0 ** (2 - 3 * distance - i / 2) * \
+            rng.lognormal(sigma=1, size=(size, size))
+        data_vars[f'emi_{gas}_all_sectors'] = xarray.DataArray(
+            values.astype('float32'), dims=('lat', 'lon'),
+            attrs={'long_name': f'{gas} emissions of all sectors',
+                   'units': 't/yr', 'comment': 'per grid cell'}
+        )
+    return xarray.Dataset(data_vars, coords={'lat': lat, 'lon': lon})
@@ -0,0 +1,31 @@
+# Gunicorn settings, see https://docs.gunicorn.org/en/stable/settings.html
+# Local application/library specific imports.
+from src.dataset import memory_usage
+
+
+bind = '0.0.0.0:5000'
+# Import the application, and with it the raw data, in the master
+# process. Forked workers share its memory mapped raw data pages.
+preload_app = True
+
+
+def format_memory_usage() -> str:
+    return ', '.join(f'{key} {value} kB'
+                     for key, value in memory_usage().items())
+
+
+def when_ready(server):
+    # The application is preloaded, but it only imports the plotting
+    # libraries on the first render. Import them in the master as well,
+    # so workers share them instead of each importing its own copy.
+    import src.plotting
+    server.log.info(f'Master memory: {format_memory_usage()}')
+
+
+def post_fork(server, worker):
+    server.log.info(f'Worker {worker.pid} booted, memory: '
+                    f'{format_memory_usage()}')
+
+
+def post_request(worker, req, environ, resp):
+    worker.log.info(f'Worker {worker.pid} memory: {format_memory_usage()}')
@@ -1,6 +1,62 @@
+import argparse
+import cProfile
+import logging
+import tracemalloc
+
+from src.coverage import GROUP_NAMES
 from src.heatmap import gimme_heatmaps
+from src.profiling import collect
 from src.settings import Settings
 
 
+parser = argparse.ArgumentParser(description='Generate ICOS heatmaps.')
+parser.add_argument('--batch', metavar='REPORTS_YML',
+                    help='Generate all reports listed in a yaml file, '
+                         'e.g. reports.yml, instead of a single heatmap.')
+parser.add_argument('--groups', nargs='+', choices=list(GROUP_NAMES),
+                    help='Save a heatmap per group (daily, weekly, monthly, '
+                         'quarterly or yearly bins) instead of the group of '
+                         'the settings, binned in one pass.')
+parser.add_argument('--trailing', nargs='+', type=int, metavar='DAYS',
+                    help='Also save the coverage of the trailing DAYS long '
+                         'window ending on every day of the period, e.g. '
+                         '30 for the last 30 days per station.')
+parser.add_argument('--force', action='store_true',
+                    help='Regenerate every output, even if its settings and '
+                         'data are unchanged since it was last saved.')
+parser.add_argument('--workers', type=int, default=None,
+                    help='Number of processes rendering a batch.')
+parser.add_argument('--verbose', action='store_true',
+                    help='Log the fetch throughput and per window latency '
+                         'when querying data.')
+parser.add_argument('--timings', action='store_true',
+                    help='Print the time and memory taken by every stage.')
+parser.add_argument('--trace-memory', action='store_true',
+                    help='Trace the memory allocated by every stage, '
+                         'slows the run down.')
+parser.add_argument('--profile', metavar='OUTPUT_PROF',
+                    help='Dump cProfile statistics of the run, e.g. for '
+                         'snakeviz or `python -m pstats`.')
+args = parser.parse_args()
+logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                    format='%(message)s')
+
 settings = Settings().settings
-gimme_heatmaps(settings)
+if args.trace_memory:
+    tracemalloc.start()
+profiler = cProfile.Profile() if args.profile else None
+with collect() as timings:
+    if profiler:
+        profiler.enable()
+    if args.batch:
+        from src.batch import read_reports, run_batch
+        run_batch(read_reports(args.batch, settings), workers=args.workers,
+                  force=args.force)
+    else:
+        gimme_heatmaps(settings, groups=args.groups, trailing=args.trailing,
+                       force=args.force)
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+if args.timings:
+    print(timings.report())
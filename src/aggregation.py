@@ -0,0 +1,104 @@
+# Standard library imports.
+from dataclasses import dataclass
+# Related third party imports.
+import numpy as np
+import pandas as pd
+# Local application/library specific imports.
+from src.coverage import (NS_PER_DAY, NS_PER_HOUR, Coverage, DailyCoverage,
+                          round_percentage, to_utc)
+from src.profiling import stage
+
+
+@dataclass(frozen=True)
+class CumulativeCoverage:
+    """Running totals of the daily coverage of every station.
+
+    `sums[:, i]` holds the measured duration (in nanoseconds) of the
+    days before `days[i]` and `days_with_data[:, i]` the number of
+    those days with data, so the coverage of any window of days takes
+    one subtraction. Both arrays have one more column than `days`, the
+    totals of all days. `first` is the position of each station's
+    first day with data, or `len(days)` without any.
+    """
+    stations: list[str]
+    days: pd.DatetimeIndex
+    sums: np.ndarray
+    days_with_data: np.ndarray
+    first: np.ndarray
+
+    @classmethod
+    @stage('cumulative_sums')
+    def from_daily(cls, daily: DailyCoverage) -> 'CumulativeCoverage':
+        zeros = np.zeros((len(daily.stations), 1), dtype=np.int64)
+        with_data = daily.has_data.any(axis=1)
+        return cls(
+            stations=daily.stations, days=daily.days,
+            sums=np.hstack([zeros, np.cumsum(daily.sums, axis=1)]),
+            days_with_data=np.hstack(
+                [zeros, np.cumsum(daily.has_data, axis=1, dtype=np.int64)]
+            ),
+            first=np.where(with_data, daily.has_data.argmax(axis=1),
+                           len(daily.days))
+        )
+
+    def positions(self, days: pd.DatetimeIndex) -> np.ndarray:
+        # Columns of the running totals before the given midnights.
+        # There is no data before or after the known days.
+        offsets = (days.asi8 - self.days[0].value) // NS_PER_DAY
+        return np.clip(offsets, 0, len(self.days))
+
+    def window(self, start, end) -> pd.DataFrame:
+        """Sum the coverage of every station over the days [start, end].
+
+        Returns the measured hours, the number of days with data and
+        the percentage of the window's time measured per station.
+        Stations without data before `end` have NaN percentages.
+        """
+        start, end = to_utc(start).normalize(), to_utc(end).normalize()
+        if end < start:
+            raise ValueError('Windows end on or after their start.')
+        before, after = self.positions(
+            pd.DatetimeIndex([start, end + pd.Timedelta(days=1)])
+        )
+        measured = self.sums[:, after] - self.sums[:, before]
+        percentage = self._percentage(measured, (end - start).days + 1)
+        percentage[self.first >= after] = np.nan
+        return pd.DataFrame({
+            'hours': measured / NS_PER_HOUR,
+            'days_with_data': self.days_with_data[:, after] -
+            self.days_with_data[:, before],
+            'percentage': percentage,
+        }, index=pd.Index(self.stations, name='station'))
+
+    @stage('trailing_windows')
+    def trailing(self, days: int, start, end) -> Coverage:
+        """Coverage of the `days` long windows ending on [start, end].
+
+        `percentages` has a column per day of [start, end] holding the
+        percentage of the trailing window ending on that day. Windows
+        ending before a station's first day with data are NaN.
+        `totals` holds the latest window of every station.
+        """
+        if days < 1:
+            raise ValueError('Trailing windows span at least one day.')
+        ends = pd.date_range(to_utc(start).normalize(),
+                             to_utc(end).normalize(), freq='D')
+        after = self.positions(ends + pd.Timedelta(days=1))
+        before = self.positions(ends - pd.Timedelta(days=days - 1))
+        measured = self.sums[:, after] - self.sums[:, before]
+        percentages = self._percentage(measured, days)
+        percentages[self.first[:, None] >= after[None, :]] = np.nan
+        return Coverage(
+            percentages=pd.DataFrame(percentages, index=self.stations,
+                                     columns=ends),
+            totals=pd.Series(percentages[:, -1] if len(ends) else np.nan,
+                             index=self.stations, dtype=float)
+        )
+
+    @staticmethod
+    def _percentage(measured: np.ndarray, days: int) -> np.ndarray:
+        # Stations running two or more instruments may measure more
+        # than the window's time.
+        return np.minimum(
+            round_percentage(100 * measured / (days * NS_PER_DAY)), 100
+        )
@@ -0,0 +1,272 @@
+# Standard library imports.
+from dataclasses import replace
+from datetime import date
+from io import BytesIO
+import re
+# Related third party imports.
+from flask import (Blueprint, Response, abort, current_app, jsonify, request,
+                   url_for)
+import pandas as pd
+import pyarrow as pa
+# Local application/library specific imports.
+from src.coverage import Coverage, bin_labels, bin_starts, to_utc
+from src.heatmap import Heatmap
+from src.jobs import DONE, Job, JobQueue
+from src.result_cache import RenderedHeatmap, cache_key
+from src.settings import IMAGE_FORMATS, YamlSettings
+
+
+DOMAINS = ('atmosphere', 'ecosystem')
+GROUPS = {'D': 'D', 'daily': 'D', 'W': 'W', 'weekly': 'W',
+          'M': 'M', 'monthly': 'M', 'Q': 'Q', 'quarterly': 'Q',
+          'Y': 'Y', 'yearly': 'Y'}
+FORMATS = {'json': 'application/json',
+           'csv': 'text/csv',
+           'arrow': 'application/vnd.apache.arrow.stream'}
+# Longest a status request waits for its job, below gunicorn's default
+# worker timeout of 30 s.
+MAX_WAIT = 25
+# Longest trailing window, in days.
+MAX_TRAILING_DAYS = 3660
+# Resolutions of rendered heatmaps, the image of a 16 x 10 inch figure
+# has dpi * 16 pixels in width.
+MIN_DPI, MAX_DPI = 50, 400
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error: BadRequest) -> tuple[Response, int]:
+    return jsonify(error=str(error)), 400
+
+
+@api.route('/coverage', methods=['GET'])
+def coverage() -> Response:
+    """Return the coverage percentages of a heatmap without rendering it.
+
+    Query parameters: `domain` (atmosphere or ecosystem), `start` and
+    `end` dates, `group` (D, W, M, Q, Y or daily, weekly, monthly,
+    quarterly, yearly) and `format` (json, csv or arrow). Responses
+    carry an ETag derived from the parameters and the version of the
+    raw data, a matching If-None-Match header is answered with 304
+    before anything is computed.
+    """
+    settings = read_settings(request.args)
+    return coverage_response(settings, lambda: Heatmap(settings).coverage)
+
+
+@api.route('/coverage/trailing', methods=['GET'])
+def trailing_coverage() -> Response:
+    """Return the coverage of the trailing windows ending on every day.
+
+    Query parameters: `domain`, `days` (the window length, 30 by
+    default), `start` and `end` dates (today by default, that is the
+    window ending today) and `format`. Bins are the days the windows
+    end on and `totals` the latest window of every station.
+    """
+    days = str(request.args.get('days', 30))
+    if not days.isdigit() or not 1 <= int(days) <= MAX_TRAILING_DAYS:
+        raise BadRequest(f'The "days" must be a whole number from 1 to '
+                         f'{MAX_TRAILING_DAYS}.')
+    end = request.args.get('end', date.today().isoformat())
+    settings = replace(
+        read_settings({'start': end, 'end': end, **request.args}),
+        group='D'
+    )
+    return coverage_response(
+        settings, lambda: Heatmap(settings).trailing(int(days)),
+        variant=f'{days}d', days=int(days)
+    )
+
+
+def coverage_response(settings: YamlSettings, compute, variant: str = '',
+                      **extra) -> Response:
+    # Answer with the coverage computed by `compute` in the requested
+    # format, or 304 for an ETag of the same raw data.
+    fmt = request.args.get('format', 'json')
+    if fmt not in FORMATS:
+        raise BadRequest(f'Unknown format "{fmt}", use one of '
+                         f'{", ".join(FORMATS)}.')
+    etag = '-'.join(filter(None, (cache_key(settings)[:32], variant, fmt)))
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        result = compute()
+        if fmt == 'json':
+            response = jsonify(to_json(settings, result, **extra))
+        else:
+            response = Response(
+                to_csv(settings, result) if fmt == 'csv'
+                else to_arrow(settings, result),
+                mimetype=FORMATS[fmt]
+            )
+    response.set_etag(etag)
+    return response
+
+
+def read_settings(args) -> YamlSettings:
+    domain = args.get('domain')
+    if domain not in DOMAINS:
+        raise BadRequest(f'Unknown domain "{domain}", use one of '
+                         f'{", ".join(DOMAINS)}.')
+    group = GROUPS.get(args.get('group', 'M'))
+    if group is None:
+        raise BadRequest(f'Unknown group "{args.get("group")}", use one of '
+                         f'{", ".join(GROUPS)}.')
+    for name in ('start', 'end'):
+        try:
+            # Empty dates parse to NaT.
+            missing = pd.isna(pd.Timestamp(args[name]))
+        except (KeyError, TypeError, ValueError):
+            missing = True
+        if missing:
+            raise BadRequest(f'Missing or invalid "{name}" date.')
+    if to_utc(args['start']) > to_utc(args['end']):
+        raise BadRequest('The "start" date is after the "end" date.')
+    titles = {name: args[key] for key, name in
+              (('main_title_period', 'title_period'),
+               ('side_title_period', 'side_title_period'))
+              if args.get(key)}
+    image = dict()
+    if args.get('image_format'):
+        if args['image_format'] not in IMAGE_FORMATS:
+            raise BadRequest(f'Unknown image format "{args["image_format"]}"'
+                             f', use one of {", ".join(IMAGE_FORMATS)}.')
+        image['image_format'] = args['image_format']
+    if args.get('dpi'):
+        dpi = str(args['dpi'])
+        if not dpi.isdigit() or not MIN_DPI <= int(dpi) <= MAX_DPI:
+            raise BadRequest(f'The "dpi" must be a whole number from '
+                             f'{MIN_DPI} to {MAX_DPI}.')
+        image['dpi'] = int(dpi)
+    return YamlSettings(cache_path=f'{domain}_cache', domain=domain,
+                        start=args['start'], end=args['end'], group=group,
+                        **titles, **image)
+
+
+@api.route('/jobs', methods=['POST'])
+def submit_job() -> tuple[Response, int, dict]:
+    """Queue a heatmap and return its job right away.
+
+    Takes the same fields as the form of the html page, as form data
+    or json. Identical requests in flight share one job.
+    """
+    settings = read_settings(request.get_json(silent=True) or request.form)
+    job = jobs().submit(settings)
+    return jsonify(job_json(job)), 202, \
+        {'Location': url_for('api.job_status', job_id=job.id)}
+
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id: str) -> Response:
+    """Return the status of a job.
+
+    With `wait=<seconds>` the request is held until the job finishes
+    or the time (at most `MAX_WAIT`) passes.
+    """
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_WAIT)
+    except ValueError:
+        raise BadRequest('Invalid "wait" seconds.') from None
+    job = jobs().wait(job_id, wait) if valid_job_id(job_id) else None
+    if job is None:
+        abort(404)
+    return jsonify(job_json(job))
+
+
+@api.route('/jobs/<job_id>/heatmap', methods=['GET'])
+def job_image(job_id: str) -> Response:
+    result = job_result(job_id)
+    return Response(result.image, mimetype=result.mimetype)
+
+
+@api.route('/jobs/<job_id>/percentages.csv', methods=['GET'])
+def job_csv(job_id: str) -> Response:
+    return Response(job_result(job_id).percentages.to_csv(),
+                    mimetype='text/csv')
+
+
+def jobs() -> JobQueue:
+    return current_app.extensions['heatmap_jobs']
+
+
+def valid_job_id(job_id: str) -> bool:
+    # Job ids are sha256 hex digests, see `src.result_cache.cache_key`.
+    return re.fullmatch(r'[0-9a-f]{64}', job_id) is not None
+
+
+def job_result(job_id: str) -> RenderedHeatmap:
+    result = jobs().result(job_id) if valid_job_id(job_id) else None
+    if result is None:
+        abort(404)
+    return result
+
+
+def job_json(job: Job) -> dict:
+    content = {'id': job.id, 'status': job.status, 'error': job.error,
+               'submitted': job.submitted, 'finished': job.finished,
+               'status_url': url_for('api.job_status', job_id=job.id)}
+    if job.status == DONE:
+        content['image_url'] = url_for('api.job_image', job_id=job.id)
+        content['csv_url'] = url_for('api.job_csv', job_id=job.id)
+    return content
+
+
+def to_frame(settings: YamlSettings, result: Coverage) -> pd.DataFrame:
+    # Stations x bins percentages like `Heatmap.parsed_data`, followed
+    # by the average percentage per station.
+    frame = result.percentages.copy()
+    frame.columns = bin_labels(frame.columns, settings.group)
+    frame['total'] = result.totals
+    frame.index.name = 'station'
+    return frame
+
+
+def to_json(settings: YamlSettings, result: Coverage,
+            days: int | None = None) -> dict:
+    # `days` is the length of trailing windows, binned by the day they
+    # end on.
+    percentages = result.percentages
+    if days is None:
+        # The first bin starts on the first day of the window at the
+        # earliest.
+        first_day = to_utc(settings.start).normalize()
+        starts = [max(day, first_day) for day in
+                  bin_starts(percentages.columns, settings.group)]
+    else:
+        starts = percentages.columns - pd.Timedelta(days=days - 1)
+    extra = dict() if days is None else {'days': days}
+    return {
+        'domain': settings.domain,
+        'start': settings.start,
+        'end': settings.end,
+        'group': settings.group,
+        'stations': percentages.index.to_list(),
+        'bins': bin_labels(percentages.columns, settings.group).to_list(),
+        'bin_starts': [day.strftime('%Y-%m-%d') for day in starts],
+        # NaN (no data in a bin or at all) becomes null.
+        'percentages': [
+            [None if pd.isna(value) else value for value in row]
+            for row in percentages.to_numpy().tolist()
+        ],
+        'totals': [None if pd.isna(value) else value
+                   for value in result.totals.to_list()],
+        **extra,
+    }
+
+
+def to_csv(settings: YamlSettings, result: Coverage) -> str:
+    return to_frame(settings, result).to_csv()
+
+
+def to_arrow(settings: YamlSettings, result: Coverage) -> bytes:
+    table = pa.Table.from_pandas(to_frame(settings, result).reset_index(),
+                                 preserve_index=False)
+    sink = BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
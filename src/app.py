@@ -1,44 +1,121 @@
 # Standard library imports.
-from io import BytesIO
+from dataclasses import replace
 import base64
 import os
 
 # Related third party imports.
-from flask import Flask, render_template, request
+from flask import Flask, Response, g, render_template, request
 
 # Local application/library specific imports.
-from src.settings import YamlSettings
-from src.heatmap import Heatmap
+from src.api import GROUPS, BadRequest, api, read_settings
+from src.cache import columnar_path
+from src.dataset import datasets, memory_usage
+from src.jobs import FileJobQueue, JobQueue, render_heatmap
+from src.previews.server import previews
+from src.profiling import collect, metrics
+from src.result_cache import ResultCache, cache_key
 
 app = Flask(__name__)
+# Coverage percentages as json, csv or arrow, see `src.api`.
+app.register_blueprint(api)
+# Tiles of the NetCDF previews, written by `src.previews.tiles`.
+app.config['PREVIEW_TILES_DIR'] = os.getenv('PREVIEW_TILES_DIR', 'tiles')
+app.register_blueprint(previews)
+# Load the raw data once per process. With gunicorn's `preload_app`
+# this happens before the workers are forked.
+datasets.preload('atmosphere_cache', 'ecosystem_cache')
+# Rendered heatmaps are kept in memory and optionally on disk, so that
+# they survive restarts of the workers.
+# With a jobs directory the job queue is shared by all workers through
+# files, results then need to be on disk as well.
+jobs_dir = os.getenv('HEATMAP_JOBS_DIR')
+result_cache = ResultCache(
+    max_bytes=int(os.getenv('HEATMAP_CACHE_BYTES', 64 * 2 ** 20)),
+    directory=os.getenv('HEATMAP_CACHE_DIR', jobs_dir),
+    max_disk_bytes=int(os.getenv('HEATMAP_CACHE_DISK_BYTES', 512 * 2 ** 20))
+)
+job_workers = int(os.getenv('HEATMAP_JOB_WORKERS', 2))
+app.extensions['heatmap_jobs'] = (
+    FileJobQueue(jobs_dir, result_cache, workers=job_workers) if jobs_dir
+    else JobQueue(result_cache, workers=job_workers)
+)
+
+
+@app.before_request
+def start_timings():
+    g.collecting = collect()
+    g.timings = g.collecting.__enter__()
+    return
+
+
+@app.after_request
+def add_server_timing(response: Response) -> Response:
+    # Time spent per pipeline stage, shown by the browser's developer
+    # tools.
+    if g.get('timings') and g.timings.stages:
+        response.headers['Server-Timing'] = g.timings.server_timing()
+    return response
+
+
+@app.teardown_request
+def stop_timings(_):
+    if g.get('collecting'):
+        g.collecting.__exit__(None, None, None)
+    return
+
+
+@app.route('/metrics', methods=['GET'])
+def stage_metrics():
+    """Pipeline stage durations and memory of this worker."""
+    lines = ['# HELP heatmap_memory_kilobytes Resident memory of the worker.',
+             '# TYPE heatmap_memory_kilobytes gauge']
+    lines += [f'heatmap_memory_kilobytes{{kind="{kind}"}} {value}'
+              for kind, value in memory_usage().items()]
+    return Response(metrics.exposition() + '\n'.join(lines) + '\n',
+                    mimetype='text/plain; version=0.0.4')
 
 
 # Route to display and handle the form
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    plot_url = None
+    plot_url, plot_mimetype, job_id, error = None, None, None, None
+    settings = None
     domain, start, end, group, title_period, side_title_period = (None,) * 6
     if request.method == 'POST':
-        settings = YamlSettings(
-            using_cache := f'{request.form.get("domain")}_cache',
-            domain := request.form.get('domain'),
-            start := request.form.get('start'),
-            end := request.form.get('end'),
-            group := 'M' if request.form.get('group') == 'monthly' else 'W',
-            title_period := request.form.get('main_title_period'),
-            side_title_period := request.form.get('side_title_period'),
-        )
-        heatmap_obj = Heatmap(settings=settings)
-        plot, fig = heatmap_obj.plt, heatmap_obj.fig
-        img = BytesIO()
-        fig.savefig(img, format='png', bbox_inches='tight')
-        img.seek(0)
-        fig.clf()
-        plot_url = base64.b64encode(img.getvalue()).decode('utf8')
-    return render_template('index.html', plot_url=plot_url, domain=domain,
+        domain = request.form.get('domain')
+        start, end = request.form.get('start'), request.form.get('end')
+        group = GROUPS.get(request.form.get('group'), 'W')
+        title_period = request.form.get('main_title_period')
+        side_title_period = request.form.get('side_title_period')
+        try:
+            # The same checks as the api, with the titles as entered.
+            settings = replace(
+                read_settings({**request.form, 'group': group}),
+                title_period=title_period,
+                side_title_period=side_title_period
+            )
+        except BadRequest as bad_request:
+            error = str(bad_request)
+    if settings is not None:
+        key = cache_key(settings)
+        result = result_cache.get(key)
+        if result is None and not columnar_path(settings.cache_path).exists():
+            # Querying the data takes longer than a request may, render
+            # in the background and let the page poll for the result.
+            job_id = app.extensions['heatmap_jobs'].submit(settings).id
+        elif result is None:
+            result = render_heatmap(settings)
+            result_cache.put(key, result)
+        if result is not None:
+            plot_url = base64.b64encode(result.image).decode('utf8')
+            plot_mimetype = result.mimetype
+    return render_template('index.html', plot_url=plot_url, job_id=job_id,
+                           plot_mimetype=plot_mimetype, error=error,
+                           domain=domain,
                            start=start, end=end, group=group,
                            title_period=title_period,
-                           side_title_period=side_title_period)
+                           side_title_period=side_title_period), \
+        400 if error else 200
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+# Standard library imports.
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from time import perf_counter
+# Related third party imports.
+import yaml
+# Local application/library specific imports.
+from src.constants import icons
+from src.coverage import Coverage, coverage_tables, daily_coverage
+from src.cube import load_cube
+from src.heatmap import Heatmap, domain_obj_specs, load_raw_data
+from src.profiling import Timings, add_worker_timings, worker_stage
+from src.regeneration import Change, Manifest, Output, Summary, station_digests
+from src.settings import YamlSettings
+
+
+def read_reports(path: str, base: YamlSettings) -> list[YamlSettings]:
+    """Read a list of reports from a yaml file.
+
+    Every report overrides some of the `base` settings, e.g. its
+    domain, cache path, period and group.
+    """
+    with open(path, mode='r') as yaml_handler:
+        reports = yaml.safe_load(yaml_handler)['reports']
+    return [replace(base, **report) for report in reports]
+
+
+def aggregate(reports: list[YamlSettings], manifests: dict[str, Manifest],
+              force: bool = False) -> tuple[list[Coverage | None],
+                                            list[Output], list[Change],
+                                            dict[str, float],
+                                            dict[int, float]]:
+    """Compute the coverage of every changed report.
+
+    The raw data and daily coverage cube of each cache are loaded
+    once and the groups of reports sharing a window are binned in one
+    pass over it. Reports whose fingerprint matches the one in the
+    manifest of their output directory are not binned, their coverage
+    is None. Also returns the seconds spent loading each cache and
+    aggregating each report, by cache path and report index.
+    """
+    n_reports = len(reports)
+    coverages, outputs, changes = [None] * n_reports, [None] * n_reports, \
+        [None] * n_reports
+    load_timings, aggregate_timings = dict(), dict()
+    by_cache = dict()
+    for i, settings in enumerate(reports):
+        by_cache.setdefault(str(settings.cache_path), dict()).\
+            setdefault((settings.start, settings.end), list()).append(i)
+    for cache_path, windows in by_cache.items():
+        settings = reports[next(iter(windows.values()))[0]]
+        tic = perf_counter()
+        raw_data = load_raw_data(settings, domain_obj_specs(settings.domain))
+        stations = sorted(raw_data['station'].unique())
+        cube = load_cube(settings.cache_path, raw_data)
+        load_timings[cache_path] = perf_counter() - tic
+        for (start, end), indices in windows.items():
+            tic = perf_counter()
+            try:
+                daily = cube.daily.window(start, end)
+            except ValueError:
+                # Windows not starting and ending at midnight.
+                daily = daily_coverage(raw_data, stations, start, end)
+            digests = station_digests(daily)
+            for i in indices:
+                outputs[i] = Heatmap(settings=reports[i]).output(digests)
+                changes[i] = manifests[str(reports[i].output_dir)].change(
+                    outputs[i], force=force
+                )
+            changed = [i for i in indices if not changes[i].skipped]
+            groups = list(dict.fromkeys(reports[i].group for i in changed))
+            by_group = coverage_tables(daily, groups) if groups else dict()
+            for i in changed:
+                coverages[i] = by_group[reports[i].group]
+            # Reports share the time of their window.
+            seconds = (perf_counter() - tic) / len(indices)
+            for i in indices:
+                aggregate_timings[i] = seconds
+    return coverages, outputs, changes, load_timings, aggregate_timings
+
+
+def render(settings: YamlSettings, coverage: Coverage) -> Timings:
+    with worker_stage('heatmap') as timings:
+        Heatmap(settings=settings, coverage=coverage).save_to_files()
+    return timings
+
+
+def run_batch(reports: list[YamlSettings], workers: int | None = None,
+              force: bool = False) -> Summary:
+    """Generate the heatmaps of the reports that changed.
+
+    Reports are skipped if their settings and the daily coverage of
+    their window are unchanged since they were last generated, unless
+    `force` is set.
+    """
+    tic = perf_counter()
+    manifests = {str(settings.output_dir): Manifest(settings.output_dir)
+                 for settings in reports}
+    coverages, outputs, changes, load_timings, aggregate_timings = \
+        aggregate(reports, manifests, force=force)
+    changed = [i for i, change in enumerate(changes) if not change.skipped]
+    render_timings = dict()
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            render_timings = dict(zip(changed, pool.map(
+                render, [reports[i] for i in changed],
+                [coverages[i] for i in changed]
+            )))
+    for i in changed:
+        manifests[str(reports[i].output_dir)].record(outputs[i])
+    for manifest in manifests.values():
+        manifest.write()
+    add_worker_timings(render_timings.values())
+    wall_time = perf_counter() - tic
+    print(f'Generated {len(changed)} of {len(reports)} heatmaps in '
+          f'{wall_time:.1f} s {icons.ICON_CHECK}')
+    for cache_path in {str(settings.cache_path) for settings in reports}:
+        print(f'\tloading {cache_path}: {load_timings[cache_path]:.2f} s')
+    for i, settings in enumerate(reports):
+        rendering = f'{render_timings[i].totals()["heatmap"]:.2f} s' \
+            if i in render_timings else 'skipped'
+        print(f'\t{settings.domain} {settings.group} '
+              f'{settings.start} - {settings.end}: '
+              f'aggregation {aggregate_timings[i]:.2f} s, '
+              f'rendering {rendering}')
+    summary = Summary()
+    for out, change in zip(outputs, changes):
+        summary.add(out, change)
+    print(summary.report())
+    return summary
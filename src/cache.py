@@ -0,0 +1,353 @@
+# Standard library imports.
+from pathlib import Path
+from typing import TYPE_CHECKING
+import json
+import os
+import uuid
+# Related third party imports.
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+if TYPE_CHECKING:
+    from src.sparql import QueryRunner
+
+
+# Raw data is cached as an uncompressed Arrow IPC (Feather v2) file,
+# which keeps the column types and can be memory mapped.
+CACHE_SUFFIX = '.feather'
+# Key of the heatmap specific metadata in the file's schema metadata.
+METADATA_KEY = b'heatmap'
+# Raw data is held compactly, with only the columns the coverage needs:
+# - `start`: Start time of every data object in epoch seconds (int64).
+# - `duration`: Its duration in seconds (int32).
+# - `station`: Its station code, categorical.
+# See `time_start`, `time_end`, `period` and `expand_raw_data` for the
+# timestamps.
+COLUMNS = ['start', 'duration', 'station']
+NS_PER_SECOND = 1_000_000_000
+# Number of SPARQL results fetched and converted at a time.
+PAGE_SIZE = 50_000
+# Number of query windows fetched concurrently.
+FETCH_WORKERS = 4
+
+
+def columnar_path(cache_path: str | Path) -> Path:
+    return Path(cache_path).with_suffix(CACHE_SUFFIX)
+
+
+def cache_version(cache_path: str | Path) -> str:
+    """Return a stamp that changes whenever the cache file changes."""
+    for path in (columnar_path(cache_path), Path(cache_path)):
+        if path.exists():
+            stat = path.stat()
+            return f'{path.name}:{stat.st_mtime_ns}:{stat.st_size}'
+    return 'missing'
+
+
+def format_raw_data(raw_data: pd.DataFrame) -> pd.DataFrame:
+    """Convert SPARQL results to the compact raw data layout."""
+    # SPARQL returns xsd:dateTime values, with or without fractional
+    # seconds.
+    time_start = pd.to_datetime(raw_data['timeStart'], format='ISO8601')
+    time_end = pd.to_datetime(raw_data['timeEnd'], format='ISO8601')
+    # Atmosphere and Ecosystem use different formatting for station
+    # names.
+    station = raw_data['fileName'].str.split('_', n=1).str[0]
+    return compact_raw_data(time_start, time_end, station)
+
+
+def format_previous_versions(raw_data: pd.DataFrame) -> pd.DataFrame:
+    """Convert the earlier versions in SPARQL results, see `build_query`.
+
+    Results of queries without them give an empty frame.
+    """
+    if 'prevTimeStart' not in raw_data.columns:
+        return empty_raw_data()
+    previous = raw_data[raw_data['prevTimeStart'].notna()]
+    return format_raw_data(pd.DataFrame({
+        'timeStart': previous['prevTimeStart'],
+        'timeEnd': previous['prevTimeEnd'],
+        'fileName': previous['prevFileName'],
+    }))
+
+
+def compact_raw_data(time_start, time_end, station) -> pd.DataFrame:
+    """Build the compact raw data layout from timestamps.
+
+    Times are truncated to whole seconds. Data objects without a start
+    time are dropped, those without an end time get a zero duration.
+    """
+    time_start = pd.DatetimeIndex(time_start)
+    time_end = pd.DatetimeIndex(time_end)
+    known = ~time_start.isna()
+    start = _epoch_seconds(time_start[known])
+    end = _epoch_seconds(time_end[known])
+    duration = np.where(time_end[known].isna(), 0, end - start)
+    return pd.DataFrame({
+        'start': start,
+        'duration': duration.astype(np.int32),
+        'station': pd.Categorical(np.asarray(station, dtype=object)[known]),
+    })
+
+
+def _epoch_seconds(times: pd.DatetimeIndex) -> np.ndarray:
+    # `asi8` holds UTC nanoseconds, also for timezone aware times.
+    return times.as_unit('ns').asi8 // NS_PER_SECOND
+
+
+def time_start(raw_data: pd.DataFrame) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(
+        pd.to_datetime(raw_data['start'].to_numpy(), unit='s', utc=True),
+        name='timeStart'
+    )
+
+
+def time_end(raw_data: pd.DataFrame) -> pd.DatetimeIndex:
+    return time_start(raw_data) + period(raw_data)
+
+
+def period(raw_data: pd.DataFrame) -> pd.TimedeltaIndex:
+    return pd.to_timedelta(raw_data['duration'].to_numpy(), unit='s')
+
+
+def expand_raw_data(raw_data: pd.DataFrame) -> pd.DataFrame:
+    """Return the raw data indexed by `timeStart`, with timestamps.
+
+    This is the layout of the SPARQL results, with `timeEnd`, `period`
+    and `station` columns. It takes about twice the memory of the
+    compact layout.
+    """
+    return pd.DataFrame({'timeEnd': time_end(raw_data),
+                         'period': period(raw_data),
+                         'station': raw_data['station'].array},
+                        index=time_start(raw_data))
+
+
+def empty_raw_data() -> pd.DataFrame:
+    return pd.DataFrame({'start': pd.Series(dtype=np.int64),
+                         'duration': pd.Series(dtype=np.int32),
+                         'station': pd.Series(dtype='category')})
+
+
+def read_cache(cache_path: str | Path) -> pd.DataFrame:
+    """Read the raw data cache without copying it.
+
+    The columns are backed by the memory mapped file, so they are
+    read-only and processes mapping the same file share its pages.
+    Caches written with timestamps, before the compact layout, are
+    converted in memory.
+    """
+    table = feather.read_table(columnar_path(cache_path), memory_map=True)
+    raw_data = table.to_pandas(split_blocks=True)
+    if 'timeStart' in raw_data.columns:
+        return compact_raw_data(raw_data['timeStart'], raw_data['timeEnd'],
+                                raw_data['station'])
+    return raw_data
+
+
+def read_metadata(cache_path: str | Path) -> dict:
+    with pa.memory_map(str(columnar_path(cache_path))) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return json.loads(metadata.get(METADATA_KEY, b'{}'))
+
+
+def write_cache(raw_data: pd.DataFrame, cache_path: str | Path,
+                metadata: dict | None = None) -> Path:
+    """Write the raw data cache file atomically.
+
+    The file is written next to its final location and then renamed,
+    so readers never see a partially written cache.
+    """
+    raw_data = raw_data[COLUMNS].assign(
+        station=raw_data['station'].astype('category')
+    )
+    table = pa.Table.from_pandas(raw_data, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **table.schema.metadata,
+        METADATA_KEY: json.dumps(metadata or {}).encode()
+    })
+    path = columnar_path(cache_path)
+    tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    try:
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def merge_raw_data(*frames: pd.DataFrame) -> pd.DataFrame:
+    # Later frames win when the same data object appears more than
+    # once.
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    raw_data = pd.concat(frames, ignore_index=True)
+    raw_data = raw_data.drop_duplicates(subset=COLUMNS, keep='last')
+    raw_data['station'] = raw_data['station'].astype(str).astype('category')
+    # Sort on the whole key, so the result doesn't depend on the order
+    # in which the frames were fetched.
+    raw_data = raw_data.sort_values(['start', 'station', 'duration'],
+                                    kind='stable')
+    return raw_data.reset_index(drop=True)
+
+
+def object_keys(raw_data: pd.DataFrame) -> pd.MultiIndex:
+    # Data objects are identified by their station and time span.
+    return pd.MultiIndex.from_arrays([raw_data['start'],
+                                      raw_data['duration'],
+                                      raw_data['station'].astype(str)])
+
+
+class ChunkWriter:
+    """Append raw data chunks to a temporary Arrow IPC file.
+
+    Fetched pages are written out as soon as they are converted, so
+    only one page of SPARQL results is held in memory at a time.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._writer, self._schema = None, None
+        return
+
+    def __enter__(self) -> 'ChunkWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+        return
+
+    def write(self, raw_data: pd.DataFrame) -> None:
+        # Every chunk has its own station categories and the IPC file
+        # format can't replace dictionaries, so stations are stored as
+        # plain strings.
+        raw_data = raw_data[COLUMNS].assign(
+            station=raw_data['station'].astype(str)
+        )
+        table = pa.Table.from_pandas(raw_data, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = pa.ipc.new_file(str(self.path), self._schema)
+        self._writer.write_table(table.cast(self._schema))
+        return
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        return
+
+    def read(self) -> pd.DataFrame:
+        """Read all chunks written so far, memory mapped."""
+        if self._writer is None:
+            return empty_raw_data()
+        table = feather.read_table(self.path, memory_map=True)
+        raw_data = table.to_pandas(split_blocks=True)
+        raw_data['station'] = raw_data['station'].astype('category')
+        return raw_data[COLUMNS]
+
+
+def refresh_cache(cache_path: str | Path, obj_specs: list[str],
+                  run_query: 'QueryRunner | None' = None,
+                  incremental: bool = True,
+                  page_size: int = PAGE_SIZE,
+                  workers: int = FETCH_WORKERS) -> tuple[pd.DataFrame,
+                                                         pd.DataFrame]:
+    """Fetch new data objects and merge them into the cache.
+
+    The latest submission and start time seen for every object
+    specification is kept in the cache's metadata. Only objects
+    submitted after that high-water mark are queried, specifications
+    without a mark are queried in full. Earlier versions of the new
+    objects are dropped from the cache, as a full query leaves them out.
+    If `incremental` is False the existing cache is replaced.
+
+    Every object specification is queried per yearly window of start
+    times, `workers` windows at a time. Results are fetched
+    `page_size` rows at a time and every page is converted to the
+    cached schema as soon as it arrives.
+
+    Returns the merged raw data and the data objects that were not
+    cached before. Queries are run on the ICOS SPARQL endpoint unless
+    another `run_query` is given.
+    """
+    # Only loaded when querying, reading the cache doesn't need it.
+    from src.sparql import (FetchTask, fetch_parallel, run_sparql,
+                            yearly_windows)
+    if run_query is None:
+        run_query = run_sparql
+    if incremental and columnar_path(cache_path).exists():
+        cached = read_cache(cache_path)
+        marks = read_metadata(cache_path).get('high_water_marks', {})
+    else:
+        cached, marks = None, dict()
+    tasks = [
+        FetchTask(obj_spec=obj_spec, window=window,
+                  submitted_after=marks.get(obj_spec, {}).get('submTime'))
+        for obj_spec in obj_specs for window in yearly_windows()
+    ]
+    path = columnar_path(cache_path)
+    chunks_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.chunks')
+    # Only the new versions of reprocessed objects have earlier ones.
+    superseded = [empty_raw_data()]
+    try:
+        with ChunkWriter(chunks_path) as writer:
+            for fetched_page in fetch_parallel(tasks, run_query,
+                                               _format_page, workers,
+                                               page_size):
+                submitted, fetched, previous = fetched_page.page
+                _update_mark(marks, fetched_page.task.obj_spec, submitted,
+                             time_start(fetched).max())
+                writer.write(fetched)
+                superseded.append(previous)
+        fetched = merge_raw_data(writer.read())
+        if cached is None:
+            raw_data, added = fetched, fetched
+        else:
+            added = fetched[~object_keys(fetched).isin(object_keys(cached))]
+            superseded = merge_raw_data(*superseded)
+            cached = cached[~object_keys(cached).isin(
+                object_keys(superseded)
+            )]
+            raw_data = merge_raw_data(cached, fetched)
+        write_cache(raw_data, cache_path,
+                    metadata={'high_water_marks': marks})
+    finally:
+        chunks_path.unlink(missing_ok=True)
+    return raw_data, added
+
+
+def _format_page(page: pd.DataFrame) -> tuple[pd.Timestamp, pd.DataFrame,
+                                               pd.DataFrame]:
+    submitted = pd.to_datetime(page['submTime'], format='ISO8601').max()
+    return submitted, format_raw_data(page), format_previous_versions(page)
+
+
+def _update_mark(marks: dict, obj_spec: str, submitted: pd.Timestamp,
+                 started: pd.Timestamp) -> None:
+    # Pages may arrive in any order, keep the latest times seen.
+    mark = marks.get(obj_spec, {})
+    if 'submTime' in mark:
+        submitted = max(submitted, pd.Timestamp(mark['submTime']))
+    if 'timeStart' in mark:
+        started = max(started, pd.Timestamp(mark['timeStart']))
+    marks[obj_spec] = {'submTime': submitted.isoformat(),
+                       'timeStart': started.isoformat()}
+    return
+
+
+def read_csv_cache(cache_path: str | Path) -> pd.DataFrame:
+    # Legacy cache files were written with `DataFrame.to_csv` and
+    # hold their datetimes as text.
+    raw_data = pd.read_csv(cache_path,
+                           usecols=['timeStart', 'timeEnd', 'station'])
+    return compact_raw_data(pd.to_datetime(raw_data['timeStart']),
+                            pd.to_datetime(raw_data['timeEnd']),
+                            raw_data['station'])
+
+
+def export_csv(raw_data: pd.DataFrame, csv_path: str | Path) -> None:
+    # In the legacy layout, read by `read_csv_cache`.
+    expand_raw_data(raw_data).to_csv(csv_path)
+    return
@@ -1,2 +1,3 @@
 YAML_SETTINGS = 'settings.yml'
 RAW_DATA_QUERY = 'src/constants/query_raw_data.txt'
+SPARQL_ENDPOINT = 'https://meta.icos-cp.eu/sparql'
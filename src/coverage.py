@@ -0,0 +1,351 @@
+# Standard library imports.
+from dataclasses import dataclass
+# Related third party imports.
+import numpy as np
+import pandas as pd
+# Local application/library specific imports.
+from src.profiling import stage
+
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_HOUR = 3_600 * NS_PER_SECOND
+NS_PER_DAY = 86_400 * NS_PER_SECOND
+US_PER_DAY = 86_400_000_000
+# `round(hours / 24, 1)` for every possible hours-of-day value. Used as
+# the last resort "max day" estimate, see `Heatmap.percentage_calculator`.
+HOURS_TO_DAY_FRACTION = np.array([round(h / 24, 1) for h in range(24)])
+# Groups of days, binned like `resample` bins them. Weeks end on
+# Sunday and quarters in December, bins are labelled with their last
+# day.
+GROUP_NAMES = {'D': 'day', 'W': 'week', 'M': 'month', 'Q': 'quarter',
+               'Y': 'year'}
+OFFSETS = {'D': pd.offsets.Day(), 'W': pd.offsets.Week(weekday=6),
+           'M': pd.offsets.MonthEnd(),
+           'Q': pd.offsets.QuarterEnd(startingMonth=12),
+           'Y': pd.offsets.YearEnd()}
+
+
+@dataclass(frozen=True)
+class DailyCoverage:
+    """Measured duration per station and UTC day.
+
+    `sums` holds the summed `period` (in nanoseconds) of every data
+    object starting on a given day and `has_data` flags the days with
+    at least one data object. `midnight_sums` and `midnight_has_data`
+    only take the objects starting at midnight into account, they are
+    needed to cut windows ending on a day. All arrays are shaped
+    (len(stations), len(days)).
+    """
+    stations: list[str]
+    days: pd.DatetimeIndex
+    sums: np.ndarray
+    has_data: np.ndarray
+    midnight_sums: np.ndarray
+    midnight_has_data: np.ndarray
+
+    @stage('daily_resampling')
+    def window(self, start, end) -> 'DailyCoverage':
+        """Cut the coverage of the data objects within [start, end].
+
+        Both timestamps must be midnights. As with the raw data, only
+        objects starting exactly at `end` are kept on the last day.
+        Days outside of `days` have no data.
+        """
+        start, end = to_utc(start), to_utc(end)
+        if start != start.normalize() or end != end.normalize():
+            raise ValueError('Daily coverage can only be cut at midnight.')
+        days = pd.date_range(start=start, end=end, freq='D')
+        arrays = {name: self._take(getattr(self, name), days)
+                  for name in ('sums', 'has_data',
+                               'midnight_sums', 'midnight_has_data')}
+        arrays['sums'][:, -1] = arrays['midnight_sums'][:, -1]
+        arrays['has_data'][:, -1] = arrays['midnight_has_data'][:, -1]
+        return DailyCoverage(stations=self.stations, days=days, **arrays)
+
+    def _take(self, array: np.ndarray, days: pd.DatetimeIndex) -> np.ndarray:
+        positions = self.days.get_indexer(days)
+        found = positions >= 0
+        taken = np.zeros((len(self.stations), len(days)), dtype=array.dtype)
+        taken[:, found] = array[:, positions[found]]
+        return taken
+
+
+@dataclass(frozen=True)
+class Coverage:
+    """Binned coverage percentages.
+
+    `percentages` is a stations x bins frame labelled with the bin
+    timestamps produced by `resample`. `totals` holds the average
+    percentage per station or NaN if a station has no data at all.
+    """
+    percentages: pd.DataFrame
+    totals: pd.Series
+
+
+def to_utc(timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize('UTC')
+    return timestamp.tz_convert('UTC')
+
+
+def daily_coverage(data: pd.DataFrame, stations: list[str],
+                   start, end) -> DailyCoverage:
+    """Sum the duration of each station's data objects per day.
+
+    `data` is the compact raw data frame with `start` (epoch seconds),
+    `duration` (seconds) and `station` columns, see `src.cache`. Only
+    objects starting within [start, end] are taken into account.
+    """
+    start, end = to_utc(start), to_utc(end)
+    days = pd.date_range(start=start.normalize(), end=end.normalize(),
+                         freq='D')
+    with stage('station_split'):
+        # Epoch nanoseconds, comparable with the window's timestamps.
+        starts = data['start'].to_numpy(np.int64) * NS_PER_SECOND
+        in_window = (starts >= start.value) & (starts <= end.value)
+        starts = starts[in_window]
+        codes = pd.Categorical(data['station'][in_window],
+                               categories=stations).codes.astype(np.int64)
+        day_codes = (starts - days[0].value) // NS_PER_DAY
+        period = data['duration'].to_numpy(np.int64)[in_window] * \
+            NS_PER_SECOND
+        midnight = starts % NS_PER_DAY == 0
+        known = codes >= 0
+    shape = (len(stations), len(days))
+    arrays = dict()
+    with stage('daily_resampling'):
+        for name, selected in (('', known), ('midnight_', known & midnight)):
+            flat = codes[selected] * len(days) + day_codes[selected]
+            size = len(stations) * len(days)
+            sums = np.bincount(flat, weights=period[selected],
+                               minlength=size)
+            has_data = np.bincount(flat, minlength=size) > 0
+            arrays[f'{name}sums'] = sums.astype(np.int64).reshape(shape)
+            arrays[f'{name}has_data'] = has_data.reshape(shape)
+    return DailyCoverage(stations=list(stations), days=days, **arrays)
+
+
+def coverage_table(daily: DailyCoverage, group: str) -> Coverage:
+    """Bin daily sums and compute coverage percentages per bin.
+
+    This is a vectorized equivalent of resampling every station's
+    daily series with `Heatmap.percentage_calculator`, computed for
+    all stations at once. A station's bins span from its first to its
+    last day with data, days without data in between count as zero.
+    """
+    return coverage_tables(daily, [group])[group]
+
+
+@stage('binning')
+def coverage_tables(daily: DailyCoverage,
+                    groups: list[str]) -> dict[str, Coverage]:
+    """Compute the coverage of several groups in one pass.
+
+    The station spans and the sorted daily sums are shared by all
+    groups, each group only regroups them by its bins.
+    """
+    n_stations, n_days = daily.sums.shape
+    # The span of each station's daily series.
+    with_data = daily.has_data.any(axis=1)
+    first = np.where(with_data, daily.has_data.argmax(axis=1), n_days)
+    last = np.where(with_data,
+                    n_days - 1 - daily.has_data[:, ::-1].argmax(axis=1), -1)
+    days = np.arange(n_days)
+    in_span = (days >= first[:, None]) & (days <= last[:, None])
+    rows, cols = np.nonzero(in_span)
+    values = daily.sums[rows, cols]
+    # Daily sums sorted per station. A stable sort by bin keeps them
+    # sorted within every (station, bin) interval, so that medians can
+    # be picked by position.
+    order = np.lexsort((values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    return {group: _bin(daily, group, rows, cols, values, with_data)
+            for group in groups}
+
+
+def _bin(daily: DailyCoverage, group: str, rows: np.ndarray,
+         cols: np.ndarray, values: np.ndarray,
+         with_data: np.ndarray) -> Coverage:
+    n_stations, n_days = daily.sums.shape
+    # Bins are consecutive runs of days, so each bin is described by
+    # the position of its first day.
+    bins = pd.Series(np.arange(n_days), index=daily.days).\
+        resample(offset(group)).first()
+    labels, bin_starts = bins.index, bins.to_numpy(np.int64)
+    n_bins = len(bin_starts)
+    day_bins = np.searchsorted(bin_starts, np.arange(n_days),
+                               side='right') - 1
+
+    groups = rows * n_bins + day_bins[cols]
+    order = np.argsort(groups, kind='stable')
+    values, groups = values[order], groups[order]
+    starts = np.flatnonzero(np.diff(groups, prepend=-1))
+    groups = groups[starts]
+    lengths = np.diff(np.r_[starts, len(values)])
+    summation = np.add.reduceat(values, starts) if len(starts) \
+        else np.zeros(0, dtype=np.int64)
+
+    median_days = _round_to_hours(
+        _median(values, starts, lengths)
+    ) // 24
+    half = np.maximum(lengths // 2, 1)
+    half_median_days = _round_to_hours(
+        _median(values, starts, half)
+    ) // 24
+    mean_hours = _round_to_hours(
+        np.trunc(summation / np.maximum(lengths, 1)).astype(np.int64)
+    ) % 24
+    mean_days = HOURS_TO_DAY_FRACTION[mean_hours]
+
+    # Candidate "max day" values, the smallest positive one wins.
+    candidates = np.full((len(starts), 3), np.nan)
+    candidates[:, 0] = median_days
+    has_half = lengths > 1
+    candidates[has_half, 1] = half_median_days[has_half]
+    current = np.where(has_half, half_median_days, median_days)
+    candidates[current == 0, 2] = mean_days[current == 0]
+    positive = np.where(candidates > 0, candidates, np.inf).min(axis=1)
+    max_day = np.where(np.isinf(positive), 0, positive)
+
+    total = np.rint(lengths * US_PER_DAY * max_day).astype(np.int64) * 1000
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = 100 * (summation / total)
+    percentage = np.where(max_day > 0, round_percentage(ratio), 0)
+    # Fix mistakes in percentages due to multiple instruments, e.g.
+    # station 'LMP' measurements in 10/21.
+    percentage = np.minimum(percentage, 100)
+
+    matrix = np.full(n_stations * n_bins, np.nan)
+    matrix[groups] = percentage
+    matrix = matrix.reshape(n_stations, n_bins)
+    # Accumulate left to right, like the original per bin summation.
+    bins_per_station = np.isfinite(matrix).sum(axis=1)
+    average = np.cumsum(np.nan_to_num(matrix), axis=1)[:, -1] / \
+        np.maximum(bins_per_station, 1)
+    totals = np.where(with_data, round_percentage(average), np.nan)
+
+    # Columns present in at least one station's span. Stations without
+    # data span the whole window.
+    if with_data.all():
+        columns = np.isfinite(matrix).any(axis=0)
+    else:
+        columns = np.ones(n_bins, dtype=bool)
+    percentages = pd.DataFrame(matrix[:, columns],
+                               index=daily.stations,
+                               columns=labels[columns])
+    return Coverage(percentages=percentages,
+                    totals=pd.Series(totals, index=daily.stations))
+
+
+def merge_daily(first: DailyCoverage,
+                second: DailyCoverage) -> DailyCoverage:
+    """Add up the daily coverage of two sets of data objects."""
+    stations = sorted(set(first.stations) | set(second.stations))
+    days = pd.date_range(start=min(first.days[0], second.days[0]),
+                         end=max(first.days[-1], second.days[-1]),
+                         freq='D')
+    arrays = dict()
+    for name in ('sums', 'has_data', 'midnight_sums', 'midnight_has_data'):
+        merged = None
+        for daily in (first, second):
+            rows = pd.Index(stations).get_indexer(daily.stations)
+            array = np.zeros((len(daily.stations), len(days)),
+                             dtype=getattr(daily, name).dtype)
+            array[:, days.get_indexer(daily.days)] = getattr(daily, name)
+            padded = np.zeros((len(stations), len(days)), dtype=array.dtype)
+            padded[rows] = array
+            merged = padded if merged is None else merged + padded
+        arrays[name] = merged
+    return DailyCoverage(stations=stations, days=days, **arrays)
+
+
+def compute_coverage(data: pd.DataFrame, stations: list[str],
+                     start, end, group: str) -> Coverage:
+    return compute_coverages(data, stations, start, end, [group])[group]
+
+
+def compute_coverages(data: pd.DataFrame, stations: list[str],
+                      start, end, groups: list[str]) -> dict[str, Coverage]:
+    return coverage_tables(daily_coverage(data, stations, start, end), groups)
+
+
+def offset(group: str) -> pd.DateOffset:
+    if group not in OFFSETS:
+        raise ValueError(f'Unknown group "{group}", use one of '
+                         f'{", ".join(OFFSETS)}.')
+    return OFFSETS[group]
+
+
+def bin_labels(index: pd.DatetimeIndex, group: str) -> pd.Index:
+    """Label bins like '31-12-24', '52-24', '12-24', 'Q4-24' or '2024'.
+
+    Weeks are numbered like `strftime('%U')`, from the first Sunday of
+    the year on. Labels are assembled from the date fields of the
+    whole index at once.
+    """
+    if index.empty:
+        return pd.Index([], dtype=object)
+    if group == 'Y':
+        return pd.Index(_digits(index.year, 4))
+    if group == 'D':
+        fields = [_digits(index.day), _digits(index.month)]
+    elif group == 'W':
+        sunday_first = (index.dayofweek.to_numpy() + 1) % 7
+        fields = [_digits((index.dayofyear.to_numpy() + 6 - sunday_first)
+                          // 7)]
+    elif group == 'Q':
+        fields = [np.char.add('Q', index.quarter.to_numpy().astype(str))]
+    else:
+        fields = [_digits(index.month)]
+    labels = fields[0]
+    for field in fields[1:] + [_digits(index.year % 100)]:
+        labels = np.char.add(np.char.add(labels, '-'), field)
+    return pd.Index(labels.astype(object))
+
+
+def bin_starts(index: pd.DatetimeIndex, group: str) -> pd.DatetimeIndex:
+    """First days of the bins ending on the days of `index`.
+
+    Coverage tables are labelled with the last day of their bins, the
+    first bin of a window may start before it.
+    """
+    return index - offset(group) + pd.Timedelta(days=1)
+
+
+def round_percentage(values: np.ndarray) -> np.ndarray:
+    """Round to one decimal like the builtin `round`, but vectorized.
+
+    `np.round` scales by ten first, which may tip values lying about
+    halfway between two decimals, those few are rounded by `round`.
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, 1)
+    tenths = values * 10
+    with np.errstate(invalid='ignore'):
+        halfway = np.abs(tenths - np.floor(tenths) - 0.5) < 1e-6
+    for position in np.flatnonzero(halfway):
+        rounded.flat[position] = round(float(values.flat[position]), 1)
+    return rounded
+
+
+def _digits(numbers, width: int = 2) -> np.ndarray:
+    return np.char.zfill(np.asarray(numbers).astype(str), width)
+
+
+def _median(values: np.ndarray, starts: np.ndarray,
+            lengths: np.ndarray) -> np.ndarray:
+    # Median of the first `lengths` sorted values of each interval,
+    # truncated to whole nanoseconds like `Series.median()`.
+    low = values[starts + (lengths - 1) // 2]
+    high = values[starts + lengths // 2]
+    return (low + high) // 2
+
+
+def _round_to_hours(nanoseconds: np.ndarray) -> np.ndarray:
+    # Round half to even, like `Timedelta.round('H')`, and return the
+    # result as a number of hours.
+    hours, remainder = np.divmod(nanoseconds, NS_PER_HOUR)
+    up = (2 * remainder > NS_PER_HOUR) | \
+         ((2 * remainder == NS_PER_HOUR) & (hours % 2 == 1))
+    return hours + up
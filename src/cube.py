@@ -0,0 +1,145 @@
+# Standard library imports.
+from functools import cached_property
+from pathlib import Path
+import os
+import uuid
+# Related third party imports.
+import numpy as np
+import pandas as pd
+# Local application/library specific imports.
+from src.cache import cache_version
+from src.aggregation import CumulativeCoverage
+from src.coverage import (Coverage, DailyCoverage, bin_labels,
+                          coverage_tables, daily_coverage, merge_daily)
+from src.profiling import stage
+
+
+CUBE_SUFFIX = '.cube.npz'
+ARRAYS = ('sums', 'has_data', 'midnight_sums', 'midnight_has_data')
+
+
+def cube_path(cache_path: str | Path) -> Path:
+    return Path(cache_path).with_suffix(CUBE_SUFFIX)
+
+
+class CoverageCube:
+    """Daily coverage of every station over the whole history.
+
+    The cube is built once from the raw data cache and stored next to
+    it. It remembers the version of the raw data cache it reflects and
+    new data objects are added to it as they are fetched. Heatmaps of
+    any window and group are binned from it without touching the raw
+    data, trailing windows are summed from its running totals.
+    """
+
+    def __init__(self, daily: DailyCoverage, version: str) -> None:
+        self.daily = daily
+        self.version = version
+        return
+
+    @classmethod
+    def build(cls, raw_data: pd.DataFrame, version: str) -> 'CoverageCube':
+        return cls(daily=_daily_coverage(raw_data), version=version)
+
+    def add(self, raw_data: pd.DataFrame, version: str) -> 'CoverageCube':
+        if raw_data.empty:
+            return CoverageCube(daily=self.daily, version=version)
+        return CoverageCube(
+            daily=merge_daily(self.daily, _daily_coverage(raw_data)),
+            version=version
+        )
+
+    @cached_property
+    def cumulative(self) -> CumulativeCoverage:
+        return CumulativeCoverage.from_daily(self.daily)
+
+    def coverage(self, start, end, group: str) -> Coverage:
+        return self.coverages(start, end, [group])[group]
+
+    def coverages(self, start, end, groups: list[str]) -> dict[str, Coverage]:
+        """Bin a window of the cube in several groups at once."""
+        return coverage_tables(self.daily.window(start, end), groups)
+
+    def trailing(self, days: int, start, end) -> Coverage:
+        """Coverage of the `days` long windows ending on [start, end]."""
+        return self.cumulative.trailing(days, start, end)
+
+    def parsed_data(self, start, end, group: str) -> pd.DataFrame:
+        """Return the stations x bins percentages of a heatmap."""
+        parsed_data = self.coverage(start, end, group).percentages
+        parsed_data.columns = bin_labels(parsed_data.columns, group)
+        return parsed_data
+
+    @classmethod
+    def read(cls, path: str | Path) -> 'CoverageCube':
+        with np.load(path, allow_pickle=False) as arrays:
+            days = pd.date_range(
+                start=pd.Timestamp(int(arrays['first_day']), tz='UTC'),
+                periods=arrays['sums'].shape[1], freq='D'
+            )
+            daily = DailyCoverage(stations=arrays['stations'].tolist(),
+                                  days=days,
+                                  **{name: arrays[name] for name in ARRAYS})
+            version = str(arrays['version'])
+        return cls(daily=daily, version=version)
+
+    def write(self, path: str | Path) -> None:
+        path = Path(path)
+        tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+        try:
+            with open(tmp_path, mode='wb') as handle:
+                np.savez(handle,
+                         stations=np.array(self.daily.stations, dtype=str),
+                         first_day=self.daily.days[0].value,
+                         version=self.version,
+                         **{name: getattr(self.daily, name)
+                            for name in ARRAYS})
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return
+
+
+@stage('cube_load')
+def load_cube(cache_path: str | Path,
+              raw_data: pd.DataFrame) -> CoverageCube:
+    """Read the cube of a raw data cache or build it from `raw_data`."""
+    version = cache_version(cache_path)
+    if cube_path(cache_path).exists():
+        cube = CoverageCube.read(cube_path(cache_path))
+        if cube.version == version:
+            return cube
+    cube = CoverageCube.build(raw_data, version=version)
+    cube.write(cube_path(cache_path))
+    return cube
+
+
+@stage('cube_update')
+def update_cube(cache_path: str | Path, added: pd.DataFrame,
+                previous_version: str) -> None:
+    """Add newly cached data objects to the cube of a cache.
+
+    Cubes not reflecting `previous_version` of the cache are left for
+    `load_cube` to rebuild.
+    """
+    if not cube_path(cache_path).exists():
+        return
+    cube = CoverageCube.read(cube_path(cache_path))
+    if cube.version == previous_version:
+        cube = cube.add(added, version=cache_version(cache_path))
+        cube.write(cube_path(cache_path))
+    return
+
+
+def _daily_coverage(raw_data: pd.DataFrame) -> DailyCoverage:
+    # Take every data object into account, including those starting
+    # late on the last day.
+    first = pd.Timestamp(raw_data['start'].min(), unit='s', tz='UTC')
+    last = pd.Timestamp(raw_data['start'].max(), unit='s', tz='UTC')
+    return daily_coverage(
+        raw_data, sorted(raw_data['station'].unique()),
+        start=first.normalize(),
+        end=last.normalize() + pd.Timedelta(days=1) -
+        pd.Timedelta(1, unit='ns')
+    )
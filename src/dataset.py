@@ -0,0 +1,72 @@
+# Standard library imports.
+from dataclasses import dataclass
+from pathlib import Path
+import os
+import resource
+import threading
+# Related third party imports.
+import pandas as pd
+# Local application/library specific imports.
+from src.cache import columnar_path, read_cache
+
+
+@dataclass(frozen=True)
+class _Dataset:
+    mtime_ns: int
+    raw_data: pd.DataFrame
+
+
+class DatasetRegistry:
+    """Raw data shared by all requests of a process.
+
+    Each cache file is loaded once and loaded again only after its
+    modification time changes. Callers get shallow copies whose
+    memory mapped columns cannot be modified in place. When the
+    registry is filled before gunicorn forks its workers (`preload_app`)
+    all workers share the same pages.
+    """
+
+    def __init__(self) -> None:
+        self._datasets = dict()
+        self._lock = threading.Lock()
+        return
+
+    def get(self, cache_path: str | Path) -> pd.DataFrame:
+        path = columnar_path(cache_path)
+        mtime_ns = path.stat().st_mtime_ns
+        with self._lock:
+            dataset = self._datasets.get(path)
+            if dataset is None or dataset.mtime_ns != mtime_ns:
+                dataset = _Dataset(mtime_ns=mtime_ns,
+                                   raw_data=read_cache(path))
+                self._datasets[path] = dataset
+        return dataset.raw_data.copy(deep=False)
+
+    def preload(self, *cache_paths: str | Path) -> None:
+        for cache_path in cache_paths:
+            if columnar_path(cache_path).exists():
+                self.get(cache_path)
+        return
+
+
+datasets = DatasetRegistry()
+
+
+def memory_usage() -> dict[str, int]:
+    """Return the resident memory of this process in KiB.
+
+    On Linux the resident set is split into anonymous (private to the
+    process), file backed (e.g. memory mapped caches, shared between
+    workers) and shared memory pages.
+    """
+    usage = dict()
+    try:
+        with open(f'/proc/{os.getpid()}/status', mode='r') as status:
+            for line in status:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'RssAnon', 'RssFile', 'RssShmem'):
+                    usage[key] = int(value.split()[0])
+    except FileNotFoundError:
+        # Peak resident memory, in KiB on Linux and in bytes on macOS.
+        usage['maxrss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
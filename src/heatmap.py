@@ -1,43 +1,135 @@
 # Standard library imports.
+from dataclasses import replace
 from datetime import timedelta, datetime
+from functools import cached_property
 from pathlib import Path
-import os
+from typing import TYPE_CHECKING
 import warnings
 # Related third party imports.
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn
 # Local application/library specific imports.
 from src.settings import YamlSettings
-from src.constants import cpmeta, icons, general_settings
-from icoscp.sparql.runsparql import RunSparql
+from src.cache import (cache_version, columnar_path, read_csv_cache,
+                       refresh_cache, write_cache)
+from src.constants import cpmeta, icons
+from src.coverage import (GROUP_NAMES, Coverage, DailyCoverage, bin_labels,
+                          coverage_table, coverage_tables, daily_coverage,
+                          to_utc)
+from src.cube import CoverageCube, load_cube, update_cube
+from src.dataset import datasets
+from src.profiling import stage
+from src.regeneration import (Manifest, Output, Summary, fingerprint_output,
+                              station_digests)
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
 
 warnings.filterwarnings('ignore')
 
 
-def gimme_heatmaps(settings: YamlSettings):
-    Heatmap(settings=settings)
-    return
+def gimme_heatmaps(settings: YamlSettings, groups: list[str] | None = None,
+                   trailing: list[int] | None = None,
+                   force: bool = False) -> Summary:
+    """Save the heatmap of the settings or one per group.
+
+    Several groups are binned in one pass over the daily coverage.
+    `trailing` lists window lengths in days whose coverage is saved
+    for every day of the period. Outputs whose settings and daily
+    coverage are unchanged since they were last saved are skipped,
+    unless `force` is set.
+    """
+    heatmap = Heatmap(settings=settings)
+    manifest = Manifest(settings.output_dir)
+    summary = Summary()
+    digests = station_digests(heatmap.daily)
+    changed = dict()
+    for group in groups or [settings.group]:
+        out = Heatmap(settings=replace(settings, group=group)).output(digests)
+        change = manifest.change(out, force=force)
+        summary.add(out, change)
+        if not change.skipped:
+            changed[group] = out
+    if changed:
+        coverages = coverage_tables(heatmap.daily, list(changed))
+        for group, out in changed.items():
+            Heatmap(settings=replace(settings, group=group),
+                    coverage=coverages[group]).save_to_files()
+            manifest.record(out)
+            manifest.write()
+    for days in trailing or []:
+        out = heatmap.trailing_output(days)
+        change = manifest.change(out, force=force)
+        summary.add(out, change)
+        if not change.skipped:
+            heatmap.save_trailing(days)
+            manifest.record(out)
+            manifest.write()
+    print(summary.report())
+    return summary
+
+
+def domain_obj_specs(domain: str) -> list[str] | None:
+    if domain in ['atmosphere', 'atc']:
+        return [cpmeta.GATOS, cpmeta.PICARRO]
+    elif domain in ['ecosystem', 'etc']:
+        return [cpmeta.EDDY_CSV, cpmeta.EDDY_BIN]
+    print(f'No heatmap implementation for {domain} domain. Blame Zois.')
+    return None
+
+
+def load_raw_data(settings: YamlSettings,
+                  obj_specs: list[str]) -> pd.DataFrame:
+    cache_exists = columnar_path(settings.cache_path).exists()
+    if settings.using_cache and cache_exists and not settings.refresh_cache:
+        with stage('cache_load'):
+            raw_data = datasets.get(settings.cache_path)
+    elif settings.using_cache and not cache_exists and \
+            Path(settings.cache_path).exists():
+        # Convert a legacy csv cache file once and use the columnar
+        # cache from then on.
+        with stage('cache_load'):
+            raw_data = read_csv_cache(settings.cache_path)
+            write_cache(raw_data, settings.cache_path)
+    # Sparql the data if the cache file is missing or only the data
+    # objects submitted since the last query if a refresh is requested.
+    else:
+        incremental = settings.using_cache and cache_exists
+        if incremental:
+            print(f'Refreshing cached data ("{settings.cache_path}")... ',
+                  end='')
+        else:
+            print(f'Warning! Cached data ("{settings.cache_path}") is'
+                  f' missing. Querying data instead.\n This might take'
+                  f' a while... ', end='')
+        previous_version = cache_version(settings.cache_path)
+        with stage('sparql_fetch'):
+            raw_data, added = refresh_cache(settings.cache_path, obj_specs,
+                                            incremental=incremental)
+        if incremental:
+            update_cube(settings.cache_path, added, previous_version)
+        print(icons.ICON_CHECK)
+    return raw_data
 
 
 class Heatmap:
+    """Coverage heatmap of a domain's raw data.
 
-    def __init__(self, settings: YamlSettings):
+    Nothing is computed on construction. Loading the raw data,
+    aggregating the coverage and rendering the figure each run once,
+    when their result is first accessed, and files are written only by
+    `save_to_files`. Matplotlib is imported only for rendering.
+    """
+
+    def __init__(self, settings: YamlSettings,
+                 coverage: Coverage | None = None):
         self.s = settings
-        if self.s.domain in ['atmosphere', 'atc']:
-            self.obj_spec = cpmeta.GATOS + cpmeta.PICARRO
-        elif self.s.domain in ['ecosystem', 'etc']:
-            self.obj_spec = cpmeta.EDDY_CSV + cpmeta.EDDY_BIN
-        else:
-            print(f'No heatmap implementation for {self.s.domain}'
-                  f' domain. Blame Zois.')
+        self.obj_specs = domain_obj_specs(self.s.domain)
         # self.output_dir = None
-        self.raw_data = None
-        self.stations = sorted(self.raw_data['station'].unique())
-        self.stations_info = (self.stations, self.raw_data)
-        self.parsed_data = self.stations_info
-        self.plt, self.fig = self.plot_figures()
+        # The coverage may be computed beforehand, e.g. once for a
+        # batch of heatmaps, instead of from the raw data.
+        if coverage is not None:
+            self.coverage = coverage
         return
 
     # @property
@@ -55,131 +147,71 @@ class Heatmap:
     #     self._output_dir = output_dir
     #     return
 
-    @property
-    def raw_data(self):
-        return self._raw_data
-
-    @raw_data.setter
-    def raw_data(self, _):
-        if self.s.using_cache and Path(self.s.cache_path).exists():
-            raw_data = pd.read_csv(self.s.cache_path)
-            # todo: Find a way to read the csv file with the below
-            #  changes directly using pandas arguments.
-            raw_data['timeStart'] = pd.to_datetime(raw_data['timeStart'])
-            raw_data['timeEnd'] = pd.to_datetime(raw_data['timeEnd'])
-            raw_data['start'] = raw_data['timeStart']
-            raw_data['period'] = raw_data['timeEnd'] - raw_data['start']
-            raw_data = raw_data.set_index('timeStart')
-        # Sparql the data only if the cache file is missing.
-        else:
-            print(f'Warning! Cached data ("{self.s.cache_path}") is'
-                  f' missing. Querying data instead.\n This might take a '
-                  f'while... ', end='')
-            with open(general_settings.RAW_DATA_QUERY, mode='r') as q_handle:
-                query = q_handle.read().replace('#obj_spec', self.obj_spec)
-            raw_data = RunSparql(sparql_query=query,
-                                 output_format='pandas').run()
-            raw_data['timeStart'] = pd.to_datetime(raw_data['timeStart'])
-            raw_data['timeEnd'] = pd.to_datetime(raw_data['timeEnd'])
-            raw_data['start'] = raw_data['timeStart']
-            raw_data['period'] = raw_data['timeEnd'] - raw_data['start']
-            raw_data = raw_data.set_index('timeStart')
-            # Atmosphere and Ecosystem use different formatting for
-            # station names.
-            raw_data['station'] = raw_data.fileName.str.split('_').str[0]
-            raw_data = raw_data.drop(columns='fileName')
-            print(icons.ICON_CHECK)
-            raw_data.to_csv(self.s.cache_path)
-        self._raw_data = raw_data
-        return
+    @cached_property
+    def raw_data(self) -> pd.DataFrame:
+        return load_raw_data(self.s, self.obj_specs)
+
+    @cached_property
+    def cube(self) -> CoverageCube:
+        return load_cube(self.s.cache_path, self.raw_data)
+
+    @cached_property
+    def daily(self) -> DailyCoverage:
+        try:
+            # Cut from the precomputed daily coverage of the cached raw
+            # data.
+            return self.cube.daily.window(self.s.start, self.s.end)
+        except ValueError:
+            # Windows not starting and ending at midnight.
+            stations = sorted(self.raw_data['station'].unique())
+            return daily_coverage(self.raw_data, stations,
+                                  start=self.s.start, end=self.s.end)
+
+    @cached_property
+    def coverage(self) -> Coverage:
+        return coverage_table(self.daily, self.s.group)
+
+    def trailing(self, days: int) -> Coverage:
+        """Coverage of the `days` long windows ending on every day."""
+        return self.cube.trailing(days=days, start=self.s.start,
+                                  end=self.s.end)
 
     @property
-    def stations_info(self):
-        return self._stations_info
+    def stations(self) -> list[str]:
+        return self.coverage.totals.index.to_list()
 
-    @stations_info.setter
-    def stations_info(self, packed_items):
-        stations, data = packed_items
+    @cached_property
+    def stations_info(self) -> dict:
         stations_info = dict()
-        for station in stations:
-            station_full_series = \
-                data.query('station == "' + station + '"')['period']
-            station_full_series = station_full_series.rename(station)
-            station_series = station_full_series[
-                (station_full_series.index >= self.s.start) &
-                (station_full_series.index <= self.s.end)
-                ]
-            if station_series.empty:
-                generated_index = pd.date_range(start=self.s.start,
-                                                end=self.s.end,
-                                                freq='D', tz='UTC')
-                empty_data = [
-                    float("NaN") for date in range(0, len(generated_index))
-                ]
-                station_series = pd.Series(data=empty_data,
-                                           index=generated_index)
-                # if station in ['RGL', 'SNO', 'SSL']:
-                #     print(f'**\n\n'
-                #           f'{station} has no data for given period\n'
-                #           f'This is the series:\n'
-                #           f'{station_series}\n'
-                #           f'**\n')
-            stations_info[station] = {
-                'station_series': station_series,
-                'station_full_series': station_full_series
-            }
-        self._stations_info = stations_info
-        return
+        for station, percentage in self.coverage.totals.items():
+            if pd.isna(percentage):
+                percentage, y_label = 'No Data', '  No Data'
+            else:
+                y_label = f'  {percentage} %'
+            stations_info[station] = {'percentage': percentage,
+                                      'y_label': y_label}
+        return stations_info
+
+    @cached_property
+    def parsed_data(self) -> pd.DataFrame:
+        parsed_data = self.coverage.percentages.copy()
+        parsed_data.columns = bin_labels(parsed_data.columns, self.s.group)
+        return parsed_data
 
     @property
-    def parsed_data(self):
-        return self._parsed_data
-
-    @parsed_data.setter
-    def parsed_data(self, stations_info):
-        binned_data = pd.DataFrame()
-        for station, station_info in stations_info.items():
-            station_series = station_info['station_series']
-            station_info['percentage'] = 0.0
-            if station_series.isnull().all():
-                binned_series = station_series.resample(self.s.group). \
-                    apply(self.percentage_calculator,
-                          axis=1,
-                          station_info=station_info,
-                          station=station
-                          )
-                station_info['percentage'] = 'No Data'
-                station_info['y_label'] = f'  No Data'
-            else:
-                # Generate all missing dates (Gap days in the data).
-                # Also add up each day's measurements.
-                station_series = station_series.resample('D').sum()
-                # Bin the station series and calculate each month's
-                # percentage of data availability.
-                binned_series = station_series.resample(self.s.group). \
-                    apply(self.percentage_calculator,
-                          axis=1,
-                          station_info=station_info,
-                          station=station
-                          )
-                station_info['percentage'] = \
-                    round(station_info['percentage']/len(binned_series), 1)
-                station_info['y_label'] = f'  {station_info["percentage"]} %'
-            binned_data = \
-                pd.concat([binned_data, binned_series], axis=1, sort=True)
-        new_index = binned_data.index.to_list()
-        for i in range(len(new_index)):
-            timestamp = new_index[i]
-            new_index[i] = \
-                timestamp.strftime('%U-%y') if self.s.group == 'W' \
-                else timestamp.strftime('%m-%y')
-        binned_data.index = new_index
-        parsed_data = binned_data.transpose()
-        self._parsed_data = parsed_data
-        return
+    def percentages(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'stations': list(self.stations_info.keys()),
+            'percentages': [
+                info['y_label'] for info in self.stations_info.values()
+            ]
+        })
 
     @staticmethod
     def percentage_calculator(interval, **kwargs):
+        # Reference implementation of the percentage of a single
+        # interval. `src.coverage.coverage_table` computes the same
+        # numbers for all stations and intervals at once.
         station = kwargs['station']
         station_info = kwargs['station_info']
         percentage = None
@@ -232,104 +264,23 @@ class Heatmap:
             station_info['percentage'] += percentage
         return percentage
 
-    def plot_figures(self):
-        fig = plt.figure(figsize=(16, 10))
-        # Set the frequency of the x-axis labels.
-        # For some reason setting this to simply
-        # len(self.parsed_data.columns) does not work and completely
-        # removes the x-tick-labels. Play around with the // division
-        # and the number to get the x-tick-labels to show up.
-        # Todo: use this for standalone years & monthly generated output.
-        x_tick_labels = 1
-        # if self.s.group == 'M' and len(self.parsed_data.columns) == 12:
-        #     x_tick_labels = self.parsed_data.columns.to_list()
-        # else:
-        #     x_tick_labels = 2
-
-        # The bottom layer of the plot does not contain actual data
-        # values. We use this layer to just plot the left y-labels and
-        # the bottom x-labels.
-        # empty_data = self.parsed_data.copy()
-        # for column in empty_data.columns:
-        #     empty_data[column].values[:] = float("Nan")
-        ax = seaborn.heatmap(self.parsed_data,
-                             center=95,
-                             vmin=0, vmax=100,
-                             cbar=False,
-                             linewidths=.07,
-                             yticklabels=self.stations,
-                             # Circa 20 x-labels for each figure.
-                             xticklabels=x_tick_labels)
-        ax.yaxis.label.set_color('silver')
-        ax.set_ylabel(ylabel='Stations',
-                      fontdict={'fontsize': 18, 'fontweight': 'bold'},
-                      labelpad=5)
-        ax.set_yticklabels(ax.get_yticklabels(), fontdict={'fontsize': 10, 'fontweight': 400})
-        # Rotate the x-labels.
-        ax.set_xticklabels(ax.get_xticklabels(), rotation=80, fontdict={'fontsize': 14})
-        formatted_percentages = list()
-        df_input = {'stations': [], 'percentages': []}
-        for key, value in self.stations_info.items():
-            formatted_percentages.append(value['y_label'])
-            df_input['stations'].append(key)
-            df_input['percentages'].append(value['y_label'])
-
-        ax2 = ax.twinx()
-        # Call the heatmap and set the center at 95% to have everything
-        # lower. We have stations that run two or more instruments so
-        # we can get more than 100% coverage but that is fine, by
-        # setting vmax to 100%.
-        ax2 = seaborn.heatmap(self.parsed_data,
-                              center=95,
-                              vmin=0, vmax=100,
-                              cbar_kws=dict({'pad': 0.12}),
-                              cmap='coolwarm_r',
-                              linewidths=.07,
-                              yticklabels=formatted_percentages,
-                              # Circa 20 x-labels for each figure.
-                              xticklabels=x_tick_labels)
-        ax2.yaxis.label.set_color('silver')
-        ax2.set_yticklabels(ax2.get_yticklabels(),
-                            fontdict={'fontsize': 10, 'fontweight': 400})
-        ax.set_xticklabels(ax.get_xticklabels(), rotation=80,
-                           fontdict={'fontsize': 14})
-
-        # Todo: this y-label setting must be automized. Keep in mind
-        #  that for Alex's annual ICOS reporting you need to generate
-        #  the standalone running year, the cumulative
-        #  2020 - running-year,
-        ax2.set_ylabel(
-            ylabel=f'Total Percentages for {self.s.side_title_period}',
-            fontdict={'fontsize': 18, 'fontweight': 'bold'},
-            labelpad=10
-        )
-        # Todo: Y-label for cumulative report 2020-2023
-        # ax2.set_ylabel(ylabel=f'Total Percentages for 2020 - 2023',
-        #                fontdict={'fontsize': 18, 'fontweight': 'bold'},
-        #                labelpad=10)
-        # # Todo: Y-label for cumulative report 2021-2023
-        # ax2.set_ylabel(ylabel=f'Total Percentages for 2021 - 2023',
-        #                fontdict={'fontsize': 18, 'fontweight': 'bold'},
-        #                labelpad=10)
-        # # Todo: Y-label for standalone 2023
-        # ax2.set_ylabel(ylabel=f'Total Percentages for 2023',
-        #                fontdict={'fontsize': 18, 'fontweight': 'bold'},
-        #                labelpad=10)
-        # # Todo: ends here.
-        plt.title(**self.get_title_args())
-        plt.gcf().text(x=0, y=0, s='\n\n')
-        plt.gcf().text(x=0.92, y=0.92, s=' ')
-        plt.tight_layout()
-        self.save_to_files(percentages=df_input)
-        # Use the line below to make the plot appear in your IDE.
-        # plt.show()
-        # plt.close(fig)
-        return plt, fig
+    @cached_property
+    def fig(self) -> 'Figure':
+        return self.plot_figures()
+
+    def plot_figures(self) -> 'Figure':
+        from src.plotting import plot_figures
+        return plot_figures(self)
+
+    def image(self) -> bytes:
+        """Encode the figure in the format and dpi of the settings."""
+        from src.plotting import encode
+        return encode(self.fig, self.s.image_format, self.s.dpi)
 
     def get_title_args(self) -> dict:
         title = '\nICOS | {} raw data\ncoverage per {} and station\nfor {}'.\
             format(self.s.domain,
-                   'month' if self.s.group == 'M' else 'week',
+                   GROUP_NAMES[self.s.group],
                    self.s.title_period)
         font_dict = {'fontsize': 20,
                      'fontweight': 600,
@@ -339,25 +290,81 @@ class Heatmap:
         pad = '20.0'
         return {'label': title, 'fontdict': font_dict, 'y': y, 'pad': pad}
 
-    def save_to_files(self, percentages: dict[str, list]) -> None:
-        print('Generating .png and .csv files...')
-        figure_path = Path(
+    @property
+    def figure_path(self) -> Path:
+        return Path(
             self.s.output_dir,
             f'heatmap_{self.s.domain}_'
             f'{self.s.group.lower()}_'
-            f'{self.s.file_name_period}.png'
+            f'{self.s.file_name_period}.{self.s.image_format}'
         )
-        percent_path = Path(
+
+    @property
+    def percent_path(self) -> Path:
+        return Path(
             self.s.output_dir,
             f'{self.s.domain}_'
             f'{self.s.group.lower()}_'
             f'{self.s.file_name_period}_'
             f'percentages.csv'
         )
+
+    def trailing_path(self, days: int) -> Path:
+        return Path(
+            self.s.output_dir,
+            f'{self.s.domain}_trailing_{days}d_'
+            f'{self.s.file_name_period}_percentages.csv'
+        )
+
+    def output(self, digests: dict[str, str]) -> Output:
+        """Fingerprint the files of the heatmap.
+
+        `digests` are the station digests of the daily coverage of the
+        heatmap's window, see `src.regeneration.station_digests`.
+        """
+        return fingerprint_output(self.figure_path.name,
+                                  [self.figure_path, self.percent_path],
+                                  self.s, digests)
+
+    def trailing_output(self, days: int) -> Output:
+        # Trailing windows reach back `days` - 1 days before the start
+        # and take every object of the last day into account. Whether
+        # a window is NaN or 0 % depends on data before them.
+        start = to_utc(self.s.start).normalize() - \
+            pd.Timedelta(days=days - 1)
+        end = to_utc(self.s.end).normalize() + pd.Timedelta(days=1)
+        daily = self.cube.daily
+        started = daily.has_data[:, daily.days < start].any(axis=1)
+        digests = station_digests(daily.window(start, end), started)
+        return fingerprint_output(self.trailing_path(days).name,
+                                  [self.trailing_path(days)],
+                                  replace(self.s, group='D'), digests,
+                                  days=days)
+
+    def save_to_files(self) -> None:
+        print(f'Generating .{self.s.image_format} and .csv files...')
+        figure_path, percent_path = self.figure_path, self.percent_path
         print(f'\t{figure_path} ', end='')
-        plt.savefig(figure_path)
+        # Drawing the figure happens here, when it is first saved.
+        with stage('image_write'):
+            figure_path.write_bytes(self.image())
         print(icons.ICON_CHECK)
         print(f'\t{percent_path} ', end='')
-        (pd.DataFrame(percentages)).to_csv(percent_path)
+        with stage('csv_write'):
+            self.percentages.to_csv(percent_path)
+        print(icons.ICON_CHECK)
+        return
+
+    def save_trailing(self, days: int) -> None:
+        """Save the trailing window coverage of every day to a csv."""
+        trailing_path = self.trailing_path(days)
+        coverage = self.trailing(days)
+        frame = coverage.percentages.copy()
+        frame.columns = bin_labels(frame.columns, 'D')
+        frame['latest'] = coverage.totals
+        frame.index.name = 'station'
+        print(f'\t{trailing_path} ', end='')
+        with stage('csv_write'):
+            frame.to_csv(trailing_path)
         print(icons.ICON_CHECK)
         return
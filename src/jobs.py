@@ -0,0 +1,227 @@
+# Standard library imports.
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from time import monotonic, sleep
+import json
+import os
+import threading
+import uuid
+# Local application/library specific imports.
+from src.heatmap import Heatmap
+from src.result_cache import RenderedHeatmap, ResultCache, cache_key
+from src.settings import YamlSettings
+
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+IN_FLIGHT = (QUEUED, RUNNING)
+# Number of finished jobs remembered by the in-process queue.
+MAX_FINISHED_JOBS = 1000
+
+
+@dataclass(frozen=True)
+class Job:
+    """State of a heatmap job.
+
+    The id of a job is the result cache key of its settings, so
+    identical requests share a job and its result.
+    """
+    id: str
+    status: str = QUEUED
+    error: str | None = None
+    pid: int | None = None
+    submitted: str | None = None
+    finished: str | None = None
+
+    @property
+    def in_flight(self) -> bool:
+        return self.status in IN_FLIGHT
+
+
+def render_heatmap(settings: YamlSettings) -> RenderedHeatmap:
+    heatmap_obj = Heatmap(settings=settings)
+    return RenderedHeatmap(image=heatmap_obj.image(),
+                           percentages=heatmap_obj.percentages,
+                           image_format=settings.image_format)
+
+
+class JobQueue:
+    """Render heatmaps in a pool of background threads.
+
+    Jobs are tracked in the memory of this process, so their status
+    can only be polled from the process that submitted them. Results
+    are stored in `results`. Submitting settings whose job is still
+    queued or running returns that job instead of starting another
+    one.
+    """
+
+    def __init__(self, results: ResultCache, workers: int = 2) -> None:
+        self.results = results
+        self.workers = workers
+        self._jobs = OrderedDict()
+        self._changed = threading.Condition()
+        self._pool, self._pool_pid = None, None
+        return
+
+    def submit(self, settings: YamlSettings) -> Job:
+        job_id = cache_key(settings)
+        job = self.get(job_id)
+        if job is not None and job.status == DONE and \
+                self.results.get(job_id) is not None:
+            return job
+        job, created = self._claim(job_id)
+        if created:
+            self._executor().submit(self._run, job_id, settings)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._changed:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Job | None:
+        """Return the job once it's finished or `timeout` has passed."""
+        deadline = monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and job.in_flight and \
+                (remaining := deadline - monotonic()) > 0:
+            self._wait_for_change(remaining)
+            job = self.get(job_id)
+        return job
+
+    def result(self, job_id: str) -> RenderedHeatmap | None:
+        job = self.get(job_id)
+        if job is None or job.status != DONE:
+            return None
+        return self.results.get(job_id)
+
+    def _claim(self, job_id: str) -> tuple[Job, bool]:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None and job.in_flight:
+                return job, False
+            job = Job(id=job_id, pid=os.getpid(), submitted=_now())
+            self._store(job)
+            return job, True
+
+    def _run(self, job_id: str, settings: YamlSettings) -> None:
+        self._update(job_id, status=RUNNING)
+        try:
+            self.results.put(job_id, render_heatmap(settings))
+        except Exception as error:
+            self._update(job_id, status=FAILED, finished=_now(),
+                         error=f'{type(error).__name__}: {error}')
+        else:
+            self._update(job_id, status=DONE, finished=_now())
+        return
+
+    def _update(self, job_id: str, **changes) -> None:
+        with self._changed:
+            self._store(replace(self.get(job_id), **changes))
+        return
+
+    def _store(self, job: Job) -> None:
+        with self._changed:
+            self._jobs[job.id] = job
+            self._jobs.move_to_end(job.id)
+            finished = [key for key, value in self._jobs.items()
+                        if not value.in_flight]
+            for key in finished[:-MAX_FINISHED_JOBS]:
+                del self._jobs[key]
+            self._changed.notify_all()
+        return
+
+    def _wait_for_change(self, timeout: float) -> None:
+        with self._changed:
+            self._changed.wait(timeout)
+        return
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Threads don't survive a fork, e.g. gunicorn's `preload_app`,
+        # so the pool is created by the process that runs the jobs.
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+
+class FileJobQueue(JobQueue):
+    """Job queue sharing its jobs between processes through files.
+
+    The status of each job is kept as `<id>.json` in `directory` and
+    `results` must store its entries in a directory too, so any
+    gunicorn worker can report on and serve the jobs of the others.
+    Jobs are still run by the process that submitted them, those of a
+    process that died are started again by the next submission.
+    """
+
+    def __init__(self, directory: str | Path, results: ResultCache,
+                 workers: int = 2) -> None:
+        if results.directory is None:
+            raise ValueError('A file job queue needs a result cache '
+                             'directory.')
+        super().__init__(results=results, workers=workers)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return
+
+    def get(self, job_id: str) -> Job | None:
+        try:
+            job = Job(**json.loads(self._path(job_id).read_text()))
+        except (FileNotFoundError, ValueError, TypeError):
+            return None
+        if job.in_flight and not _alive(job.pid):
+            job = replace(job, status=FAILED,
+                          error='The process running the job died.')
+        return job
+
+    def _claim(self, job_id: str) -> tuple[Job, bool]:
+        job = Job(id=job_id, pid=os.getpid(), submitted=_now())
+        tmp_path = self._tmp_path(job_id)
+        tmp_path.write_text(json.dumps(asdict(job)))
+        try:
+            # Linking fails if the job exists, so only one process
+            # claims it.
+            os.link(tmp_path, self._path(job_id))
+            return job, True
+        except FileExistsError:
+            current = self.get(job_id)
+            if current is not None and current.in_flight:
+                return current, False
+            os.replace(tmp_path, self._path(job_id))
+            return job, True
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _store(self, job: Job) -> None:
+        tmp_path = self._tmp_path(job.id)
+        tmp_path.write_text(json.dumps(asdict(job)))
+        os.replace(tmp_path, self._path(job.id))
+        return
+
+    def _wait_for_change(self, timeout: float) -> None:
+        sleep(min(timeout, 0.25))
+        return
+
+    def _path(self, job_id: str) -> Path:
+        return Path(self.directory, f'{job_id}.json')
+
+    def _tmp_path(self, job_id: str) -> Path:
+        return Path(self.directory, f'{job_id}.{uuid.uuid4().hex}.tmp')
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def _alive(pid: int | None) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,120 @@
+# Standard library imports.
+from io import BytesIO
+from math import ceil
+from typing import TYPE_CHECKING
+# Related third party imports.
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import Colormap, ListedColormap
+from matplotlib.figure import Figure
+import numpy as np
+# Local application/library specific imports.
+from src.profiling import stage
+from src.settings import IMAGE_FORMATS
+
+if TYPE_CHECKING:
+    from src.heatmap import Heatmap
+
+
+FIGURE_SIZE = (16, 10)
+# Percentages are coloured around 95 %, so everything lower stands
+# out. Stations running two or more instruments may exceed 100 %, they
+# get the colour of 100 %.
+VMIN, VMAX, CENTER = 0, 100, 95
+CMAP = 'coolwarm_r'
+X_LABEL_SIZE, Y_LABEL_SIZE = 14, 10
+
+
+@stage('rendering')
+def plot_figures(heatmap: 'Heatmap') -> Figure:
+    """Draw the coverage matrix of a heatmap as a single raster image.
+
+    Stations are labelled on the left and their total percentages on
+    the right. With more stations or bins than fit, e.g. daily bins,
+    every n-th one is labelled.
+    """
+    # Figures are created without pyplot, so they are not kept
+    # alive by its global state and are freed once unreferenced.
+    fig = Figure(figsize=FIGURE_SIZE)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    values = heatmap.parsed_data.to_numpy(dtype=float)
+    n_rows, n_columns = values.shape
+    image = ax.imshow(values, cmap=centered_cmap(CMAP, VMIN, VMAX, CENTER),
+                      vmin=VMIN, vmax=VMAX, aspect='auto',
+                      interpolation='nearest',
+                      extent=(0, n_columns, n_rows, 0))
+    rows = np.arange(0, n_rows, label_step(n_rows))
+    columns = np.arange(0, n_columns, label_step(
+        n_columns, length=FIGURE_SIZE[0] * 0.7, height=X_LABEL_SIZE
+    ))
+    labels = heatmap.parsed_data.columns
+    ax.set_xticks(columns + 0.5, [labels[column] for column in columns],
+                  rotation=80, fontdict={'fontsize': X_LABEL_SIZE})
+    ax.set_yticks(rows + 0.5, [heatmap.stations[row] for row in rows],
+                  fontdict={'fontsize': Y_LABEL_SIZE, 'fontweight': 400})
+    ax.set_ylabel(ylabel='Stations',
+                  fontdict={'fontsize': 18, 'fontweight': 'bold'},
+                  labelpad=5, color='silver')
+
+    # The percentages are plain tick labels of a twin axis, nothing is
+    # drawn twice.
+    ax2 = ax.twinx()
+    ax2.set_ylim(ax.get_ylim())
+    formatted_percentages = heatmap.percentages['percentages'].to_list()
+    ax2.set_yticks(rows + 0.5, [formatted_percentages[row] for row in rows],
+                   fontdict={'fontsize': Y_LABEL_SIZE, 'fontweight': 400})
+    # Todo: this y-label setting must be automized. Keep in mind
+    #  that for Alex's annual ICOS reporting you need to generate
+    #  the standalone running year, the cumulative
+    #  2020 - running-year,
+    ax2.set_ylabel(
+        ylabel=f'Total Percentages for {heatmap.s.side_title_period}',
+        fontdict={'fontsize': 18, 'fontweight': 'bold'},
+        labelpad=10, color='silver'
+    )
+    for axis in (ax, ax2):
+        axis.tick_params(length=0)
+        for spine in axis.spines.values():
+            spine.set_visible(False)
+    fig.colorbar(image, ax=ax2, pad=0.12)
+    ax2.set_title(**heatmap.get_title_args())
+    fig.text(x=0, y=0, s='\n\n')
+    fig.text(x=0.92, y=0.92, s=' ')
+    fig.tight_layout()
+    return fig
+
+
+@stage('image_encode')
+def encode(fig: Figure, image_format: str = 'png', dpi: int = 100) -> bytes:
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f'Unknown image format "{image_format}", use one '
+                         f'of {", ".join(IMAGE_FORMATS)}.')
+    img = BytesIO()
+    fig.savefig(img, format=image_format, dpi=dpi)
+    return img.getvalue()
+
+
+def centered_cmap(name: str, vmin: float, vmax: float,
+                  center: float) -> Colormap:
+    """Cut a colormap so that `center` gets its middle colour.
+
+    The colours of [vmin, vmax] are those of a range symmetric around
+    `center`, like seaborn's `heatmap(center=...)`.
+    """
+    cmap = colormaps[name]
+    half_range = max(vmax - center, center - vmin)
+    low, high = (np.array([vmin, vmax]) - center + half_range) / \
+        (2 * half_range)
+    return ListedColormap(cmap(np.linspace(low, high, cmap.N)))
+
+
+def label_step(n_labels: int, length: float = FIGURE_SIZE[1] * 0.75,
+               height: float = 0.8 * Y_LABEL_SIZE) -> int:
+    # Labels `height` points high that fit along `length` inches of the
+    # axes without overlapping. By default the rows in the axes'
+    # height, about 75 % of the figure. Station codes and percentages
+    # are about 0.8 times the font size high. Bin labels are rotated,
+    # their font size wide, in about 70 % of the figure's width.
+    fitting = int(length * 72 / height)
+    return max(1, ceil(n_labels / fitting))
@@ -0,0 +1,333 @@
+# Standard library imports.
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
+from importlib.util import find_spec
+from math import ceil
+from pathlib import Path
+from time import perf_counter
+import argparse
+import os
+# Related third party imports.
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+import numpy as np
+import xarray
+# Local application/library specific imports.
+from src.constants import icons
+from src.plotting import encode
+from src.profiling import (Timings, add_worker_timings, collect, stage,
+                           worker_stage)
+from src.settings import IMAGE_FORMATS
+
+
+# Colour limits of the ICOS Cities emission inventories. Limits of other
+# variables are taken from their values.
+LIMITS = {
+    'emi_CO2_all_sectors': (1, 10000),
+    'emi_CH4_all_sectors': (0.0001, 1),
+    'emi_N2O_all_sectors': (0.00001, 0.1),
+    'emi_NOx_all_sectors': (0.001, 10),
+    'emi_PM10ex_all_sectors': (0.00001, 0.2),
+    'emi_PM25ex_all_sectors': (0.00001, 0.2),
+}
+LATITUDES = ('lat', 'latitude')
+LONGITUDES = ('lon', 'longitude')
+# Web mercator, the projection of the basemap tiles.
+CRS = 'EPSG:3857'
+FIGURE_SIZE = (9, 9)
+CMAP = 'viridis'
+ALPHA = 0.7
+# Grids larger than this many cells per side are averaged down, an image
+# cannot show more.
+RESOLUTION = 1000
+
+
+@dataclass(frozen=True)
+class Grid:
+    """The cell centres of a dataset projected to web mercator.
+
+    Regular grids are drawn as one image within `extent`, others as a
+    mesh of their `x` and `y` centres. Flipped axes of regular grids are
+    reversed, so that their first cell is at the bottom left.
+    """
+    dims: tuple[str, str]
+    factor: int
+    x: np.ndarray
+    y: np.ndarray
+    extent: tuple[float, float, float, float]
+    regular: bool
+    flip: tuple[bool, bool] = (False, False)
+
+
+@dataclass(frozen=True)
+class Basemap:
+    image: np.ndarray
+    extent: tuple[float, float, float, float]
+
+
+class NetcdfPreview:
+    """Preview maps of the gridded variables of a NetCDF file.
+
+    The file is opened lazily and each variable is only read when it is
+    drawn. The grid is projected once and reused by every variable, it
+    may be computed beforehand, e.g. by the parent of worker processes.
+    """
+
+    def __init__(self, path: str | Path, city: str = 'Zürich',
+                 resolution: int = RESOLUTION, grid: Grid | None = None,
+                 basemap: Basemap | None = None) -> None:
+        self.path = Path(path).expanduser()
+        self.city = city
+        self.resolution = resolution
+        if grid is not None:
+            self.grid = grid
+        self.basemap = basemap
+        return
+
+    @cached_property
+    @stage('netcdf_open')
+    def dataset(self) -> xarray.Dataset:
+        # With dask every variable is read in chunks, without it xarray
+        # still reads a variable only when its values are accessed.
+        chunks = {} if find_spec('dask') is not None else None
+        return xarray.open_dataset(self.path, chunks=chunks)
+
+    @cached_property
+    @stage('grid_projection')
+    def grid(self) -> Grid:
+        return project_grid(self.dataset, self.resolution)
+
+    @property
+    def variables(self) -> list[str]:
+        """Variables defined on the grid, e.g. the emissions of a gas."""
+        return [name for name, data in self.dataset.data_vars.items()
+                if set(self.grid.dims) <= set(data.dims)]
+
+    def values(self, variable: str) -> np.ndarray:
+        data = self.dataset[variable]
+        # Other dimensions, e.g. time or sectors, are previewed at their
+        # first index.
+        data = data.isel({dim: 0 for dim in data.dims
+                          if dim not in self.grid.dims})
+        if self.grid.factor > 1:
+            data = data.coarsen({dim: self.grid.factor
+                                 for dim in self.grid.dims},
+                                boundary='trim').mean()
+        # Chunks are read in this thread: the threads of dask would not
+        # survive the fork of worker processes, which read in parallel.
+        data = data.transpose(*self.grid.dims).compute(
+            scheduler='synchronous'
+        )
+        values = data.to_numpy().astype(float)
+        flip_y, flip_x = self.grid.flip
+        return values[::-1 if flip_y else 1, ::-1 if flip_x else 1]
+
+    @stage('rendering')
+    def render(self, variable: str) -> Figure:
+        """Draw a variable on a logarithmic colour scale."""
+        values = self.values(variable)
+        vmin, vmax = LIMITS.get(variable) or value_limits(values)
+        norm = LogNorm(vmin=vmin, vmax=vmax)
+        # Figures are created without pyplot, see `src.plotting`. The
+        # compressed layout shrinks the margins around the square map.
+        fig = Figure(figsize=FIGURE_SIZE, layout='compressed')
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        # The map tiles show through the emissions. Without them, colours
+        # are opaque: the cells of a mesh would overlap at their edges.
+        alpha = None
+        if self.basemap is not None:
+            ax.imshow(self.basemap.image, extent=self.basemap.extent,
+                      interpolation='bilinear')
+            alpha = ALPHA
+        if self.grid.regular:
+            image = ax.imshow(values, extent=self.grid.extent,
+                              origin='lower', cmap=CMAP, norm=norm,
+                              alpha=alpha, interpolation='nearest')
+        else:
+            image = ax.pcolormesh(self.grid.x, self.grid.y, values,
+                                  cmap=CMAP, norm=norm, alpha=alpha,
+                                  shading='nearest', rasterized=True)
+        left, right, bottom, top = self.grid.extent
+        ax.set_xlim(left, right)
+        ax.set_ylim(bottom, top)
+        ax.set_aspect('equal')
+        ax.set_axis_off()
+        attrs = self.dataset[variable].attrs
+        fig.colorbar(image, ax=ax, shrink=0.6,
+                     label=f'{attrs.get("comment", "")}\n'
+                           f'{attrs.get("units", "")}')
+        ax.set_title(f'ICOS Cities\n{self.city}: '
+                     f'{attrs.get("long_name", variable)}')
+        return fig
+
+    def save(self, variable: str, output_dir: str | Path = '.',
+             image_format: str = 'png', dpi: int = 150) -> Path:
+        image = encode(self.render(variable), image_format, dpi)
+        path = Path(output_dir, f'{variable}.{image_format}')
+        with stage('image_write'):
+            path.write_bytes(image)
+        return path
+
+    def save_all(self, output_dir: str | Path = '.',
+                 variables: list[str] | None = None,
+                 image_format: str = 'png', dpi: int = 150,
+                 workers: int | None = None) -> list[Path]:
+        """Save the previews of several variables in worker processes.
+
+        Each worker opens the file itself and only reads its variables,
+        the projected grid and the basemap are sent along.
+        """
+        variables = variables or self.variables
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        tasks = [(self.path, self.city, self.resolution, self.grid,
+                  self.basemap, variable, output_dir, image_format, dpi)
+                 for variable in variables]
+        if min(workers or os.cpu_count() or 1, len(tasks)) == 1:
+            return [self.save(variable, output_dir, image_format, dpi)
+                    for variable in variables]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_save_preview, tasks))
+        add_worker_timings(timings for _, timings in results)
+        return [path for path, _ in results]
+
+    def fetch_basemap(self) -> Basemap:
+        """Download the map tiles under the grid, once for all variables."""
+        import contextily
+        left, right, bottom, top = self.grid.extent
+        with stage('basemap'):
+            image, extent = contextily.bounds2img(left, bottom, right, top)
+        self.basemap = Basemap(image=image, extent=tuple(extent))
+        return self.basemap
+
+
+def _save_preview(task: tuple) -> tuple[Path, Timings]:
+    path, city, resolution, grid, basemap, variable, *save_args = task
+    with worker_stage('preview') as timings:
+        preview = NetcdfPreview(path, city=city, resolution=resolution,
+                                grid=grid, basemap=basemap)
+        saved_path = preview.save(variable, *save_args)
+    return saved_path, timings
+
+
+def project_grid(dataset: xarray.Dataset,
+                 resolution: int = RESOLUTION) -> Grid:
+    """Project the longitudes and latitudes of a dataset to web mercator.
+
+    Both rectilinear grids, with 1D coordinates, and curvilinear grids,
+    with 2D coordinates, are supported.
+    """
+    from pyproj import Transformer
+    lat = _coordinate(dataset, LATITUDES)
+    lon = _coordinate(dataset, LONGITUDES)
+    dims = (lat.dims[0], lon.dims[0]) if lat.ndim == 1 else lat.dims
+    factor = max(1, ceil(max(dataset.sizes[dim] for dim in dims) /
+                         resolution))
+    if factor > 1:
+        lat, lon = [coordinate.coarsen({dim: factor
+                                        for dim in coordinate.dims},
+                                       boundary='trim').mean()
+                    for coordinate in (lat, lon)]
+    transformer = Transformer.from_crs('EPSG:4326', CRS, always_xy=True)
+    if lat.ndim == 1:
+        # Mercator x only depends on the longitude, y on the latitude.
+        x, _ = transformer.transform(lon.values, np.zeros(lon.shape))
+        _, y = transformer.transform(np.zeros(lat.shape), lat.values)
+    else:
+        x, y = transformer.transform(lon.transpose(*dims).values,
+                                     lat.transpose(*dims).values)
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+
+    columns = x if x.ndim == 1 else x.mean(axis=0)
+    rows = y if y.ndim == 1 else y.mean(axis=1)
+    regular = _is_regular(columns) and _is_regular(rows)
+    if x.ndim == 2:
+        # Curvilinear grids only draw as an image when their rows and
+        # columns are (almost) parallel to the axes.
+        regular &= _is_regular(x, reference=columns[np.newaxis, :]) and \
+                   _is_regular(y, reference=rows[:, np.newaxis])
+    if not regular:
+        return Grid(dims=dims, factor=factor, x=x, y=y, regular=False,
+                    extent=(x.min(), x.max(), y.min(), y.max()))
+    flip = (bool(rows[0] > rows[-1]), bool(columns[0] > columns[-1]))
+    columns, rows = np.sort(columns), np.sort(rows)
+    half_x = (columns[-1] - columns[0]) / max(1, len(columns) - 1) / 2
+    half_y = (rows[-1] - rows[0]) / max(1, len(rows) - 1) / 2
+    return Grid(dims=dims, factor=factor, x=columns, y=rows, regular=True,
+                extent=(columns[0] - half_x, columns[-1] + half_x,
+                        rows[0] - half_y, rows[-1] + half_y),
+                flip=flip)
+
+
+def _coordinate(dataset: xarray.Dataset,
+                names: tuple[str, ...]) -> xarray.DataArray:
+    for name in names:
+        if name in dataset.variables:
+            return dataset[name]
+    raise ValueError(f'No coordinate {" or ".join(names)} in the dataset.')
+
+
+def _is_regular(centres: np.ndarray,
+                reference: np.ndarray | None = None) -> bool:
+    # Centres are regular when none is off by more than a quarter of a
+    # cell from evenly spaced (or reference) ones, less than a pixel.
+    if reference is None:
+        reference = np.linspace(centres[0], centres[-1], len(centres))
+    step = abs(reference.flat[-1] - reference.flat[0]) / \
+        max(1, reference.size - 1)
+    return bool(np.all(np.abs(centres - reference) <= step / 4))
+
+
+def value_limits(values: np.ndarray) -> tuple[float, float]:
+    """Colour limits of a variable on a logarithmic scale."""
+    positive = values[np.isfinite(values) & (values > 0)]
+    if not positive.size:
+        return 1, 10
+    return tuple(np.percentile(positive, [1, 99.9]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Save preview maps of the variables of a NetCDF file.'
+    )
+    parser.add_argument('path', type=Path)
+    parser.add_argument('--variables', nargs='+',
+                        help='Variables to preview, all gridded ones by '
+                             'default.')
+    parser.add_argument('--output-dir', type=Path, default=Path('.'))
+    parser.add_argument('--format', dest='image_format', default='png',
+                        choices=list(IMAGE_FORMATS))
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes, one per CPU by default.')
+    parser.add_argument('--city', default='Zürich')
+    parser.add_argument('--resolution', type=int, default=RESOLUTION,
+                        help='Most grid cells drawn per side.')
+    parser.add_argument('--basemap', action='store_true',
+                        help='Draw the previews over map tiles, fetched '
+                             'with contextily.')
+    parser.add_argument('--timings', action='store_true',
+                        help='Report the time and memory of every stage.')
+    args = parser.parse_args()
+
+    tic = perf_counter()
+    preview = NetcdfPreview(args.path, city=args.city,
+                            resolution=args.resolution)
+    with collect() as timings:
+        if args.basemap:
+            preview.fetch_basemap()
+        paths = preview.save_all(args.output_dir, args.variables,
+                                 args.image_format, args.dpi, args.workers)
+    for path in paths:
+        print(f'\t{path}')
+    print(f'Saved {len(paths)} previews in {perf_counter() - tic:.1f} s '
+          f'{icons.ICON_CHECK}')
+    if args.timings:
+        print(timings.report())
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# Standard library imports.
+from pathlib import Path
+import json
+# Related third party imports.
+from flask import Blueprint, Response, abort, current_app, render_template, \
+    send_from_directory
+
+
+# Layout of the tiles of a NetCDF file, see `src.previews.tiles`:
+# `<name>/index.json` and `<name>/<variable>/<z>/<x>/<y>.<format>`.
+INDEX = 'index.json'
+TILE_FORMATS = {'png': 'image/png', 'webp': 'image/webp'}
+# Tiles are requested with the fingerprint of their variable, so the
+# url changes when a variable is tiled again and tiles may be cached.
+TILE_MAX_AGE = 7 * 24 * 3600
+
+previews = Blueprint('previews', __name__, url_prefix='/previews')
+
+
+def tiles_dir() -> Path:
+    directory = current_app.config.get('PREVIEW_TILES_DIR', 'tiles')
+    return Path(directory).resolve()
+
+
+def read_index(directory: str | Path) -> dict | None:
+    try:
+        return json.loads(Path(directory, INDEX).read_text())
+    except FileNotFoundError:
+        return None
+
+
+@previews.route('/', methods=['GET'])
+def viewer() -> str:
+    """Pan and zoom through the tiled previews of every NetCDF file."""
+    names = sorted(path.parent.name
+                   for path in tiles_dir().glob(f'*/{INDEX}'))
+    return render_template('previews.html', names=names)
+
+
+@previews.route(f'/<name>/{INDEX}', methods=['GET'])
+def tile_index(name: str) -> Response:
+    return send_from_directory(tiles_dir(), f'{name}/{INDEX}', max_age=0)
+
+
+@previews.route('/<name>/<variable>/<int:z>/<int:x>/<int:y>.<image_format>',
+                methods=['GET'])
+def tile(name: str, variable: str, z: int, x: int, y: int,
+         image_format: str) -> Response:
+    # Tiles without any emission are not written, they are not found.
+    if image_format not in TILE_FORMATS:
+        abort(404)
+    return send_from_directory(
+        tiles_dir(), f'{name}/{variable}/{z}/{x}/{y}.{image_format}',
+        mimetype=TILE_FORMATS[image_format], max_age=TILE_MAX_AGE
+    )
@@ -0,0 +1,397 @@
+# Standard library imports.
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import cached_property
+from math import ceil, floor, log2
+from pathlib import Path
+from time import perf_counter
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+# Related third party imports.
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LogNorm, to_hex
+from matplotlib.figure import Figure
+from PIL import Image
+import numpy as np
+# Local application/library specific imports.
+from src.constants import icons
+from src.previews.netcdf import (CMAP, CRS, LIMITS, Grid, NetcdfPreview,
+                                 value_limits)
+from src.previews.server import INDEX, TILE_FORMATS, read_index
+from src.profiling import (Timings, add_worker_timings, collect,
+                           worker_stage)
+
+
+TILE_SIZE = 256
+# Half the circumference of the equator in web mercator, the tiles of
+# zoom z split [-ORIGIN, ORIGIN] in 2 ** z parts along both axes.
+ORIGIN = 20037508.342789244
+# Tiles are drawn from the grid at full resolution, up to this many
+# cells per side.
+RESOLUTION = 16384
+# Colours of the legend drawn by viewers.
+LEGEND_STOPS = 9
+
+
+class TilePyramid:
+    """Web mercator tiles of the gridded variables of a NetCDF file.
+
+    Every zoom level from one tile spanning the grid down to one pixel
+    per cell is tiled, coarser levels from averages of the cells. The
+    index holds the zoom levels, bounds and colour scale of every
+    variable. Variables whose values did not change since they were
+    tiled are skipped.
+    """
+
+    def __init__(self, path: str | Path, directory: str | Path,
+                 image_format: str = 'png',
+                 zooms: tuple[int, int] | None = None,
+                 resolution: int = RESOLUTION) -> None:
+        if image_format not in TILE_FORMATS:
+            raise ValueError(f'Unknown tile format "{image_format}", use '
+                             f'one of {", ".join(TILE_FORMATS)}.')
+        self.preview = NetcdfPreview(path, resolution=resolution)
+        self.directory = Path(directory)
+        self.image_format = image_format
+        if zooms is not None:
+            self.zooms = zooms
+        return
+
+    @cached_property
+    def zooms(self) -> tuple[int, int]:
+        return zoom_levels(self.preview.grid)
+
+    def build(self, variables: list[str] | None = None,
+              workers: int | None = None) -> list[str]:
+        """Tile the changed variables, all by default, in worker processes.
+
+        Return the variables that were tiled. Without `variables` the
+        tiles of variables no longer in the file are removed.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = (read_index(self.directory) or {}).get('variables', {})
+        names = variables or self.preview.variables
+        tasks = [(self.preview.path, self.preview.grid, variable,
+                  self.directory, self.image_format, self.zooms,
+                  entries.get(variable, {}).get('fingerprint'))
+                 for variable in names]
+        if min(workers or os.cpu_count() or 1, len(tasks)) == 1:
+            results = [_tile_variable(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_tile_variable, tasks))
+        add_worker_timings(timings for *_, timings in results)
+        tiled = list()
+        for variable, entry, _ in results:
+            if entry is not None:
+                entries[variable] = entry
+                tiled.append(variable)
+        if variables is None:
+            for variable in set(entries) - set(names):
+                del entries[variable]
+                shutil.rmtree(self.directory / variable, ignore_errors=True)
+        self.write_index(entries)
+        return tiled
+
+    def write_index(self, entries: dict) -> None:
+        from pyproj import Transformer
+        left, right, bottom, top = self.preview.grid.extent
+        west, south, east, north = Transformer.from_crs(
+            CRS, 'EPSG:4326', always_xy=True
+        ).transform_bounds(left, bottom, right, top)
+        index = {'crs': CRS, 'tile_size': TILE_SIZE,
+                 'format': self.image_format,
+                 'min_zoom': self.zooms[0], 'max_zoom': self.zooms[1],
+                 'extent': [left, right, bottom, top],
+                 'bounds': [west, south, east, north],
+                 'variables': dict(sorted(entries.items()))}
+        # The index is renamed into place, it is never read half written.
+        with tempfile.NamedTemporaryFile(mode='w', dir=self.directory,
+                                         suffix='.tmp',
+                                         delete=False) as handle:
+            json.dump(index, handle, indent=2)
+        os.replace(handle.name, self.directory / INDEX)
+        return
+
+
+def _tile_variable(task: tuple) -> tuple[str, dict | None, Timings]:
+    path, grid, variable, directory, image_format, zooms, previous = task
+    with worker_stage('tiles') as timings:
+        preview = NetcdfPreview(path, grid=grid)
+        values = preview.values(variable)
+        vmin, vmax = LIMITS.get(variable) or value_limits(values)
+        attrs = preview.dataset[variable].attrs
+        fingerprint = hashlib.sha256(values.tobytes())
+        fingerprint.update(json.dumps(
+            [vmin, vmax, zooms, image_format, grid.extent,
+             {key: str(value) for key, value in attrs.items()}]
+        ).encode())
+        fingerprint = fingerprint.hexdigest()
+        if fingerprint == previous and Path(directory, variable).exists():
+            return variable, None, timings
+        norm = LogNorm(vmin=vmin, vmax=vmax)
+        n_tiles = write_tiles(grid, values, norm, Path(directory, variable),
+                              image_format, zooms)
+    cmap = colormaps[CMAP]
+    entry = {'fingerprint': fingerprint, 'vmin': float(vmin),
+             'vmax': float(vmax), 'units': attrs.get('units', ''),
+             'long_name': attrs.get('long_name', variable),
+             'comment': attrs.get('comment', ''), 'tiles': n_tiles,
+             'legend': [to_hex(cmap(stop))
+                        for stop in np.linspace(0, 1, LEGEND_STOPS)],
+             'updated': datetime.now(timezone.utc).isoformat(
+                 timespec='seconds'
+             )}
+    return variable, entry, timings
+
+
+def write_tiles(grid: Grid, values: np.ndarray, norm: LogNorm,
+                directory: Path, image_format: str,
+                zooms: tuple[int, int]) -> int:
+    """Write the tiles of one variable and return their number.
+
+    Tiles are written next to the current ones and swapped in once all
+    are done, tiles without any emission are left out.
+    """
+    cmap = colormaps[CMAP]
+    tiler = RasterTiles(grid, values) if grid.x.ndim == 1 \
+        else MeshTiles(grid, values, norm)
+    staging = Path(tempfile.mkdtemp(dir=directory.parent,
+                                    prefix=f'.{directory.name}-'))
+    n_tiles = 0
+    for zoom in range(zooms[0], zooms[1] + 1):
+        for x, y in tile_range(grid.extent, zoom):
+            rgba = tiler.rgba(zoom, x, y, norm, cmap)
+            if not rgba[..., 3].any():
+                continue
+            path = staging / str(zoom) / str(x) / f'{y}.{image_format}'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            Image.fromarray(rgba).save(path, format=image_format,
+                                       lossless=True)
+            n_tiles += 1
+    replaced = directory.with_name(f'.{directory.name}-replaced')
+    if directory.exists():
+        directory.rename(replaced)
+    staging.rename(directory)
+    shutil.rmtree(replaced, ignore_errors=True)
+    return n_tiles
+
+
+class RasterTiles:
+    """Tiles of a grid with 1D coordinates, sampled from its cells.
+
+    Coarser levels average 2 x 2 cells of the previous one, a tile is
+    sampled from the coarsest level with cells no larger than its
+    pixels.
+    """
+
+    def __init__(self, grid: Grid, values: np.ndarray) -> None:
+        if grid.regular:
+            # Already ordered from the bottom left, see `NetcdfPreview`.
+            left, right, bottom, top = grid.extent
+            x_edges = np.linspace(left, right, values.shape[1] + 1)
+            y_edges = np.linspace(bottom, top, values.shape[0] + 1)
+        else:
+            columns, rows = np.argsort(grid.x), np.argsort(grid.y)
+            values = values[np.ix_(rows, columns)]
+            x_edges, y_edges = edges(grid.x[columns]), edges(grid.y[rows])
+        self.levels = [(values, x_edges, y_edges)]
+        while max(values.shape) > 1:
+            values = halve(values)
+            x_edges, y_edges = halve_edges(x_edges), halve_edges(y_edges)
+            self.levels.append((values, x_edges, y_edges))
+        return
+
+    def rgba(self, zoom: int, x: int, y: int, norm: LogNorm,
+             cmap) -> np.ndarray:
+        pixel = 2 * ORIGIN / 2 ** zoom / TILE_SIZE
+        values, x_edges, y_edges = self.levels[0]
+        for level in self.levels[1:]:
+            if max(np.diff(level[1]).max(), np.diff(level[2]).max()) > pixel:
+                break
+            values, x_edges, y_edges = level
+        left, _, _, top = tile_bounds(zoom, x, y)
+        # Rows of images run from the top down.
+        centres = (np.arange(TILE_SIZE) + 0.5) * pixel
+        columns = np.searchsorted(x_edges, left + centres, side='right') - 1
+        rows = np.searchsorted(y_edges, top - centres, side='right') - 1
+        in_columns = (columns >= 0) & (columns < values.shape[1])
+        in_rows = (rows >= 0) & (rows < values.shape[0])
+        tile = np.full((TILE_SIZE, TILE_SIZE), np.nan)
+        tile[np.ix_(in_rows, in_columns)] = values[np.ix_(rows[in_rows],
+                                                          columns[in_columns])]
+        # Cells without emissions are masked by the logarithmic scale and
+        # get the transparent "bad" colour.
+        return cmap(norm(tile), bytes=True)
+
+
+class MeshTiles:
+    """Tiles of a curvilinear grid, drawn with matplotlib.
+
+    Coarser levels average 2 x 2 cells and their centres. A tile only
+    draws the cells near it, of the coarsest level with cells no larger
+    than its pixels.
+    """
+
+    def __init__(self, grid: Grid, values: np.ndarray,
+                 norm: LogNorm) -> None:
+        self.fig = Figure(figsize=(1, 1), dpi=TILE_SIZE)
+        FigureCanvasAgg(self.fig)
+        self.fig.patch.set_alpha(0)
+        self.ax = self.fig.add_axes((0, 0, 1, 1))
+        self.ax.set_axis_off()
+        self.mesh = None
+        left, right, bottom, top = grid.extent
+        x, y = grid.x, grid.y
+        cell = max((right - left) / x.shape[1], (top - bottom) / x.shape[0])
+        self.levels = [(x, y, values, cell)]
+        while min(values.shape) > 1:
+            # Centres cannot be missing, an odd last row or column is
+            # left out instead.
+            even = tuple(slice(0, size - size % 2) for size in values.shape)
+            x, y, values = halve(x[even]), halve(y[even]), halve(values[even])
+            cell *= 2
+            self.levels.append((x, y, values, cell))
+        return
+
+    def rgba(self, zoom: int, x: int, y: int, norm: LogNorm,
+             cmap) -> np.ndarray:
+        pixel = 2 * ORIGIN / 2 ** zoom / TILE_SIZE
+        level = self.levels[0]
+        for coarser in self.levels[1:]:
+            if coarser[3] > pixel:
+                break
+            level = coarser
+        centres_x, centres_y, values, cell = level
+        left, right, bottom, top = tile_bounds(zoom, x, y)
+        near = (centres_x > left - 2 * cell) & \
+            (centres_x < right + 2 * cell) & \
+            (centres_y > bottom - 2 * cell) & (centres_y < top + 2 * cell)
+        if self.mesh is not None:
+            self.mesh.remove()
+            self.mesh = None
+        if not near.any():
+            return np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+        rows, columns = np.flatnonzero(near.any(axis=1)), \
+            np.flatnonzero(near.any(axis=0))
+        window = (slice(rows[0], rows[-1] + 1),
+                  slice(columns[0], columns[-1] + 1))
+        self.mesh = self.ax.pcolormesh(centres_x[window], centres_y[window],
+                                       values[window], cmap=cmap, norm=norm,
+                                       shading='nearest')
+        self.ax.set_xlim(left, right)
+        self.ax.set_ylim(bottom, top)
+        self.fig.canvas.draw()
+        return np.array(self.fig.canvas.buffer_rgba())
+
+
+def edges(centres: np.ndarray) -> np.ndarray:
+    """Edges of cells halfway between ascending centres."""
+    middles = (centres[1:] + centres[:-1]) / 2
+    first = 2 * centres[0] - middles[0] if len(middles) else centres[0] - 1
+    last = 2 * centres[-1] - middles[-1] if len(middles) else centres[0] + 1
+    return np.concatenate([[first], middles, [last]])
+
+
+def halve_edges(cell_edges: np.ndarray) -> np.ndarray:
+    # Like `halve`, an odd last cell is paired with an empty one as wide.
+    if len(cell_edges) % 2 == 0:
+        cell_edges = np.append(cell_edges,
+                               2 * cell_edges[-1] - cell_edges[-2])
+    return cell_edges[::2]
+
+
+def halve(values: np.ndarray) -> np.ndarray:
+    """Average 2 x 2 cells, ignoring missing ones."""
+    rows, columns = values.shape
+    padded = np.full((rows + rows % 2, columns + columns % 2), np.nan)
+    padded[:rows, :columns] = values
+    blocks = padded.reshape(padded.shape[0] // 2, 2,
+                            padded.shape[1] // 2, 2)
+    counts = np.isfinite(blocks).sum(axis=(1, 3))
+    sums = np.nansum(blocks, axis=(1, 3))
+    return np.divide(sums, counts, out=np.full(sums.shape, np.nan),
+                     where=counts > 0)
+
+
+def zoom_levels(grid: Grid) -> tuple[int, int]:
+    """Zooms from one tile spanning the grid to one pixel per cell."""
+    left, right, bottom, top = grid.extent
+    n_rows, n_columns = grid.y.shape[0], grid.x.shape[-1]
+    cell = min((right - left) / n_columns, (top - bottom) / n_rows)
+    min_zoom = max(0, floor(log2(2 * ORIGIN /
+                                 max(right - left, top - bottom))))
+    max_zoom = max(min_zoom, ceil(log2(2 * ORIGIN / TILE_SIZE / cell)))
+    return min_zoom, max_zoom
+
+
+def tile_bounds(zoom: int, x: int,
+                y: int) -> tuple[float, float, float, float]:
+    # Tiles are numbered from the top left corner of the world.
+    size = 2 * ORIGIN / 2 ** zoom
+    left, top = x * size - ORIGIN, ORIGIN - y * size
+    return left, left + size, top - size, top
+
+
+def tile_range(extent: tuple[float, float, float, float],
+               zoom: int) -> list[tuple[int, int]]:
+    """The tiles covering an extent at a zoom level."""
+    left, right, bottom, top = extent
+    size, last = 2 * ORIGIN / 2 ** zoom, 2 ** zoom - 1
+    first_x, last_x, first_y, last_y = [
+        min(max(int(floor(value / size)), 0), last)
+        for value in (left + ORIGIN, right + ORIGIN,
+                      ORIGIN - top, ORIGIN - bottom)
+    ]
+    return [(x, y) for x in range(first_x, last_x + 1)
+            for y in range(first_y, last_y + 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Tile the variables of a NetCDF file for the previews '
+                    'of the web application.'
+    )
+    parser.add_argument('path', type=Path)
+    parser.add_argument('--tiles-dir', type=Path, default=Path('tiles'),
+                        help='Tiles are written to <tiles-dir>/<file name>.')
+    parser.add_argument('--variables', nargs='+',
+                        help='Variables to tile, all gridded ones by '
+                             'default.')
+    parser.add_argument('--format', dest='image_format', default='png',
+                        choices=list(TILE_FORMATS))
+    parser.add_argument('--zooms', type=int, nargs=2,
+                        metavar=('MIN_ZOOM', 'MAX_ZOOM'),
+                        help='Zoom levels, by default from one tile '
+                             'spanning the grid to one pixel per cell.')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes, one per CPU by default.')
+    parser.add_argument('--timings', action='store_true',
+                        help='Report the time and memory of every stage.')
+    args = parser.parse_args()
+
+    tic = perf_counter()
+    pyramid = TilePyramid(args.path, args.tiles_dir / args.path.stem,
+                          image_format=args.image_format,
+                          zooms=tuple(args.zooms) if args.zooms else None)
+    with collect() as timings:
+        tiled = pyramid.build(args.variables, args.workers)
+    entries = read_index(pyramid.directory)['variables']
+    for variable in args.variables or pyramid.preview.variables:
+        state = 'tiled' if variable in tiled else 'unchanged'
+        print(f'\t{variable}: {entries[variable]["tiles"]} tiles, {state}')
+    print(f'Tiled {len(tiled)} variables of {args.path} at zoom '
+          f'{pyramid.zooms[0]} - {pyramid.zooms[1]} in '
+          f'{perf_counter() - tic:.1f} s {icons.ICON_CHECK}')
+    if args.timings:
+        print(timings.report())
+    return
+
+
+if __name__ == '__main__':
+    main()
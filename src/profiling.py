@@ -0,0 +1,192 @@
+# Standard library imports.
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Iterable, Iterator
+import resource
+import sys
+import threading
+import tracemalloc
+
+
+@dataclass
+class StageTiming:
+    """Duration and memory of one run of a pipeline stage.
+
+    `peak_bytes` is the highest memory allocated by Python during the
+    stage, only known while `tracemalloc` is tracing. `max_rss_bytes`
+    is the resident set high-water mark of the process when the stage
+    ended.
+    """
+    name: str
+    depth: int
+    seconds: float = 0.0
+    peak_bytes: int | None = None
+    max_rss_bytes: int = 0
+
+
+@dataclass
+class Timings:
+    """Stages recorded while collecting, in the order they started."""
+    stages: list[StageTiming] = field(default_factory=list)
+
+    def totals(self) -> dict[str, float]:
+        totals = defaultdict(float)
+        for timing in self.stages:
+            totals[timing.name] += timing.seconds
+        return dict(totals)
+
+    def extend(self, other: 'Timings', depth: int = 0) -> None:
+        for timing in other.stages:
+            self.stages.append(StageTiming(
+                name=timing.name, depth=timing.depth + depth,
+                seconds=timing.seconds, peak_bytes=timing.peak_bytes,
+                max_rss_bytes=timing.max_rss_bytes
+            ))
+        return
+
+    def report(self) -> str:
+        lines = [f'{"stage":32s} {"time":>10s} {"peak":>10s} '
+                 f'{"max rss":>10s}']
+        for timing in self.stages:
+            peak = '' if timing.peak_bytes is None \
+                else f'{timing.peak_bytes / 2 ** 20:6.1f} MiB'
+            lines.append(f'{"  " * timing.depth + timing.name:32s} '
+                         f'{timing.seconds * 1000:7.1f} ms {peak:>10s} '
+                         f'{timing.max_rss_bytes / 2 ** 20:6.1f} MiB')
+        return '\n'.join(lines)
+
+    def server_timing(self) -> str:
+        """Format the total duration per stage as a Server-Timing header."""
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}'
+                         for name, seconds in self.totals().items())
+
+
+class StageMetrics:
+    """Count, total and maximum duration per stage of this process."""
+
+    def __init__(self) -> None:
+        self._stages = dict()
+        self._lock = threading.Lock()
+        return
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            count, total, maximum = self._stages.get(name, (0, 0.0, 0.0))
+            self._stages[name] = (count + 1, total + seconds,
+                                  max(maximum, seconds))
+        return
+
+    def exposition(self) -> str:
+        """Format the metrics in the Prometheus text format."""
+        with self._lock:
+            stages = sorted(self._stages.items())
+        lines = [
+            '# HELP heatmap_stage_seconds Duration of heatmap pipeline '
+            'stages.',
+            '# TYPE heatmap_stage_seconds summary',
+        ]
+        for name, (count, total, _) in stages:
+            lines.append(f'heatmap_stage_seconds_count{{stage="{name}"}} '
+                         f'{count}')
+            lines.append(f'heatmap_stage_seconds_sum{{stage="{name}"}} '
+                         f'{total:.6f}')
+        lines += ['# HELP heatmap_stage_seconds_max Longest duration of '
+                  'heatmap pipeline stages.',
+                  '# TYPE heatmap_stage_seconds_max gauge']
+        for name, (_, _, maximum) in stages:
+            lines.append(f'heatmap_stage_seconds_max{{stage="{name}"}} '
+                         f'{maximum:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = StageMetrics()
+_timings: ContextVar[Timings | None] = ContextVar('timings', default=None)
+# Open stages of the current context, innermost last, with the peak
+# of their finished child stages.
+_open: ContextVar[tuple] = ContextVar('open_stages', default=())
+
+
+@contextmanager
+def collect() -> Iterator[Timings]:
+    """Record the stages run in this context, e.g. one request."""
+    timings = Timings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+    return
+
+
+def current() -> Timings | None:
+    return _timings.get()
+
+
+@contextmanager
+def worker_stage(name: str) -> Iterator[Timings]:
+    """Time a task run in a worker process as stage `name`.
+
+    Stages recorded in a worker process are lost with it, so the task
+    returns the yielded timings and the parent adds them to its own
+    with `add_worker_timings`.
+    """
+    with collect() as timings, stage(name):
+        yield timings
+    return
+
+
+def add_worker_timings(worker_timings: Iterable[Timings]) -> None:
+    """Add the timings of tasks run by `worker_stage` while collecting."""
+    if current() is not None:
+        for timings in worker_timings:
+            current().extend(timings)
+    return
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage of the pipeline.
+
+    Every run is added to the process' `metrics` and, while collecting,
+    to the current `Timings`. Can be used as a decorator too.
+    """
+    timings = _timings.get()
+    timing = StageTiming(name=name, depth=len(_open.get()))
+    if timings is not None:
+        timings.stages.append(timing)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # The peak so far belongs to the enclosing stage.
+        _fold_peak(tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    peaks = [0]
+    token = _open.set(_open.get() + (peaks,))
+    tic = perf_counter()
+    try:
+        yield
+    finally:
+        timing.seconds = perf_counter() - tic
+        _open.reset(token)
+        if tracing and tracemalloc.is_tracing():
+            timing.peak_bytes = max(tracemalloc.get_traced_memory()[1],
+                                    peaks[0])
+            _fold_peak(timing.peak_bytes)
+        timing.max_rss_bytes = max_rss()
+        metrics.add(name, timing.seconds)
+    return
+
+
+def max_rss() -> int:
+    # Kilobytes on Linux, bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def _fold_peak(peak: int) -> None:
+    if _open.get():
+        peaks = _open.get()[-1]
+        peaks[0] = max(peaks[0], peak)
+    return
@@ -0,0 +1,153 @@
+# Standard library imports.
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+import hashlib
+import json
+import os
+import tempfile
+# Related third party imports.
+import numpy as np
+# Local application/library specific imports.
+from src.coverage import DailyCoverage
+from src.settings import YamlSettings
+
+
+# Fingerprints of the outputs of a directory, see `Manifest`.
+MANIFEST = '.fingerprints.json'
+# Bump to regenerate every output once, e.g. when the rendering changes.
+FINGERPRINT_VERSION = 1
+# Settings that do not change the content of an output.
+IGNORED_SETTINGS = ('cache_path', 'using_cache', 'refresh_cache',
+                    'output_dir')
+NEW, CHANGED, UNCHANGED, FORCED = 'new', 'changed', 'unchanged', 'forced'
+
+
+@dataclass(frozen=True)
+class Output:
+    """Files generated from a window of the daily coverage.
+
+    `fingerprint` covers the settings and the daily coverage of every
+    station, `digests` holds the digest of each station's share.
+    """
+    name: str
+    paths: tuple[Path, ...]
+    fingerprint: str
+    digests: dict[str, str]
+
+
+@dataclass(frozen=True)
+class Change:
+    status: str
+    # Stations whose daily coverage changed, were added or removed.
+    stations: tuple[str, ...] = ()
+
+    @property
+    def skipped(self) -> bool:
+        return self.status == UNCHANGED
+
+
+def station_digests(daily: DailyCoverage,
+                    started: np.ndarray | None = None) -> dict[str, str]:
+    """Digest the daily coverage of every station of a window.
+
+    `started` flags the stations with data before the window, for
+    outputs that depend on it.
+    """
+    if started is None:
+        started = np.zeros(len(daily.stations), dtype=bool)
+    # 64 bits tell changes apart and keep the manifest small.
+    return {
+        station: hashlib.sha256(daily.sums[row].tobytes() +
+                                daily.has_data[row].tobytes() +
+                                (b'started' if started[row] else b'')
+                                ).hexdigest()[:16]
+        for row, station in enumerate(daily.stations)
+    }
+
+
+def fingerprint_output(name: str, paths: list[Path], settings: YamlSettings,
+                       digests: dict[str, str], **extra) -> Output:
+    content = {key: value for key, value in asdict(settings).items()
+               if key not in IGNORED_SETTINGS}
+    canonical = json.dumps(
+        {'version': FINGERPRINT_VERSION, 'settings': content,
+         'stations': digests, **extra},
+        sort_keys=True, default=str
+    )
+    return Output(name=name, paths=tuple(paths),
+                  fingerprint=hashlib.sha256(canonical.encode()).hexdigest(),
+                  digests=digests)
+
+
+class Manifest:
+    """Fingerprints of the outputs saved to a directory.
+
+    An output whose fingerprint matches the one recorded when it was
+    last saved, and whose files still exist, needs no regeneration.
+    The manifest is replaced atomically, so an interrupted run leaves
+    the previous one.
+    """
+
+    def __init__(self, directory: str | Path) -> None:
+        self.path = Path(directory, MANIFEST)
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.entries = dict()
+        return
+
+    def change(self, out: Output, force: bool = False) -> Change:
+        entry = self.entries.get(out.name)
+        if entry is None or not all(path.exists() for path in out.paths):
+            return Change(NEW)
+        if force:
+            return Change(FORCED)
+        if entry['fingerprint'] == out.fingerprint:
+            return Change(UNCHANGED)
+        previous = entry['digests']
+        stations = {station for station in previous.keys() |
+                    out.digests.keys()
+                    if previous.get(station) != out.digests.get(station)}
+        return Change(CHANGED, stations=tuple(sorted(stations)))
+
+    def record(self, out: Output) -> None:
+        self.entries[out.name] = {'fingerprint': out.fingerprint,
+                                  'digests': out.digests}
+        return
+
+    def write(self) -> None:
+        with tempfile.NamedTemporaryFile(mode='w', dir=self.path.parent,
+                                         suffix='.tmp',
+                                         delete=False) as handle:
+            json.dump(self.entries, handle, indent=1, sort_keys=True)
+        os.replace(handle.name, self.path)
+        return
+
+
+@dataclass
+class Summary:
+    """What a run regenerated and what it skipped."""
+    changes: dict[str, Change] = field(default_factory=dict)
+
+    def add(self, out: Output, change: Change) -> None:
+        self.changes[out.name] = change
+        return
+
+    def report(self) -> str:
+        skipped = sum(change.skipped for change in self.changes.values())
+        lines = [f'Skipped {skipped} of {len(self.changes)} outputs, '
+                 f'regenerated {len(self.changes) - skipped}.']
+        for name, change in self.changes.items():
+            if change.status == CHANGED and change.stations:
+                listed = ', '.join(change.stations[:10])
+                more = len(change.stations) - 10
+                detail = f'{len(change.stations)} stations changed ' \
+                         f'({listed}{f", +{more}" if more > 0 else ""})'
+            elif change.status == CHANGED:
+                detail = 'settings changed'
+            elif change.skipped:
+                detail = 'unchanged, skipped'
+            else:
+                detail = change.status
+            lines.append(f'\t{name}: {detail}')
+        return '\n'.join(lines)
@@ -0,0 +1,163 @@
+# Standard library imports.
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+# Related third party imports.
+import pandas as pd
+# Local application/library specific imports.
+from src.cache import cache_version
+from src.settings import IMAGE_FORMATS, YamlSettings
+
+
+# Files of the entries in the cache directory, which may hold the
+# status files of jobs too.
+ENTRY_FILE = re.compile(r'[0-9a-f]{64}\.(?:csv|' +
+                        '|'.join(IMAGE_FORMATS) + ')')
+
+
+@dataclass(frozen=True)
+class RenderedHeatmap:
+    image: bytes
+    percentages: pd.DataFrame
+    image_format: str = 'png'
+
+    @property
+    def mimetype(self) -> str:
+        return IMAGE_FORMATS[self.image_format]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.image) + \
+            int(self.percentages.memory_usage(deep=True).sum())
+
+
+def cache_key(settings: YamlSettings) -> str:
+    """Hash the settings and the version of the raw data they use."""
+    canonical = json.dumps(
+        {'settings': asdict(settings),
+         'raw_data': cache_version(settings.cache_path)},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """Least recently used cache of rendered heatmaps.
+
+    The least recently used entries are evicted once the total size
+    exceeds `max_bytes`, the most recent entry is always kept. If
+    a `directory` is given, entries are also written there and found
+    again after a restart of the process. The oldest files there are
+    removed once they exceed `max_disk_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2 ** 20,
+                 directory: str | Path | None = None,
+                 max_disk_bytes: int = 512 * 2 ** 20) -> None:
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = Path(directory) if directory else None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        return
+
+    def get(self, key: str) -> RenderedHeatmap | None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        result = self._read(key)
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: RenderedHeatmap) -> None:
+        self._remember(key, result)
+        self._write(key, result)
+        return
+
+    def _remember(self, key: str, result: RenderedHeatmap) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key).nbytes
+            self._entries[key] = result
+            self._size += result.nbytes
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+        return
+
+    def _read(self, key: str) -> RenderedHeatmap | None:
+        if self.directory is None:
+            return None
+        csv_path = Path(self.directory, f'{key}.csv')
+        if not csv_path.exists():
+            return None
+        for image_format in IMAGE_FORMATS:
+            image_path = Path(self.directory, f'{key}.{image_format}')
+            try:
+                return RenderedHeatmap(
+                    image=image_path.read_bytes(),
+                    percentages=pd.read_csv(csv_path, index_col=0),
+                    image_format=image_format
+                )
+            except FileNotFoundError:
+                # Another format, or removed by another process.
+                continue
+        return None
+
+    def _write(self, key: str, result: RenderedHeatmap) -> None:
+        if self.directory is None:
+            return
+        # The csv file is renamed into place last, a key is only read
+        # back once both of its files exist.
+        for suffix, content in ((f'.{result.image_format}', result.image),
+                                ('.csv', result.percentages.to_csv())):
+            path = Path(self.directory, key + suffix)
+            tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+            try:
+                tmp_path.write_bytes(content if isinstance(content, bytes)
+                                     else content.encode())
+                os.replace(tmp_path, path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+        self._evict_files(keep=key)
+        return
+
+    def _evict_files(self, keep: str) -> None:
+        # Files are grouped by key, the entries written longest ago go
+        # first. Other processes may be evicting at the same time.
+        entries = dict()
+        for path in self.directory.iterdir():
+            if not ENTRY_FILE.fullmatch(path.name):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            size, written, paths = entries.get(path.stem, (0, 0, []))
+            entries[path.stem] = (size + stat.st_size,
+                                  max(written, stat.st_mtime_ns),
+                                  paths + [path])
+        total = sum(size for size, _, _ in entries.values())
+        for key, (size, _, paths) in sorted(entries.items(),
+                                            key=lambda item: item[1][1]):
+            if total <= self.max_disk_bytes:
+                break
+            if key == keep:
+                continue
+            # The csv file goes first, keys are only read with it.
+            for path in sorted(paths, key=lambda path: path.suffix != '.csv'):
+                path.unlink(missing_ok=True)
+            total -= size
+        return
@@ -8,6 +8,12 @@ import yaml
 from src.constants.general_settings import YAML_SETTINGS
 
 
+# Image formats heatmaps can be saved as, with their media types.
+IMAGE_FORMATS = {'png': 'image/png',
+                 'webp': 'image/webp',
+                 'svg': 'image/svg+xml'}
+
+
 @dataclass(frozen=True)
 class YamlSettings:
     cache_path: str
@@ -18,9 +24,12 @@ class YamlSettings:
     title_period: str | None = '2020'
     side_title_period: str | None = '2020'
     using_cache: bool = 'True'
+    refresh_cache: bool = False
     cache_path: str | Path = Path('cache')
     file_name_period: str | None = 'todo'
     output_dir: str = 'output'
+    image_format: str = 'png'
+    dpi: int = 100
 
 
 class Settings:
@@ -0,0 +1,250 @@
+# Standard library imports.
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import cache
+from time import perf_counter, sleep
+from typing import Any, Callable, Iterator
+import logging
+import queue
+import threading
+# Related third party imports.
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+# Local application/library specific imports.
+from src.constants import general_settings
+
+
+logger = logging.getLogger(__name__)
+
+# Any callable mapping a SPARQL query to a data frame of its results
+# can stand in for the ICOS endpoint.
+QueryRunner = Callable[[str], pd.DataFrame]
+# A time window on `timeStart`, open ended where a bound is None.
+Window = tuple[str | None, str | None]
+# Responses worth retrying, e.g. overloaded or restarting endpoint.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Fetches are split in yearly windows from this year on.
+FIRST_WINDOW_YEAR = 2015
+
+
+class SparqlClient:
+    """Run SPARQL queries over one shared HTTP session.
+
+    Connection errors, timeouts and responses with a status in
+    `RETRY_STATUSES` are retried up to `retries` times, waiting
+    `backoff`, 2 * `backoff`, 4 * `backoff`... seconds in between.
+    Instances are query runners and can be shared between threads.
+    """
+
+    def __init__(self, endpoint: str = general_settings.SPARQL_ENDPOINT,
+                 retries: int = 4, backoff: float = 1.0,
+                 timeout: float = 300, pool_size: int = 8) -> None:
+        self.endpoint = endpoint
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        return
+
+    def __call__(self, query: str) -> pd.DataFrame:
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(
+                    self.endpoint, data=query.encode('utf-8'),
+                    headers={'Accept': 'application/json'},
+                    timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as error:
+                reason = str(error)
+            else:
+                if response.ok:
+                    return results_to_frame(response.json())
+                reason = f'{response.status_code} {response.reason}'
+                if response.status_code not in RETRY_STATUSES:
+                    break
+            if attempt < self.retries:
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f'SPARQL query failed ({reason}), '
+                               f'retrying in {delay:.1f} s')
+                sleep(delay)
+        raise RuntimeError(f'SPARQL query failed: {reason}')
+
+
+def results_to_frame(results: dict) -> pd.DataFrame:
+    # SPARQL 1.1 JSON results, unbound variables become None.
+    variables = results['head']['vars']
+    return pd.DataFrame(
+        [[binding.get(variable, {}).get('value') for variable in variables]
+         for binding in results['results']['bindings']],
+        columns=variables
+    )
+
+
+@cache
+def default_client() -> SparqlClient:
+    return SparqlClient()
+
+
+def run_sparql(query: str) -> pd.DataFrame:
+    return default_client()(query)
+
+
+# Earlier versions of the selected data objects, a row per version. An
+# incremental refresh drops them from the cache, a full query never
+# selects them.
+PREVIOUS_VERSIONS = '''OPTIONAL {
+    ?dobj cpmeta:isNextVersionOf+ ?prev .
+    ?prev cpmeta:hasName ?prevFileName .
+    ?prev cpmeta:hasStartTime | (cpmeta:wasAcquiredBy/prov:startedAtTime)
+      ?prevTimeStart .
+    ?prev cpmeta:hasEndTime | (cpmeta:wasAcquiredBy/prov:endedAtTime)
+      ?prevTimeEnd .
+  }'''
+
+
+def build_query(obj_specs: list[str],
+                submitted_after: str | None = None,
+                window: Window = (None, None)) -> str:
+    """Fill in the raw data query template.
+
+    If `submitted_after` is given, only data objects submitted after
+    that xsd:dateTime are selected, along with their earlier versions
+    (see `PREVIOUS_VERSIONS`). `window` limits the data objects' start
+    time to [start, end).
+    """
+    with open(general_settings.RAW_DATA_QUERY, mode='r') as q_handle:
+        query = q_handle.read().replace('#obj_spec', ' '.join(obj_specs))
+    if submitted_after is not None:
+        query = query.replace(
+            '#filter',
+            f'FILTER(?submTime > "{submitted_after}"^^xsd:dateTime)'
+        ).replace('#versions', PREVIOUS_VERSIONS)
+    start, end = window
+    conditions = list()
+    if start is not None:
+        conditions.append(f'?timeStart >= "{start}"^^xsd:dateTime')
+    if end is not None:
+        conditions.append(f'?timeStart < "{end}"^^xsd:dateTime')
+    if conditions:
+        query = query.replace('#window',
+                              f'FILTER({" && ".join(conditions)})')
+    return query
+
+
+def yearly_windows(first_year: int = FIRST_WINDOW_YEAR,
+                   last_year: int | None = None) -> list[Window]:
+    """Split all time in yearly windows.
+
+    The first and last windows are open ended, so no data object is
+    left out whatever its start time.
+    """
+    if last_year is None:
+        last_year = datetime.now(timezone.utc).year
+    bounds = [f'{year}-01-01T00:00:00Z'
+              for year in range(first_year, last_year + 1)]
+    return list(zip([None, *bounds], [*bounds, None]))
+
+
+def run_paged(query: str, run_query: QueryRunner = run_sparql,
+              page_size: int = 50_000) -> Iterator[pd.DataFrame]:
+    """Run an ordered query page by page using LIMIT and OFFSET.
+
+    Only one page of results is held in memory at a time.
+    """
+    offset = 0
+    while True:
+        page = run_query(f'{query}\nlimit {page_size} offset {offset}')
+        if not page.empty:
+            yield page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+
+@dataclass
+class FetchTask:
+    obj_spec: str
+    window: Window
+    submitted_after: str | None = None
+
+
+class _Stopped(Exception):
+    # Raised in the workers once the consumer stopped.
+    pass
+
+
+@dataclass
+class FetchedPage:
+    task: FetchTask
+    page: Any
+
+
+def fetch_parallel(tasks: list[FetchTask],
+                   run_query: QueryRunner = run_sparql,
+                   transform: Callable[[pd.DataFrame], Any] = lambda x: x,
+                   workers: int = 4,
+                   page_size: int = 50_000) -> Iterator[FetchedPage]:
+    """Run the raw data query of every task in a bounded thread pool.
+
+    Every page is passed through `transform` in the worker and yielded
+    as soon as it arrives. At most `workers` pages wait to be consumed,
+    workers with another page wait until there is room, so memory
+    stays bounded however many pages a window has. The first failing
+    task raises once its retries are exhausted.
+    """
+    pages = queue.Queue(maxsize=workers)
+    stop = threading.Event()
+
+    def put(page: FetchedPage) -> None:
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    def fetch(task: FetchTask) -> tuple[int, float]:
+        tic, rows = perf_counter(), 0
+        query = build_query([task.obj_spec], task.submitted_after,
+                            task.window)
+        for page in run_paged(query, run_query, page_size):
+            rows += len(page)
+            put(FetchedPage(task=task, page=transform(page)))
+        return rows, perf_counter() - tic
+
+    tic, total_rows = perf_counter(), 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(fetch, task): task for task in tasks}
+        try:
+            while pending or not pages.empty():
+                try:
+                    yield pages.get(timeout=0.1)
+                    continue
+                except queue.Empty:
+                    pass
+                # A task is done once its last page was queued.
+                for future in [future for future in pending
+                               if future.done()]:
+                    task = pending.pop(future)
+                    rows, seconds = future.result()
+                    total_rows += rows
+                    start, end = task.window
+                    logger.info(f'{task.obj_spec} [{start or "..."}, '
+                                f'{end or "..."}): {rows} rows in '
+                                f'{seconds:.2f} s')
+        finally:
+            # Unblock the workers if the consumer stops early or a task
+            # failed.
+            stop.set()
+            for future in pending:
+                future.cancel()
+    seconds = perf_counter() - tic
+    logger.info(f'Fetched {total_rows} rows in {len(tasks)} windows in '
+                f'{seconds:.2f} s ({total_rows / max(seconds, 1e-9):.0f} '
+                f'rows/s)')
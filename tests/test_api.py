@@ -0,0 +1,73 @@
+# Related third party imports.
+from flask import Flask
+import pytest
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.api import api
+from src.cache import write_cache
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Caches are looked up relative to the working directory.
+    monkeypatch.chdir(tmp_path)
+    write_cache(synthetic.raw_data(n_stations=4, years=2),
+                tmp_path / 'atmosphere_cache')
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('group, bins, starts', [
+    ('D', ['10-12-15', '11-12-15'], ['2015-12-10', '2015-12-11']),
+    ('W', ['50-15', '51-15'], ['2015-12-10', '2015-12-14']),
+    ('M', ['12-15', '01-16'], ['2015-12-10', '2016-01-01']),
+    ('Q', ['Q4-15', 'Q1-16'], ['2015-12-10', '2016-01-01']),
+    ('Y', ['2015', '2016'], ['2015-12-10', '2016-01-01']),
+])
+def test_bins_start_on_their_first_day(client, group, bins, starts):
+    # Station 'AAB' measures from November 2015 to February 2016.
+    response = client.get('/api/coverage', query_string={
+        'domain': 'atmosphere', 'start': '2015-12-10', 'end': '2016-02-20',
+        'group': group,
+    })
+    assert response.status_code == 200
+    content = response.get_json()
+    assert content['bins'][:2] == bins
+    assert content['bin_starts'][:2] == starts
+    assert len(content['bin_starts']) == len(content['bins'])
+
+
+def test_trailing_windows_start_days_before_their_end(client):
+    response = client.get('/api/coverage/trailing', query_string={
+        'domain': 'atmosphere', 'days': 30, 'start': '2016-01-01',
+        'end': '2016-01-31',
+    })
+    assert response.status_code == 200
+    content = response.get_json()
+    assert content['days'] == 30
+    assert content['bins'][:2] == ['01-01-16', '02-01-16']
+    assert content['bin_starts'][:2] == ['2015-12-03', '2015-12-04']
+    assert len(content['bin_starts']) == 31
+
+
+@pytest.mark.parametrize('url', ['/api/coverage', '/api/coverage/trailing'])
+def test_start_after_end_is_a_bad_request(client, url):
+    response = client.get(url, query_string={
+        'domain': 'atmosphere', 'start': '2016-06-30', 'end': '2016-01-01',
+    })
+    assert response.status_code == 400
+    assert 'after' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('url', ['/api/coverage', '/api/coverage/trailing'])
+@pytest.mark.parametrize('dates', [
+    {'start': '', 'end': '2016-01-01'},
+    {'start': '2016-01-01', 'end': ''},
+    {'start': 'garbage', 'end': '2016-01-01'},
+])
+def test_empty_or_invalid_date_is_a_bad_request(client, url, dates):
+    response = client.get(url, query_string={'domain': 'atmosphere',
+                                             **dates})
+    assert response.status_code == 400
+    assert 'date' in response.get_json()['error']
@@ -0,0 +1,27 @@
+# Related third party imports.
+import pytest
+# Local application/library specific imports.
+from src.app import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize('form, message', [
+    ({'start': 'garbage', 'end': '2024-12-31'}, 'invalid "start" date'),
+    # A cleared date input.
+    ({'start': '2024-01-01', 'end': ''}, 'invalid "end" date'),
+    ({'start': '2024-12-31', 'end': '2024-01-01'}, 'after the "end"'),
+    ({'domain': 'ocean'}, 'Unknown domain'),
+])
+def test_invalid_form_is_shown_again_with_an_error(client, form, message):
+    response = client.post('/', data={
+        'domain': 'atmosphere', 'group': 'monthly',
+        'main_title_period': '2024', **form,
+    })
+    assert response.status_code == 400
+    page = response.get_data(as_text=True)
+    assert message in page.replace('&#34;', '"')
+    assert 'value="2024"' in page
@@ -0,0 +1,219 @@
+# Related third party imports.
+import pandas as pd
+import pytest
+# Local application/library specific imports.
+from benchmarks import synthetic
+from benchmarks.mock_sparql import MockSparqlServer, sparql_rows
+from src.cache import (ChunkWriter, format_raw_data, merge_raw_data,
+                       read_cache, read_metadata, refresh_cache)
+from src.constants import cpmeta
+from src.sparql import SparqlClient, run_paged
+
+
+OBJ_SPECS = [cpmeta.GATOS, cpmeta.PICARRO]
+
+
+class CannedSparql:
+    """Stand-in query runner serving canned raw data query results."""
+
+    def __init__(self, rows: pd.DataFrame) -> None:
+        self.server = MockSparqlServer(rows)
+        self.queries = list()
+        return
+
+    def __call__(self, query: str) -> pd.DataFrame:
+        self.queries.append(query)
+        return self.server.answer(query)
+
+
+@pytest.fixture
+def rows() -> pd.DataFrame:
+    data = synthetic.raw_data(n_stations=6, years=2)
+    return sparql_rows(data, OBJ_SPECS)
+
+
+def expected(rows: pd.DataFrame) -> pd.DataFrame:
+    return merge_raw_data(format_raw_data(rows))
+
+
+def split(rows: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Objects submitted up to the median submission time and later.
+    submitted = pd.to_datetime(rows['submTime'], format='ISO8601')
+    old = submitted <= submitted.median()
+    return rows[old], rows[~old]
+
+
+def test_refresh_without_cache_fetches_everything(tmp_path, rows):
+    raw_data, added = refresh_cache(tmp_path / 'cache', OBJ_SPECS,
+                                    run_query=CannedSparql(rows),
+                                    incremental=False)
+    pd.testing.assert_frame_equal(raw_data, expected(rows))
+    pd.testing.assert_frame_equal(added, expected(rows))
+    pd.testing.assert_frame_equal(read_cache(tmp_path / 'cache'),
+                                  expected(rows))
+    marks = read_metadata(tmp_path / 'cache')['high_water_marks']
+    assert set(marks) == set(OBJ_SPECS)
+
+
+def test_incremental_refresh_fetches_only_newer_objects(tmp_path, rows):
+    old, new = split(rows)
+    refresh_cache(tmp_path / 'cache', OBJ_SPECS, run_query=CannedSparql(old),
+                  incremental=False)
+    marks = read_metadata(tmp_path / 'cache')['high_water_marks']
+    runner = CannedSparql(rows)
+    raw_data, added = refresh_cache(tmp_path / 'cache', OBJ_SPECS,
+                                    run_query=runner)
+    # Every query asks only for objects submitted after the mark of
+    # its object specification.
+    for query in runner.queries:
+        spec = next(spec for spec in OBJ_SPECS if spec in query)
+        assert f'?submTime > "{marks[spec]["submTime"]}"' in query
+    pd.testing.assert_frame_equal(raw_data, expected(rows))
+    pd.testing.assert_frame_equal(added, expected(new))
+
+    # Nothing new, nothing added and the cache stays the same.
+    raw_data, added = refresh_cache(tmp_path / 'cache', OBJ_SPECS,
+                                    run_query=CannedSparql(rows))
+    assert added.empty
+    pd.testing.assert_frame_equal(raw_data, expected(rows))
+
+
+def test_refresh_deduplicates_objects_served_again(tmp_path, rows):
+    old, new = split(rows)
+    refresh_cache(tmp_path / 'cache', OBJ_SPECS, run_query=CannedSparql(old),
+                  incremental=False)
+    # Cached objects submitted again, e.g. reprocessed, and new ones.
+    resubmitted = old.head(20).assign(submTime=new['submTime'].max())
+    raw_data, added = refresh_cache(
+        tmp_path / 'cache', OBJ_SPECS,
+        run_query=CannedSparql(pd.concat([resubmitted, new]))
+    )
+    pd.testing.assert_frame_equal(raw_data, expected(rows))
+    # The added objects may keep the categories of the resubmitted ones.
+    pd.testing.assert_frame_equal(
+        added.reset_index(drop=True).astype({'station': str}),
+        expected(new).astype({'station': str})
+    )
+
+
+def new_versions(previous: pd.DataFrame, submitted: str,
+                 name: str) -> pd.DataFrame:
+    # Versions of `previous` starting half an hour later and ending an
+    # hour later, as if reprocessed.
+    shift = {'timeStart': pd.Timedelta(minutes=30),
+             'timeEnd': pd.Timedelta(hours=1)}
+    return previous.assign(
+        submTime=submitted,
+        fileName=previous['fileName'].str.replace('.dat', f'_{name}.dat'),
+        prevTimeStart=previous['timeStart'],
+        prevTimeEnd=previous['timeEnd'],
+        prevFileName=previous['fileName'],
+        **{column: (pd.to_datetime(previous[column], format='ISO8601')
+                    + delta).dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+           for column, delta in shift.items()}
+    )
+
+
+def test_refresh_drops_earlier_versions_with_another_span(tmp_path, rows):
+    old, new = split(rows)
+    refresh_cache(tmp_path / 'cache', OBJ_SPECS, run_query=CannedSparql(old),
+                  incremental=False)
+    reprocessed = new_versions(old.head(20), new['submTime'].max(), 'v2')
+    # Earlier versions are no longer in the catalogue.
+    catalogue = pd.concat([old.iloc[20:], new, reprocessed])
+    raw_data, added = refresh_cache(tmp_path / 'cache', OBJ_SPECS,
+                                    run_query=CannedSparql(catalogue))
+    pd.testing.assert_frame_equal(raw_data, expected(catalogue))
+    pd.testing.assert_frame_equal(
+        added.reset_index(drop=True).astype({'station': str}),
+        expected(pd.concat([new, reprocessed])).astype({'station': str})
+    )
+    full, _ = refresh_cache(tmp_path / 'full', OBJ_SPECS,
+                            run_query=CannedSparql(catalogue),
+                            incremental=False)
+    pd.testing.assert_frame_equal(raw_data, full)
+
+
+def test_refresh_drops_every_earlier_version(tmp_path, rows):
+    old, new = split(rows)
+    refresh_cache(tmp_path / 'cache', OBJ_SPECS, run_query=CannedSparql(old),
+                  incremental=False)
+    # The second versions were never cached, the third ones have a row
+    # per earlier version.
+    submitted = new['submTime'].max()
+    second = new_versions(old.head(10), submitted, 'v2')
+    third = new_versions(second, submitted, 'v3')
+    third = pd.concat([
+        third,
+        third.assign(prevTimeStart=second['prevTimeStart'],
+                     prevTimeEnd=second['prevTimeEnd'],
+                     prevFileName=second['prevFileName']),
+    ])
+    catalogue = pd.concat([old.iloc[10:], new, third])
+    raw_data, _ = refresh_cache(tmp_path / 'cache', OBJ_SPECS,
+                                run_query=CannedSparql(catalogue),
+                                page_size=7)
+    pd.testing.assert_frame_equal(raw_data, expected(catalogue))
+    assert len(raw_data) == len(old) + len(new)
+
+
+def test_refresh_leaves_no_temporary_files(tmp_path, rows):
+    refresh_cache(tmp_path / 'cache', OBJ_SPECS, run_query=CannedSparql(rows),
+                  incremental=False)
+    assert [path.name for path in tmp_path.iterdir()] == ['cache.feather']
+
+
+def test_run_paged_pages_through_all_results(rows):
+    runner = CannedSparql(rows)
+    query = 'VALUES ?spec {%s}' % ' '.join(OBJ_SPECS)
+    pages = list(run_paged(query, runner, page_size=70))
+    assert [len(page) for page in pages] == \
+        [70] * (len(rows) // 70) + [len(rows) % 70]
+    assert len(runner.queries) == len(pages)
+    pd.testing.assert_frame_equal(pd.concat(pages), runner.server.answer(
+        query
+    ))
+
+
+def test_paged_refresh_matches_a_single_page(tmp_path, rows):
+    paged, _ = refresh_cache(tmp_path / 'paged', OBJ_SPECS,
+                             run_query=CannedSparql(rows),
+                             incremental=False, page_size=7)
+    single, _ = refresh_cache(tmp_path / 'single', OBJ_SPECS,
+                              run_query=CannedSparql(rows),
+                              incremental=False, page_size=len(rows))
+    pd.testing.assert_frame_equal(paged, single)
+    pd.testing.assert_frame_equal(paged, expected(rows))
+
+
+def test_chunks_with_different_stations_are_read_back(tmp_path, rows):
+    frames = [format_raw_data(rows.iloc[:100]),
+              format_raw_data(rows.iloc[100:])]
+    with ChunkWriter(tmp_path / 'chunks') as writer:
+        for frame in frames:
+            writer.write(frame)
+    pd.testing.assert_frame_equal(merge_raw_data(writer.read()),
+                                  merge_raw_data(*frames))
+
+
+def test_refresh_through_a_local_endpoint_retries_failures(tmp_path, rows):
+    with MockSparqlServer(rows, failures=2) as server:
+        client = SparqlClient(endpoint=server.url, backoff=0.01)
+        raw_data, _ = refresh_cache(tmp_path / 'cache', OBJ_SPECS,
+                                    run_query=client, incremental=False,
+                                    page_size=50)
+        requests = server.requests
+    pd.testing.assert_frame_equal(raw_data, expected(rows))
+    assert requests > 2
+
+
+def test_failing_endpoint_leaves_the_cache_untouched(tmp_path, rows):
+    refresh_cache(tmp_path / 'cache', OBJ_SPECS,
+                  run_query=CannedSparql(rows), incremental=False)
+    with MockSparqlServer(rows, failures=1000) as server:
+        client = SparqlClient(endpoint=server.url, retries=1, backoff=0.01)
+        with pytest.raises(RuntimeError, match='503'):
+            refresh_cache(tmp_path / 'cache', OBJ_SPECS, run_query=client)
+    pd.testing.assert_frame_equal(read_cache(tmp_path / 'cache'),
+                                  expected(rows))
+    assert [path.name for path in tmp_path.iterdir()] == ['cache.feather']
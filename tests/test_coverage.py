@@ -0,0 +1,21 @@
+# Related third party imports.
+import numpy as np
+import pytest
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.coverage import GROUP_NAMES, coverage_table, daily_coverage
+
+
+@pytest.fixture
+def data():
+    return synthetic.raw_data(n_stations=3, years=2)
+
+
+@pytest.mark.parametrize('group', list(GROUP_NAMES))
+def test_window_without_data_has_no_coverage(data, group):
+    stations = sorted(data['station'].unique())
+    daily = daily_coverage(data, stations, '2010-01-01', '2010-03-01')
+    coverage = coverage_table(daily, group)
+    assert coverage.percentages.index.to_list() == stations
+    assert np.isnan(coverage.percentages.to_numpy()).all()
+    assert coverage.totals.isna().all()
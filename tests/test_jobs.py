@@ -0,0 +1,194 @@
+# Standard library imports.
+from time import monotonic
+import json
+import os
+import subprocess
+import sys
+import threading
+# Related third party imports.
+from flask import Flask
+import pandas as pd
+import pytest
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src import api as api_module
+from src import jobs as jobs_module
+from src.api import api, read_settings
+from src.cache import write_cache
+from src.jobs import DONE, FAILED, QUEUED, RUNNING, FileJobQueue, JobQueue
+from src.result_cache import RenderedHeatmap, ResultCache, cache_key
+
+
+# Station 'AAB' measures from November 2015 to February 2016.
+FORM = {'domain': 'atmosphere', 'start': '2015-12-01', 'end': '2016-01-31'}
+
+
+class BlockedRender:
+    """Stand-in for `render_heatmap` holding jobs until released."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.released = threading.Event()
+        return
+
+    def __call__(self, settings) -> RenderedHeatmap:
+        self.calls += 1
+        self.released.wait(10)
+        return RenderedHeatmap(image=b'png',
+                               percentages=pd.DataFrame({'12-15': [50.0]},
+                                                        index=['AAB']))
+
+
+@pytest.fixture
+def render(monkeypatch):
+    render = BlockedRender()
+    monkeypatch.setattr(jobs_module, 'render_heatmap', render)
+    yield render
+    render.released.set()
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    # Caches are looked up relative to the working directory.
+    monkeypatch.chdir(tmp_path)
+    write_cache(synthetic.raw_data(n_stations=4, years=2),
+                tmp_path / 'atmosphere_cache')
+    return tmp_path / 'jobs'
+
+
+def make_client(queue: JobQueue):
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.extensions['heatmap_jobs'] = queue
+    return app.test_client()
+
+
+def file_queue(jobs_dir) -> FileJobQueue:
+    # Like `src.app` with HEATMAP_JOBS_DIR set.
+    return FileJobQueue(jobs_dir, ResultCache(directory=jobs_dir))
+
+
+@pytest.fixture(params=['memory', 'files'])
+def client(request, jobs_dir):
+    if request.param == 'memory':
+        return make_client(JobQueue(ResultCache()))
+    return make_client(file_queue(jobs_dir))
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+def test_identical_requests_share_a_job(client, render):
+    first = client.post('/api/jobs', data=FORM)
+    assert first.status_code == 202
+    job = first.get_json()
+    assert first.headers['Location'].endswith(f'/api/jobs/{job["id"]}')
+    assert job['id'] == cache_key(read_settings(FORM))
+    # Form data and json give the same settings.
+    assert client.post('/api/jobs', json=FORM).get_json()['id'] == job['id']
+    other = client.post('/api/jobs', data={**FORM, 'group': 'D'})
+    assert other.get_json()['id'] != job['id']
+
+    render.released.set()
+    for job_id in (job['id'], other.get_json()['id']):
+        status = client.get(f'/api/jobs/{job_id}',
+                            query_string={'wait': 10}).get_json()
+        assert status['status'] == DONE
+    assert render.calls == 2
+    # Finished jobs with a result are not run again.
+    assert client.post('/api/jobs', data=FORM).get_json()['status'] == DONE
+    assert render.calls == 2
+
+
+def test_finished_job_serves_heatmap_and_csv(client):
+    job = client.post('/api/jobs', data={**FORM, 'group': 'M'}).get_json()
+    status = client.get(job['status_url'],
+                        query_string={'wait': 25}).get_json()
+    assert status['status'] == DONE, status['error']
+    image = client.get(status['image_url'])
+    assert image.status_code == 200
+    assert image.mimetype == 'image/png'
+    csv = client.get(status['csv_url'])
+    assert csv.status_code == 200
+    assert 'AAB' in csv.get_data(as_text=True)
+
+
+def test_waiting_is_capped(client, render, monkeypatch):
+    monkeypatch.setattr(api_module, 'MAX_WAIT', 0.3)
+    job = client.post('/api/jobs', data=FORM).get_json()
+    tic = monotonic()
+    status = client.get(job['status_url'], query_string={'wait': 60})
+    assert monotonic() - tic < 5
+    assert status.get_json()['status'] in (QUEUED, RUNNING)
+    assert client.get(job['status_url'],
+                      query_string={'wait': 'soon'}).status_code == 400
+
+
+@pytest.mark.parametrize('job_id', ['0' * 64, 'not-a-job'])
+def test_unknown_jobs_are_not_found(client, job_id):
+    for url in (f'/api/jobs/{job_id}', f'/api/jobs/{job_id}/heatmap',
+                f'/api/jobs/{job_id}/percentages.csv'):
+        assert client.get(url).status_code == 404
+
+
+def test_status_files_are_replaced_atomically(jobs_dir, render,
+                                              monkeypatch):
+    replaced, os_replace = list(), os.replace
+
+    def replace(source, destination) -> None:
+        replaced.append((str(source), str(destination)))
+        os_replace(source, destination)
+        return
+
+    monkeypatch.setattr(jobs_module.os, 'replace', replace)
+    client = make_client(file_queue(jobs_dir))
+    job = client.post('/api/jobs', data=FORM).get_json()
+    render.released.set()
+    client.get(job['status_url'], query_string={'wait': 10})
+    # The claim links the file, running and done replace it.
+    status_path = str(jobs_dir / f'{job["id"]}.json')
+    assert [source.endswith('.tmp') for source, destination in replaced
+            if destination == status_path] == [True] * 2
+    assert json.loads((jobs_dir / f'{job["id"]}.json').read_text())[
+        'status'] == DONE
+    assert not list(jobs_dir.glob('*.tmp'))
+
+
+def test_only_one_worker_claims_a_job(jobs_dir, render):
+    # Every gunicorn worker has its own queue over the same directory.
+    workers = [make_client(file_queue(jobs_dir)) for _ in range(2)]
+    jobs = [worker.post('/api/jobs', data=FORM).get_json()
+            for worker in workers]
+    assert jobs[0]['id'] == jobs[1]['id']
+    assert jobs[0]['submitted'] == jobs[1]['submitted']
+    render.released.set()
+    status = workers[1].get(jobs[0]['status_url'],
+                            query_string={'wait': 10}).get_json()
+    assert status['status'] == DONE
+    assert render.calls == 1
+    assert workers[1].get(status['image_url']).data == b'png'
+
+
+def test_job_of_a_dead_process_is_run_again(jobs_dir, render):
+    queue = file_queue(jobs_dir)
+    job_id = cache_key(read_settings(FORM))
+    (jobs_dir / f'{job_id}.json').write_text(json.dumps({
+        'id': job_id, 'status': RUNNING, 'pid': dead_pid(),
+        'submitted': '2024-01-01T00:00:00+00:00',
+    }))
+    client = make_client(queue)
+    status = client.get(f'/api/jobs/{job_id}').get_json()
+    assert status['status'] == FAILED
+    assert 'died' in status['error']
+
+    job = client.post('/api/jobs', data=FORM).get_json()
+    assert job['id'] == job_id
+    assert job['status'] == QUEUED
+    render.released.set()
+    status = client.get(job['status_url'],
+                        query_string={'wait': 10}).get_json()
+    assert status['status'] == DONE
+    assert render.calls == 1
@@ -0,0 +1,50 @@
+# Related third party imports.
+import numpy as np
+from PIL import Image
+import pytest
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.previews.netcdf import NetcdfPreview
+from src.profiling import collect
+
+
+VARIABLES = ['emi_CO2_all_sectors', 'emi_CH4_all_sectors']
+
+
+@pytest.fixture
+def dataset():
+    return synthetic.emissions(size=40, variables=('CO2', 'CH4'))
+
+
+@pytest.fixture
+def path(tmp_path, dataset):
+    path = tmp_path / 'emissions.nc'
+    dataset.to_netcdf(path)
+    return path
+
+
+def test_values_are_averaged_down_to_the_resolution(path, dataset):
+    preview = NetcdfPreview(path, resolution=20)
+    assert preview.variables == VARIABLES
+    values = preview.values(VARIABLES[0])
+    expected = dataset[VARIABLES[0]].to_numpy().astype(float).\
+        reshape(20, 2, 20, 2).mean(axis=(1, 3))
+    np.testing.assert_allclose(values, expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_previews_are_saved_for_every_variable(tmp_path, path, workers):
+    with collect() as timings:
+        paths = NetcdfPreview(path).save_all(tmp_path / 'previews',
+                                             image_format='webp',
+                                             workers=workers)
+    assert [saved.name for saved in paths] == \
+        [f'{variable}.webp' for variable in VARIABLES]
+    for saved in paths:
+        with Image.open(saved) as image:
+            assert image.format == 'WEBP'
+    stages = timings.totals()
+    assert 'rendering' in stages and 'image_write' in stages
+    if workers > 1:
+        # Stages of the worker processes are sent back.
+        assert 'preview' in stages
@@ -0,0 +1,109 @@
+# Standard library imports.
+from dataclasses import replace
+from pathlib import Path
+# Related third party imports.
+import pandas as pd
+import pytest
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.batch import run_batch
+from src.cache import write_cache
+from src.heatmap import Heatmap, gimme_heatmaps
+from src.profiling import collect
+from src.regeneration import MANIFEST
+from src.settings import YamlSettings
+
+
+# Stages doing the work an unchanged rerun has to skip.
+WORK_STAGES = {'binning', 'trailing_windows', 'rendering', 'image_encode',
+               'image_write', 'csv_write'}
+
+
+@pytest.fixture
+def data() -> pd.DataFrame:
+    # Station 'AAA' starts in April 2016.
+    return synthetic.raw_data(n_stations=8, years=2)
+
+
+@pytest.fixture
+def settings(tmp_path, data) -> YamlSettings:
+    cache_path = tmp_path / 'atmosphere_cache'
+    write_cache(data, cache_path)
+    return YamlSettings(cache_path=cache_path, domain='atc',
+                        start='2016-01-01', end='2016-12-31',
+                        file_name_period='2016', output_dir=str(tmp_path))
+
+
+def outputs(directory: str) -> dict[str, int]:
+    return {path.name: path.stat().st_mtime_ns
+            for path in Path(directory).iterdir()
+            if path.suffix in ('.png', '.csv')}
+
+
+def run(generate) -> tuple[set[str], object]:
+    with collect() as timings:
+        summary = generate()
+    return WORK_STAGES & set(timings.totals()), summary
+
+
+def backfill(data: pd.DataFrame, station: str, day: str) -> pd.DataFrame:
+    added = data[data['station'] == station].iloc[:1].copy()
+    added['start'] = pd.Timestamp(f'{day} 12:00', tz='UTC').value // 10 ** 9
+    return pd.concat([data, added], ignore_index=True)
+
+
+@pytest.mark.parametrize('options', [
+    dict(),
+    dict(groups=['M', 'W', 'Q']),
+    dict(trailing=[7, 30]),
+], ids=['default', 'groups', 'trailing'])
+def test_unchanged_rerun_rewrites_nothing(settings, options):
+    gimme_heatmaps(settings, **options)
+    saved = outputs(settings.output_dir)
+    assert saved and (Path(settings.output_dir) / MANIFEST).exists()
+    work, summary = run(lambda: gimme_heatmaps(settings, **options))
+    assert all(change.skipped for change in summary.changes.values())
+    assert not work
+    assert outputs(settings.output_dir) == saved
+
+
+def test_unchanged_batch_rerun_rewrites_nothing(settings):
+    reports = [replace(settings, group=group) for group in 'MW']
+    run_batch(reports, workers=1)
+    saved = outputs(settings.output_dir)
+    work, summary = run(lambda: run_batch(reports, workers=1))
+    assert all(change.skipped for change in summary.changes.values())
+    assert not work
+    assert outputs(settings.output_dir) == saved
+
+
+def test_new_data_regenerates_the_outputs_of_its_window(settings, data):
+    gimme_heatmaps(settings, groups=['M', 'W'], trailing=[7])
+    data = backfill(data, 'AAB', '2016-02-10')
+    write_cache(data, settings.cache_path)
+    _, summary = run(lambda: gimme_heatmaps(settings, groups=['M', 'W'],
+                                            trailing=[7]))
+    assert not any(change.skipped for change in summary.changes.values())
+    assert {change.stations for change in summary.changes.values()} == \
+        {('AAB',)}
+    # Outside of the window.
+    write_cache(backfill(data, 'AAB', '2014-02-10'), settings.cache_path)
+    work, summary = run(lambda: gimme_heatmaps(settings, groups=['M', 'W']))
+    assert all(change.skipped for change in summary.changes.values())
+    assert not work
+
+
+def test_data_before_the_window_regenerates_trailing_windows(settings,
+                                                               data):
+    gimme_heatmaps(settings, trailing=[30])
+    path = Heatmap(settings=settings).trailing_path(30)
+    before = pd.read_csv(path, index_col='station')
+    assert before.loc['AAA', '01-01-16':'31-03-16'].isna().all()
+    # Data of 'AAA' long before the trailing windows turn them from
+    # NaN, not started yet, to 0 %.
+    write_cache(backfill(data, 'AAA', '2015-06-01'), settings.cache_path)
+    _, summary = run(lambda: gimme_heatmaps(settings, trailing=[30]))
+    assert [change.stations for change in summary.changes.values()
+            if not change.skipped] == [('AAA',)]
+    after = pd.read_csv(path, index_col='station')
+    assert (after.loc['AAA', '01-01-16':'31-03-16'] == 0).all()
@@ -0,0 +1,61 @@
+# Standard library imports.
+import os
+# Related third party imports.
+import pandas as pd
+import pytest
+# Local application/library specific imports.
+from src.result_cache import RenderedHeatmap, ResultCache
+
+
+def rendered(size: int) -> RenderedHeatmap:
+    return RenderedHeatmap(image=b'x' * size,
+                           percentages=pd.DataFrame({'01-24': [50.0]},
+                                                    index=['AAA']))
+
+
+def key(number: int) -> str:
+    return f'{number:064x}'
+
+
+@pytest.fixture
+def umask():
+    previous = os.umask(0o022)
+    yield
+    os.umask(previous)
+
+
+def test_entries_are_found_again_from_disk(tmp_path):
+    ResultCache(directory=tmp_path).put(key(1), rendered(10))
+    result = ResultCache(directory=tmp_path).get(key(1))
+    assert result.image == b'x' * 10
+    assert result.percentages.loc['AAA', '01-24'] == 50.0
+
+
+def test_files_are_readable_like_other_outputs(tmp_path, umask):
+    ResultCache(directory=tmp_path).put(key(1), rendered(10))
+    modes = {path.name: path.stat().st_mode & 0o777
+             for path in tmp_path.iterdir()}
+    assert modes == {f'{key(1)}.png': 0o644, f'{key(1)}.csv': 0o644}
+
+
+def test_oldest_files_are_removed_beyond_the_disk_limit(tmp_path):
+    # Room for two entries of a bit over 1000 bytes.
+    cache = ResultCache(directory=tmp_path, max_disk_bytes=2500)
+    job = tmp_path / f'{key(0)}.json'
+    job.write_text('{}')
+    for number in range(1, 6):
+        cache.put(key(number), rendered(1000))
+        # Modification times are compared, keep them apart.
+        for path in tmp_path.glob(f'{key(number)}.*'):
+            os.utime(path, ns=(number * 10 ** 9, number * 10 ** 9))
+    stems = {path.stem for path in tmp_path.iterdir()
+             if path.suffix != '.json'}
+    assert stems == {key(4), key(5)}
+    assert job.exists()
+    assert ResultCache(directory=tmp_path).get(key(3)) is None
+
+
+def test_the_latest_entry_is_kept_however_large(tmp_path):
+    cache = ResultCache(directory=tmp_path, max_disk_bytes=100)
+    cache.put(key(1), rendered(1000))
+    assert ResultCache(directory=tmp_path).get(key(1)) is not None
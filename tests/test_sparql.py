@@ -0,0 +1,88 @@
+# Standard library imports.
+from threading import Lock
+from time import sleep
+# Related third party imports.
+import pandas as pd
+import pytest
+# Local application/library specific imports.
+from src.sparql import FetchTask, fetch_parallel
+
+
+PAGE_SIZE = 10
+WORKERS = 2
+
+
+class PagedQueries:
+    """Query runner answering every query with `pages` full pages.
+
+    Counts the transformed pages not consumed yet.
+    """
+
+    def __init__(self, pages: int, fail: bool = False) -> None:
+        self.pages = pages
+        self.fail = fail
+        self.pending = 0
+        self.max_pending = 0
+        self._lock = Lock()
+        return
+
+    def __call__(self, query: str) -> pd.DataFrame:
+        if self.fail:
+            raise RuntimeError('SPARQL query failed: 503')
+        offset = int(query.rsplit('offset', 1)[1])
+        rows = PAGE_SIZE if offset < self.pages * PAGE_SIZE else 0
+        return pd.DataFrame({'row': range(offset, offset + rows)})
+
+    def transform(self, page: pd.DataFrame) -> pd.DataFrame:
+        with self._lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        return page
+
+    def consumed(self) -> None:
+        with self._lock:
+            self.pending -= 1
+        return
+
+
+def tasks(n: int) -> list[FetchTask]:
+    return [FetchTask(obj_spec='<spec>', window=(str(i), str(i + 1)))
+            for i in range(n)]
+
+
+def test_fetch_parallel_yields_every_page():
+    runner = PagedQueries(pages=5)
+    fetched = list(fetch_parallel(tasks(4), runner, runner.transform,
+                                  workers=WORKERS, page_size=PAGE_SIZE))
+    assert len(fetched) == 4 * 5
+    for window in {page.task.window for page in fetched}:
+        rows = pd.concat([page.page for page in fetched
+                          if page.task.window == window])['row']
+        assert sorted(rows) == list(range(5 * PAGE_SIZE))
+
+
+def test_fetch_parallel_bounds_pages_in_flight():
+    runner = PagedQueries(pages=20)
+    for _ in fetch_parallel(tasks(6), runner, runner.transform,
+                            workers=WORKERS, page_size=PAGE_SIZE):
+        # A slow consumer, e.g. writing every page to disk.
+        sleep(0.005)
+        runner.consumed()
+    # Pages queued for the consumer and one page per waiting worker.
+    assert runner.max_pending <= 2 * WORKERS + 1
+
+
+def test_fetch_parallel_stops_when_the_consumer_stops():
+    runner = PagedQueries(pages=1000)
+    pages = fetch_parallel(tasks(4), runner, runner.transform,
+                           workers=WORKERS, page_size=PAGE_SIZE)
+    next(pages)
+    pages.close()
+    assert runner.pending <= 2 * WORKERS + 1
+
+
+def test_fetch_parallel_raises_failures():
+    runner = PagedQueries(pages=1, fail=True)
+    with pytest.raises(RuntimeError, match='503'):
+        list(fetch_parallel(tasks(3), runner, runner.transform,
+                            workers=WORKERS, page_size=PAGE_SIZE))
@@ -0,0 +1,67 @@
+# Related third party imports.
+from flask import Flask
+from PIL import Image
+import pytest
+# Local application/library specific imports.
+from benchmarks import synthetic
+from src.previews.server import previews, read_index
+from src.previews.tiles import TilePyramid
+
+
+VARIABLES = ['emi_CO2_all_sectors', 'emi_CH4_all_sectors']
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'emissions.nc'
+    synthetic.emissions(size=40, variables=('CO2', 'CH4')).to_netcdf(path)
+    return path
+
+
+def tiles(directory, variable):
+    return sorted(path.relative_to(directory / variable).as_posix()
+                  for path in (directory / variable).rglob('*.png'))
+
+
+def test_tiles_are_written_indexed_and_served(tmp_path, path):
+    directory = tmp_path / 'tiles' / 'zurich'
+    assert TilePyramid(path, directory).build(workers=1) == VARIABLES
+    index = read_index(directory)
+    min_zoom, max_zoom = index['min_zoom'], index['max_zoom']
+    for variable in VARIABLES:
+        entry = index['variables'][variable]
+        assert entry['tiles'] == len(tiles(directory, variable)) > 0
+        assert entry['units'] == 't/yr'
+        assert {int(tile.split('/')[0]) for tile in
+                tiles(directory, variable)} == \
+            set(range(min_zoom, max_zoom + 1))
+        for tile in tiles(directory, variable):
+            with Image.open(directory / variable / tile) as image:
+                assert image.size == (index['tile_size'],) * 2
+
+    app = Flask(__name__)
+    app.config['PREVIEW_TILES_DIR'] = str(tmp_path / 'tiles')
+    app.register_blueprint(previews)
+    tile = tiles(directory, VARIABLES[0])[0]
+    response = app.test_client().get(
+        f'/previews/zurich/{VARIABLES[0]}/{tile}'
+    )
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data == (directory / VARIABLES[0] / tile).read_bytes()
+
+
+def test_only_changed_variables_are_tiled_again(tmp_path, path):
+    directory = tmp_path / 'tiles'
+    TilePyramid(path, directory).build(workers=1)
+    index = read_index(directory)
+    assert TilePyramid(path, directory).build(workers=1) == []
+    assert read_index(directory)['variables'] == index['variables']
+    dataset = synthetic.emissions(size=40, variables=('CO2', 'CH4'))
+    dataset[VARIABLES[1]] *= 2
+    dataset.to_netcdf(path)
+    assert TilePyramid(path, directory).build(workers=2) == [VARIABLES[1]]
+    variables = read_index(directory)['variables']
+    assert variables[VARIABLES[0]] == index['variables'][VARIABLES[0]]
+    assert variables[VARIABLES[1]]['fingerprint'] != \
+        index['variables'][VARIABLES[1]]['fingerprint']